@@ -0,0 +1,145 @@
+"""
+Headless JSON/HTTP API over the same RAG pipeline as the Gradio UI.
+
+    python api.py --port 8000 --workers 4
+
+Endpoints:
+    POST /query          {"question": ..., "chat_history": [[question, answer], ...]} -> answer and explanation
+    POST /query/stream   same body, answers as newline-delimited JSON: {"delta": ...} lines, then {"done": true, ...}
+    GET  /healthz        liveness: the process is up
+    GET  /readyz         readiness: the background warm-up (vector store, embedding model, LLM client) finished
+    GET  /metrics        Prometheus text metrics of this worker process
+"""
+import json
+import argparse
+import warnings
+from contextlib import asynccontextmanager
+from typing import List, Tuple
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel
+from app.rag import RAGProcessor
+from app.async_rag import AsyncRAGProcessor
+from app.config import API_HOST, API_PORT, API_WORKERS
+from app.metrics import REGISTRY
+import app.clients as client
+from dotenv import load_dotenv
+# Load environment variables
+load_dotenv()
+
+
+class QueryRequest(BaseModel):
+    question: str
+    chat_history: List[Tuple[str, str]] = []
+
+
+class APIState:
+    """
+    The per-process pipeline shared by all requests: one RAGProcessor with its loaded vector store
+    and caches, and one async LLM client whose HTTP connections are kept alive between requests.
+    """
+
+    def __init__(self):
+        self.client_manager = client.ClientManager()
+        self.rag_processor_instance = RAGProcessor(self.client_manager)
+        self.async_rag_processor = AsyncRAGProcessor(self.rag_processor_instance)
+
+    def close(self):
+        self.async_rag_processor.executor.shutdown()
+        self.rag_processor_instance.qa_logger.close()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    state = APIState()
+    # Listen right away and report ready once the model is loaded
+    state.rag_processor_instance.start_warm_up(asynchronous=True)
+    app.state.api = state
+    yield
+    state.close()
+
+
+app = FastAPI(title="NYC Property Records Q&A API", lifespan=lifespan)
+
+
+def busy_response(retrieval_details) -> JSONResponse:
+    return JSONResponse(
+        {"error": AsyncRAGProcessor.BUSY_RESPONSE, "queue": retrieval_details["queue"]},
+        status_code=503,
+        headers={"Retry-After": "1"},
+    )
+
+
+@app.post("/query")
+async def query(request: QueryRequest):
+    async_rag = app.state.api.async_rag_processor
+    response, retrieval_details = await async_rag.rag_query_with_explanation(request.question, request.chat_history)
+    if retrieval_details.get("busy"):
+        return busy_response(retrieval_details)
+    return {"answer": response, "explanation": RAGProcessor.build_explanation(retrieval_details)}
+
+
+@app.post("/query/stream")
+async def query_stream(request: QueryRequest):
+    async_rag = app.state.api.async_rag_processor
+    stream = async_rag.rag_query_stream(request.question, request.chat_history)
+    # The first update tells whether the request was admitted, before the 200 status is sent
+    try:
+        response, retrieval_details = await stream.__anext__()
+    except StopAsyncIteration:
+        return JSONResponse({"error": "No response was produced"}, status_code=500)
+    if retrieval_details.get("busy"):
+        await stream.aclose()
+        return busy_response(retrieval_details)
+
+    async def lines():
+        nonlocal response, retrieval_details
+        sent = 0
+        try:
+            while True:
+                if len(response) > sent:
+                    yield json.dumps({"delta": response[sent:]}) + "\n"
+                    sent = len(response)
+                try:
+                    response, retrieval_details = await stream.__anext__()
+                except StopAsyncIteration:
+                    break
+            yield json.dumps({
+                "done": True,
+                "answer": response,
+                "explanation": RAGProcessor.build_explanation(retrieval_details),
+            }, default=str) + "\n"
+        finally:
+            await stream.aclose()
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@app.get("/healthz")
+async def healthz():
+    return {"status": "ok"}
+
+
+@app.get("/readyz")
+async def readyz():
+    if not app.state.api.rag_processor_instance.ready.is_set():
+        return JSONResponse({"status": "not ready"}, status_code=503)
+    return {"status": "ready"}
+
+
+@app.get("/metrics")
+async def metrics():
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Serve the RAG pipeline as a JSON/HTTP API.")
+    parser.add_argument("--host", default=API_HOST, help=f"bind address (default: {API_HOST})")
+    parser.add_argument("--port", type=int, default=API_PORT, help=f"(default: {API_PORT})")
+    parser.add_argument("--workers", type=int, default=API_WORKERS,
+                        help=f"worker processes, each with its own pipeline over the shared store (default: {API_WORKERS})")
+    args = parser.parse_args()
+    warnings.filterwarnings("ignore", category=UserWarning)
+    uvicorn.run("api:app", host=args.host, port=args.port, workers=args.workers, log_level="warning")
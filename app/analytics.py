@@ -0,0 +1,443 @@
+import os
+import re
+import time
+import sqlite3
+import datetime
+import threading
+import warnings
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+from app.config import INGEST_BATCH_ROWS, ANALYTICS_MAX_ROWS
+
+# pandas (also imported by app.preProcessing) is only needed to load the store, so it is imported
+# there and the query path starts without it
+if TYPE_CHECKING:
+    import pandas as pd
+
+BOROUGHS = {"manhattan": 1, "bronx": 2, "brooklyn": 3, "queens": 4, "staten island": 5}
+DOC_TYPE_TERMS = {
+    "mortgage": "MTGE", "mortgages": "MTGE", "deed": "DEED", "deeds": "DEED", "sale": "DEED", "sales": "DEED",
+    "satisfaction": "SAT", "satisfactions": "SAT", "assignment": "ASST", "assignments": "ASST",
+    "agreement": "AGMT", "agreements": "AGMT",
+}
+AGGREGATE_TERMS = [
+    ("AVG", ("average", "avg")),
+    ("SUM", ("total", "sum of")),
+    ("MAX", ("highest", "largest", "maximum", "most expensive", "biggest")),
+    ("MIN", ("lowest", "smallest", "minimum", "cheapest")),
+    ("COUNT", ("how many",)),
+]
+LATEST_TERMS = ("most recent", "latest", "newest")
+DISTINCT_TERMS = ("list all", "list the")
+# Questions about single records (ids, BBLs, blocks and lots) need semantic search, not an aggregate
+RECORD_TERMS = ("id", "ids", "bbl", "crfn", "block", "blocks", "lot", "lots")
+MEASURE_TERMS = ("amt", "amount", "price", "value", "consideration")
+
+
+class AnalyticsStore:
+    """
+    An embedded SQLite copy of the ingested CSV files for aggregate and filter questions.
+
+    Every CSV becomes one table with normalized column names, typed from the `data_type` column
+    of its metadata file (numbers as REAL, dates as ISO-8601 text, everything else as TEXT).
+    The _columns table records each column's source name, type and description for discovery.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._reader = None
+        self.columns = []
+
+    @staticmethod
+    def table_name(file_name: str) -> str:
+        return re.sub(r"[^a-z0-9]+", "_", os.path.splitext(file_name)[0].lower()).strip("_")
+
+    @staticmethod
+    def column_name(column: str) -> str:
+        from app.preProcessing import DocumentProcessor
+        return re.sub(r"[^a-z0-9]+", "_", DocumentProcessor.normalize_column_name(column)).strip("_") or "column"
+
+    @staticmethod
+    def sql_type(data_type: Optional[str]) -> str:
+        """
+        Map a metadata data_type (e.g. "Number", "Floating Timestamp", "Text") to a storage type.
+        """
+        data_type = str(data_type or "").lower()
+        if any(term in data_type for term in ("timestamp", "date")):
+            return "DATE"
+        if any(term in data_type for term in ("number", "numeric", "int", "float", "double", "decimal", "money", "percent")):
+            return "REAL"
+        return "TEXT"
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.db_path)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("""
+            CREATE TABLE IF NOT EXISTS _columns (
+                table_name TEXT, column_name TEXT, source_column TEXT, sql_type TEXT,
+                full_name TEXT, description TEXT
+            )""")
+        return connection
+
+    @staticmethod
+    def _convert(series: "pd.Series", sql_type: str) -> "pd.Series":
+        import pandas as pd
+        if sql_type == "REAL":
+            values = pd.to_numeric(series, errors="coerce")
+        elif sql_type == "DATE":
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", UserWarning)
+                dates = pd.to_datetime(series, errors="coerce")
+            has_time = (dates.dropna() != dates.dropna().dt.normalize()).any()
+            values = dates.dt.strftime("%Y-%m-%d %H:%M:%S" if has_time else "%Y-%m-%d")
+        else:
+            values = series
+        return values.astype(object).where(values.notna(), None)
+
+    def load_csv(self, csv_path: str, metadata_path: str, batch_rows: int = INGEST_BATCH_ROWS) -> int:
+        """
+        (Re)load one CSV file into its table, batch_rows rows at a time. The new table replaces
+        the old one in a single transaction, so readers never see a partially loaded table.
+        Returns the number of rows loaded.
+        """
+        import pandas as pd
+        from app.preProcessing import DocumentProcessor
+        processor = DocumentProcessor()
+        metadata_dict = processor.read_metadata_file(metadata_path)
+        table = self.table_name(os.path.basename(csv_path))
+        loading_table = f"{table}__loading"
+        connection = self._connect()
+        try:
+            connection.execute(f'DROP TABLE IF EXISTS "{loading_table}"')
+            columns = None
+            n_rows = 0
+            for df in pd.read_csv(csv_path, dtype=str, chunksize=batch_rows):
+                if columns is None:
+                    mapping = processor.create_column_mapping(df.columns.tolist(), list(metadata_dict.keys()))
+                    columns = []
+                    used = set()
+                    for source in df.columns:
+                        metadata = metadata_dict.get(mapping.get(source), {})
+                        name = self.column_name(source)
+                        while name in used:
+                            name += "_"
+                        used.add(name)
+                        columns.append((name, source, self.sql_type(metadata.get("data_type")),
+                                        metadata.get("full_name"), metadata.get("description")))
+                    definition = ", ".join(f'"{name}" {"TEXT" if sql_type == "DATE" else sql_type}'
+                                           for name, _, sql_type, _, _ in columns)
+                    connection.execute(f'CREATE TABLE "{loading_table}" ({definition})')
+                    insert = f'INSERT INTO "{loading_table}" VALUES ({", ".join("?" for _ in columns)})'
+
+                values = [self._convert(df[source], sql_type) for _, source, sql_type, _, _ in columns]
+                connection.executemany(insert, zip(*values))
+                n_rows += len(df)
+
+            with connection:
+                connection.execute(f'DROP TABLE IF EXISTS "{table}"')
+                connection.execute("DELETE FROM _columns WHERE table_name = ?", (table,))
+                if columns is not None:
+                    connection.execute(f'ALTER TABLE "{loading_table}" RENAME TO "{table}"')
+                    connection.executemany(
+                        "INSERT INTO _columns VALUES (?, ?, ?, ?, ?, ?)",
+                        [(table, name, source, sql_type, str(full_name or ""), str(description or ""))
+                         for name, source, sql_type, full_name, description in columns]
+                    )
+                    for name, _, sql_type, _, _ in columns:
+                        if sql_type == "DATE":
+                            connection.execute(f'CREATE INDEX "{table}__{name}" ON "{table}" ("{name}")')
+            return n_rows
+        except Exception as e:
+            raise Exception(f"Error loading {csv_path} into the analytics store: {e}") from e
+        finally:
+            connection.close()
+
+    def has_table(self, file_name: str) -> bool:
+        if not os.path.exists(self.db_path):
+            return False
+        connection = self._connect()
+        try:
+            return connection.execute("SELECT 1 FROM _columns WHERE table_name = ? LIMIT 1",
+                                      (self.table_name(file_name),)).fetchone() is not None
+        finally:
+            connection.close()
+
+    def drop_file(self, file_name: str):
+        table = self.table_name(file_name)
+        connection = self._connect()
+        try:
+            with connection:
+                connection.execute(f'DROP TABLE IF EXISTS "{table}"')
+                connection.execute("DELETE FROM _columns WHERE table_name = ?", (table,))
+        finally:
+            connection.close()
+
+    def open(self) -> bool:
+        """
+        (Re)open the read-only query connection and the column registry. Returns False if there is no store.
+        """
+        with self._lock:
+            if self._reader is not None:
+                self._reader.close()
+                self._reader = None
+            self.columns = []
+            if not os.path.exists(self.db_path):
+                return False
+            self._reader = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True, check_same_thread=False)
+            rows = self._reader.execute(
+                "SELECT table_name, column_name, source_column, sql_type, full_name FROM _columns").fetchall()
+            self.columns = [
+                {"table": table, "column": column, "source": source, "type": sql_type, "full_name": full_name}
+                for table, column, source, sql_type, full_name in rows
+            ]
+            return bool(self.columns)
+
+    def execute(self, sql: str, params: List[Any]) -> Tuple[List[str], List[tuple]]:
+        with self._lock:
+            cursor = self._reader.execute(sql, params)
+            return [description[0] for description in cursor.description], cursor.fetchall()
+
+
+class AnalyticsRouter:
+    """
+    Recognises aggregate, "most recent" and "list all" questions, turns them into parameterized
+    SQL over the AnalyticsStore, and formats the result as a compact table for the LLM context.
+    Questions it cannot map onto known columns return None and go through semantic search instead.
+    """
+
+    def __init__(self, store: AnalyticsStore, max_rows: int = ANALYTICS_MAX_ROWS):
+        self.store = store
+        self.max_rows = max_rows
+
+    @staticmethod
+    def _tokens(text: str) -> set:
+        # Crude singularisation, so "property types" matches the property_type column
+        return {token.rstrip("s") for token in re.findall(r"[a-z0-9]+", text.lower())}
+
+    def _find_column(self, must: Tuple[str, ...], any_of: Tuple[str, ...] = (), sql_type: str = None,
+                     tables: Optional[set] = None) -> Optional[dict]:
+        for column in self.store.columns:
+            parts = set(column["column"].split("_"))
+            if sql_type and column["type"] != sql_type:
+                continue
+            if tables and column["table"] not in tables:
+                continue
+            if all(term in parts for term in must) and (not any_of or parts.intersection(any_of)):
+                return column
+        return None
+
+    def _date_column(self, tables: Optional[set] = None) -> Optional[dict]:
+        return (self._find_column(("document", "date"), sql_type="DATE", tables=tables)
+                or self._find_column(("date",), sql_type="DATE", tables=tables)
+                or self._find_column((), sql_type="DATE", tables=tables))
+
+    @staticmethod
+    def _year_range(question: str) -> Optional[Tuple[str, str, str]]:
+        today = datetime.date.today()
+        if "last year" in question:
+            year = today.year - 1
+        elif "this year" in question:
+            year = today.year
+        else:
+            match = re.search(r"\b(?:in|during|for|of)\s+((?:19|20)\d{2})\b", question)
+            if not match:
+                return None
+            year = int(match.group(1))
+        return f"{year}-01-01", f"{year + 1}-01-01", str(year)
+
+    def plan(self, question: str) -> Optional[Dict[str, Any]]:
+        """
+        Map a question onto a query plan, or None if it is not an aggregate/filter question or has
+        constraints the plan cannot express (record ids, blocks and lots, or numbers other than a
+        year, a borough code or part of a street name).
+        """
+        if not self.store.columns:
+            return None
+        text = " " + question.lower().strip(" ?.!") + " "
+        if any(f" {term} " in text for term in RECORD_TERMS):
+            return None
+        # Whatever is left of the question once its filters are mapped must not hold numbers
+        unmapped = text
+
+        function = next((name for name, terms in AGGREGATE_TERMS if any(f" {t} " in text for t in terms)), None)
+        kind = "aggregate" if function else None
+        if kind is None and any(term in text for term in LATEST_TERMS):
+            kind = "latest"
+        if kind is None and any(f" {term} " in text for term in DISTINCT_TERMS):
+            kind = "distinct"
+        if kind is None:
+            return None
+
+        used = []
+        plan = {"kind": kind, "function": function, "filters": [], "description": []}
+        if kind == "aggregate" and function != "COUNT":
+            measure = self._find_column((), any_of=MEASURE_TERMS, sql_type="REAL")
+            if measure is None:
+                return None
+            plan["measure"] = measure
+            used.append(measure)
+        if kind == "distinct":
+            tokens = self._tokens(text)
+            group = next((c for c in self.store.columns if c["type"] == "TEXT" and len(c["column"].split("_")) > 1
+                          and self._tokens(c["column"].replace("_", " ")) <= tokens), None)
+            if group is None:
+                return None
+            plan["group_by"] = group
+            used.append(group)
+
+        # Prefer filter columns from the tables already in use, to avoid needless joins
+        tables = {column["table"] for column in used} or None
+        borough = next((code for name, code in BOROUGHS.items() if f" {name} " in text), None)
+        borough_code = re.search(r" borough ([1-5]) ", text)
+        if borough is None and borough_code:
+            borough = int(borough_code.group(1))
+            unmapped = unmapped.replace(borough_code.group(0), " ")
+        if borough is not None:
+            column = self._find_column(("borough",), tables=tables) or self._find_column(("borough",))
+            if column is None:
+                return None
+            plan["filters"].append((column, "=", borough))
+            plan["description"].append(f"{column['column']} = {borough}")
+
+        doc_type = next((code for term, code in DOC_TYPE_TERMS.items() if f" {term} " in text), None)
+        if doc_type is not None:
+            column = (self._find_column(("type",), any_of=("doc", "document"), tables=tables)
+                      or self._find_column(("type",), any_of=("doc", "document")))
+            if column is None:
+                return None
+            plan["filters"].append((column, "=", doc_type))
+            plan["description"].append(f"{column['column']} = {doc_type}")
+
+        street = re.search(r" on (.+?)(?= in | during | for | last | this |\s*$)", text)
+        if street:
+            column = self._find_column(("street", "name"), tables=tables) or self._find_column(("street", "name"))
+            if column is None:
+                return None
+            value = street.group(1).strip().upper()
+            unmapped = unmapped.replace(street.group(0), " ")
+            plan["filters"].append((column, "LIKE", f"%{value}%"))
+            plan["description"].append(f"{column['column']} contains {value}")
+
+        years = self._year_range(text)
+        if years:
+            unmapped = unmapped.replace(years[2], " ")
+        if re.search(r"\d", unmapped):
+            return None
+        if years or kind == "latest":
+            date = self._date_column({c["table"] for c in used + [f[0] for f in plan["filters"]]}) or self._date_column()
+            if date is None:
+                return None
+            plan["date"] = date
+            if years:
+                plan["filters"].append((date, ">=", years[0]))
+                plan["filters"].append((date, "<", years[1]))
+                plan["description"].append(f"{date['column']} in {years[2]}")
+        return plan
+
+    def _from_clause(self, columns: List[dict]) -> Optional[Tuple[str, List[str]]]:
+        tables = list(dict.fromkeys(column["table"] for column in columns))
+        if len(tables) == 1:
+            return f'"{tables[0]}"', tables
+        if len(tables) != 2:
+            return None
+        # Join two files on a shared id column, e.g. the ACRIS master and legals on document_id
+        shared = ({c["column"] for c in self.store.columns if c["table"] == tables[0]}
+                  & {c["column"] for c in self.store.columns if c["table"] == tables[1]})
+        keys = sorted(name for name in shared if name.endswith("_id"))
+        if not keys:
+            return None
+        return (f'"{tables[0]}" JOIN "{tables[1]}" ON "{tables[0]}"."{keys[0]}" = "{tables[1]}"."{keys[0]}"',
+                tables)
+
+    def build_sql(self, plan: Dict[str, Any]) -> Optional[Tuple[str, List[Any]]]:
+        """
+        Parameterized SQL for a plan. Identifiers come from the column registry, values are bound.
+        """
+        def ref(column):
+            return f'"{column["table"]}"."{column["column"]}"'
+
+        columns = [f[0] for f in plan["filters"]]
+        for key in ("measure", "group_by", "date"):
+            if key in plan:
+                columns.append(plan[key])
+        from_clause = self._from_clause(columns or [self.store.columns[0]])
+        if from_clause is None:
+            return None
+        source, tables = from_clause
+
+        where = " AND ".join(f"{ref(column)} {op} ?" for column, op, _ in plan["filters"])
+        params = [value for _, _, value in plan["filters"]]
+        where = f" WHERE {where}" if where else ""
+
+        if plan["kind"] == "aggregate":
+            target = f'{plan["function"]}({ref(plan["measure"])})' if "measure" in plan else "COUNT(*)"
+            sql = f"SELECT {target} AS value, COUNT(*) AS matching_records FROM {source}{where}"
+        elif plan["kind"] == "distinct":
+            group = ref(plan["group_by"])
+            sql = (f"SELECT {group} AS {plan['group_by']['column']}, COUNT(*) AS records FROM {source}{where} "
+                   f"GROUP BY {group} ORDER BY records DESC LIMIT ?")
+            params.append(self.max_rows)
+        else:
+            # Columns of the second table that repeat a name of the first (the join key) are left out
+            selected_columns = {}
+            for column in self.store.columns:
+                if column["table"] in tables:
+                    selected_columns.setdefault(column["column"], column)
+            selected = ", ".join(ref(column) for column in selected_columns.values())
+            sql = f"SELECT {selected} FROM {source}{where} ORDER BY {ref(plan['date'])} DESC LIMIT ?"
+            params.append(min(self.max_rows, 5))
+        return sql, params
+
+    def describe(self, plan: Dict[str, Any]) -> str:
+        if plan["kind"] == "aggregate":
+            target = (f"{plan['function']} of {plan['measure']['column']} ({plan['measure']['full_name']})"
+                      if "measure" in plan else "COUNT of records")
+        elif plan["kind"] == "distinct":
+            target = f"distinct {plan['group_by']['column']} values with record counts"
+        else:
+            target = f"most recent records by {plan['date']['column']}"
+        conditions = " and ".join(plan["description"])
+        return target + (f" where {conditions}" if conditions else "")
+
+    @staticmethod
+    def format_table(columns: List[str], rows: List[tuple]) -> str:
+        def cell(value):
+            if isinstance(value, float):
+                return str(int(value)) if value.is_integer() else f"{value:,.2f}"
+            return "" if value is None else str(value)
+
+        lines = [" | ".join(columns)]
+        lines.extend(" | ".join(cell(value) for value in row) for row in rows)
+        return "\n".join(lines)
+
+    def answer(self, question: str) -> Optional[Dict[str, Any]]:
+        """
+        Run the question as a structured query. Returns the context table and query details, or None.
+        """
+        plan = self.plan(question)
+        if plan is None:
+            return None
+        query = self.build_sql(plan)
+        if query is None:
+            return None
+        sql, params = query
+        start = time.perf_counter()
+        columns, rows = self.store.execute(sql, params)
+        seconds = time.perf_counter() - start
+        if not rows or all(value is None for value in rows[0][:1]):
+            return None
+
+        description = self.describe(plan)
+        context = (
+            "ANALYTICS RESULT:\n"
+            f"Computed over all records: {description}\n\n"
+            f"{self.format_table(columns, rows)}"
+        )
+        return {
+            "context": context,
+            "description": description,
+            "sql": sql,
+            "params": params,
+            "rows": len(rows),
+            "seconds": seconds,
+        }
@@ -0,0 +1,169 @@
+import os
+import json
+import time
+import atexit
+import hashlib
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from app.config import ANSWER_CACHE_SIZE, ANSWER_CACHE_THRESHOLD, ANSWER_CACHE_SAVE_INTERVAL
+
+
+class SemanticAnswerCache:
+    """
+    A bounded, persistent cache of LLM answers keyed on the query embedding.
+
+    A stored answer is reused when a new query's embedding has a cosine similarity of at least
+    threshold with a cached query, the same chunks were retrieved, and the chat history is the
+    same. Least recently used answers are evicted beyond maxsize. The cache is written to disk at
+    most every save_interval seconds and at exit, and cleared when the store contents change.
+    """
+
+    def __init__(self, cache_path: Optional[str], maxsize: int = ANSWER_CACHE_SIZE,
+                 threshold: float = ANSWER_CACHE_THRESHOLD, save_interval: float = ANSWER_CACHE_SAVE_INTERVAL):
+        self.cache_path = cache_path
+        self.maxsize = maxsize
+        self.threshold = threshold
+        self.save_interval = save_interval
+        self._lock = threading.Lock()
+        self._entries = []
+        self._matrix = None
+        self._store_fingerprint = None
+        self._dirty = False
+        self._last_save = time.monotonic()
+        self.hits = 0
+        self.misses = 0
+        self.load()
+        atexit.register(self.save)
+
+    @staticmethod
+    def history_key(chat_history: List[Tuple[str, str]]) -> str:
+        """
+        Digest of the exchanges the LLM sees, so answers are only reused in the same conversation state.
+        """
+        recent = json.dumps([list(exchange) for exchange in (chat_history or [])[-3:]])
+        return hashlib.sha256(recent.encode('utf-8')).hexdigest()[:16]
+
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def check_store(self, store_fingerprint: tuple):
+        """
+        Drop every cached answer when the store was re-ingested since they were generated.
+        """
+        store_fingerprint = list(store_fingerprint)
+        with self._lock:
+            if self._store_fingerprint != store_fingerprint:
+                if self._entries:
+                    print(f"Vector store changed, clearing {len(self._entries)} cached answers")
+                self._entries = []
+                self._matrix = None
+                self._store_fingerprint = store_fingerprint
+                self._dirty = True
+
+    def lookup(self, embedding, chunk_ids: List[str], history_key: str) -> Optional[Dict[str, Any]]:
+        """
+        Return the cached entry for a near-duplicate query over the same chunks, or None.
+        """
+        query = self._normalize(embedding)
+        chunk_ids = sorted(chunk_ids)
+        with self._lock:
+            if self._matrix is not None and len(self._entries):
+                similarities = self._matrix @ query
+                for i in np.argsort(-similarities):
+                    if similarities[i] < self.threshold:
+                        break
+                    entry = self._entries[i]
+                    if entry["chunk_ids"] == chunk_ids and entry["history_key"] == history_key:
+                        entry["last_used"] = time.time()
+                        self.hits += 1
+                        return dict(entry, similarity=float(similarities[i]))
+            self.misses += 1
+            return None
+
+    def add(self, query: str, embedding, chunk_ids: List[str], history_key: str,
+            answer: str, retrieval_details: Dict[str, Any]):
+        """
+        Store an answer, evicting the least recently used entry when the cache is full.
+        """
+        if self.maxsize <= 0:
+            return
+        entry = {
+            "query": query,
+            "embedding": self._normalize(embedding),
+            "chunk_ids": sorted(chunk_ids),
+            "history_key": history_key,
+            "answer": answer,
+            "retrieval_details": retrieval_details,
+            "last_used": time.time(),
+        }
+        with self._lock:
+            self._entries.append(entry)
+            if len(self._entries) > self.maxsize:
+                oldest = min(range(len(self._entries)), key=lambda i: self._entries[i]["last_used"])
+                del self._entries[oldest]
+            self._matrix = np.vstack([e["embedding"] for e in self._entries])
+            self._dirty = True
+            save_due = time.monotonic() - self._last_save >= self.save_interval
+        if save_due:
+            self.save()
+
+    def clear(self):
+        with self._lock:
+            self._entries = []
+            self._matrix = None
+            self._dirty = True
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def load(self):
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return
+        try:
+            with open(self.cache_path, 'r') as file:
+                data = json.load(file)
+            entries = data.get("entries", [])
+            for entry in entries:
+                entry["embedding"] = np.asarray(entry["embedding"], dtype=np.float32)
+            self._entries = entries[-self.maxsize:] if self.maxsize > 0 else []
+            self._matrix = np.vstack([e["embedding"] for e in self._entries]) if self._entries else None
+            self._store_fingerprint = data.get("store_fingerprint")
+        except (json.JSONDecodeError, KeyError, ValueError) as e:
+            print(f"Error reading answer cache, starting empty: {e}")
+            self._entries = []
+            self._matrix = None
+
+    def save(self):
+        """
+        Write the cache atomically if it changed since the last save.
+        """
+        if not self.cache_path:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            data = {
+                "store_fingerprint": self._store_fingerprint,
+                "entries": [dict(entry, embedding=entry["embedding"].tolist()) for entry in self._entries],
+            }
+            self._dirty = False
+            self._last_save = time.monotonic()
+        try:
+            # Unique per process and thread, since several API workers or UI processes share the file
+            tmp_path = f"{self.cache_path}.tmp-{os.getpid()}-{threading.get_ident()}"
+            with open(tmp_path, 'w') as file:
+                json.dump(data, file, default=str)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            print(f"Error saving answer cache: {e}")
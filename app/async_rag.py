@@ -0,0 +1,139 @@
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+from app.config import MAX_CONCURRENT_REQUESTS, MAX_QUEUE_DEPTH, RETRIEVAL_WORKERS
+from app.metrics import REGISTRY
+
+
+class AsyncRAGProcessor:
+    """
+    An asyncio front end for RAGProcessor with bounded concurrency and admission control.
+
+    At most max_concurrency requests run at once. Retrieval runs in a thread pool and the LLM
+    call uses the async Groq client, so the event loop is never blocked. Up to max_queue_depth
+    further requests wait for a slot; beyond that a request is answered immediately with a
+    "busy" response instead of letting latency grow without bound.
+    """
+
+    BUSY_RESPONSE = "The system is busy right now. Please try again in a moment."
+
+    def __init__(self, rag_processor, max_concurrency: int = MAX_CONCURRENT_REQUESTS,
+                 max_queue_depth: int = MAX_QUEUE_DEPTH, retrieval_workers: int = RETRIEVAL_WORKERS):
+        self.rag_processor_instance = rag_processor
+        self.max_concurrency = max_concurrency
+        self.max_queue_depth = max_queue_depth
+        self.executor = ThreadPoolExecutor(max_workers=retrieval_workers, thread_name_prefix="retrieval")
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.in_flight = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.completed = 0
+        self.total_wait_seconds = 0.0
+
+    def metrics(self) -> Dict[str, Any]:
+        """
+        Queue-depth and admission metrics of the async pipeline.
+        """
+        return {
+            "in_flight": self.in_flight,
+            "queue_depth": self.waiting,
+            "max_concurrency": self.max_concurrency,
+            "max_queue_depth": self.max_queue_depth,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "completed": self.completed,
+            "avg_queue_wait_seconds": self.total_wait_seconds / self.admitted if self.admitted else 0.0,
+        }
+
+    def busy_details(self) -> Dict[str, Any]:
+        retrieval_details = self.rag_processor_instance.new_retrieval_details()
+        retrieval_details["steps"].append("Rejected: request queue is full")
+        retrieval_details["busy"] = True
+        retrieval_details["queue"] = self.metrics()
+        return retrieval_details
+
+    async def rag_query_stream(self, query: str, chat_history: List[Tuple[str, str]],
+                               before_llm: Optional[Callable[[], Awaitable[Any]]] = None) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Async streaming RAG query: yields (answer so far, retrieval details) as tokens arrive.
+        before_llm, e.g. a rate limiter, is awaited right before the LLM call, so answers that need
+        no LLM call (answer cache hits, no matching records) never wait for it.
+        """
+        start = time.perf_counter()
+        if self._semaphore.locked() and self.waiting >= self.max_queue_depth:
+            self.rejected += 1
+            retrieval_details = self.busy_details()
+            self.rag_processor_instance.record_request(start, retrieval_details)
+            yield self.BUSY_RESPONSE, retrieval_details
+            return
+
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        queue_wait = time.perf_counter() - start
+        self.admitted += 1
+        self.total_wait_seconds += queue_wait
+        REGISTRY.observe("rag_queue_wait_seconds", queue_wait, help="Time requests waited for a free slot")
+        self.in_flight += 1
+
+        rag = self.rag_processor_instance
+        llm = rag.llm_processor_instance
+        loop = asyncio.get_running_loop()
+        retrieval_details = rag.new_retrieval_details()
+        retrieval_details["queue_wait_seconds"] = queue_wait
+        try:
+            response, retrieval_details, generation = await loop.run_in_executor(
+                self.executor, rag.prepare_query, query, chat_history, retrieval_details
+            )
+            if generation is None:
+                yield response, retrieval_details
+                return
+            if before_llm is not None:
+                await before_llm()
+
+            parts = []
+            try:
+                async for delta in llm.agenerate_response_stream(
+                    generation["enhanced_query"],
+                    generation["context"],
+                    chat_history,
+                    retrieval_details
+                ):
+                    if not parts:
+                        retrieval_details["time_to_first_token"] = time.perf_counter() - start
+                    parts.append(delta)
+                    yield "".join(parts), retrieval_details
+                response = "".join(parts)
+            except Exception as e:
+                print(f"Error generating response: {e}")
+                response = llm.ERROR_RESPONSE
+                yield response, retrieval_details
+
+            # The answer cache may write to disk, keep it off the event loop
+            await loop.run_in_executor(self.executor, rag.finish_query, query, response, retrieval_details, generation)
+
+        except Exception as e:
+            error_message = f"Error during RAG query process: {str(e)}"
+            retrieval_details["error"] = error_message
+            retrieval_details["steps"].append("Error occurred during processing")
+            print(error_message)
+            yield "An error occurred while processing your query.", retrieval_details
+        finally:
+            rag.record_request(start, retrieval_details)
+            self.in_flight -= 1
+            self.completed += 1
+            self._semaphore.release()
+
+    async def rag_query_with_explanation(self, query: str, chat_history: List[Tuple[str, str]],
+                                         before_llm: Optional[Callable[[], Awaitable[Any]]] = None) -> Tuple[str, Dict[str, Any]]:
+        """
+        Async RAG query returning the complete answer.
+        """
+        response, retrieval_details = "", {}
+        async for response, retrieval_details in self.rag_query_stream(query, chat_history, before_llm):
+            pass
+        return response, retrieval_details
@@ -0,0 +1,97 @@
+import re
+import datetime
+import warnings
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+from app.analytics import BOROUGHS, DOC_TYPE_TERMS
+
+# Only ingestion needs pandas, the query side imports this module without it
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+def row_fields(df: "pd.DataFrame") -> Dict[str, list]:
+    """
+    Per-row borough code, document type and date (as a YYYYMMDD integer) of a CSV batch, taken from
+    the first columns whose normalized names contain "borough", "doc" and "type", and "date".
+    Missing columns or unparsable values give None.
+    """
+    import pandas as pd
+    from app.preProcessing import DocumentProcessor
+
+    columns = {DocumentProcessor.normalize_column_name(str(column)): column for column in df.columns}
+    borough = next((c for name, c in columns.items() if "borough" in name), None)
+    doc_type = next((c for name, c in columns.items() if "doc" in name and "type" in name), None)
+    date = next((c for name, c in columns.items() if "date" in name), None)
+    n_rows = len(df)
+
+    fields = {"borough": [None] * n_rows, "doc_type": [None] * n_rows, "date": [None] * n_rows}
+    if borough is not None:
+        values = pd.to_numeric(df[borough], errors="coerce")
+        fields["borough"] = [int(value) if value == value else None for value in values.tolist()]
+    if doc_type is not None:
+        fields["doc_type"] = [str(value).strip().upper() if value == value else None
+                              for value in df[doc_type].tolist()]
+    if date is not None:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", UserWarning)
+            dates = pd.to_datetime(df[date], errors="coerce")
+        values = dates.dt.year * 10000 + dates.dt.month * 100 + dates.dt.day
+        fields["date"] = [int(value) if value == value else None for value in values.tolist()]
+    return fields
+
+
+def chunk_fields(fields: Dict[str, list], start: int, end: int) -> Dict[str, Any]:
+    """
+    Filterable chunk metadata for rows start..end (inclusive) of `fields`. Chroma metadata values
+    must be scalars, so each borough and document type present becomes a boolean flag
+    (borough_3, doc_type_MTGE) and the dates become a date_min/date_max range.
+    """
+    metadata = {}
+    for borough in {value for value in fields["borough"][start:end + 1] if value is not None}:
+        metadata[f"borough_{borough}"] = True
+    for doc_type in {value for value in fields["doc_type"][start:end + 1] if value}:
+        metadata[f"doc_type_{doc_type}"] = True
+    dates = [value for value in fields["date"][start:end + 1] if value is not None]
+    if dates:
+        metadata["date_min"] = min(dates)
+        metadata["date_max"] = max(dates)
+    return metadata
+
+
+def extract_where(query: str) -> Optional[Dict[str, Any]]:
+    """
+    Turn the boroughs, document types and year named in a question into a Chroma `where` filter
+    over the chunk fields, e.g. "mortgages in Queens in 2019" ->
+    borough_4 AND doc_type_MTGE AND a date range overlapping 2019. Returns None if nothing matched.
+    """
+    text = " " + re.sub(r"[^a-z0-9 ]+", " ", query.lower()) + " "
+    conditions = []
+
+    boroughs = [code for name, code in BOROUGHS.items() if f" {name} " in text]
+    if boroughs:
+        conditions.append(_any_of([{f"borough_{code}": True} for code in boroughs]))
+
+    doc_types = sorted({code for term, code in DOC_TYPE_TERMS.items() if f" {term} " in text})
+    if doc_types:
+        conditions.append(_any_of([{f"doc_type_{code}": True} for code in doc_types]))
+
+    year = None
+    if " last year " in text:
+        year = datetime.date.today().year - 1
+    elif " this year " in text:
+        year = datetime.date.today().year
+    else:
+        match = re.search(r" (?:in|during|for|of|since) ((?:19|20)\d{2}) ", text)
+        if match:
+            year = int(match.group(1))
+    if year is not None:
+        conditions.append({"date_max": {"$gte": year * 10000 + 101}})
+        conditions.append({"date_min": {"$lte": year * 10000 + 1231}})
+
+    if not conditions:
+        return None
+    return conditions[0] if len(conditions) == 1 else {"$and": conditions}
+
+
+def _any_of(conditions: List[Dict[str, Any]]) -> Dict[str, Any]:
+    return conditions[0] if len(conditions) == 1 else {"$or": conditions}
@@ -1,7 +1,6 @@
 import os
-from groq import Groq
+import threading
 from dotenv import load_dotenv
-load_dotenv()
 
 
 class ClientManager:
@@ -23,31 +22,94 @@ class ClientManager:
         Initializes clients for Groq and VectorDB.
         """
         try:
+            load_dotenv()
             self.vector_store_path = os.environ.get("VECTOR_STORE")
             self.embedding_model = os.environ.get("EMBED_MODEL")
+            self.embedding_backend = os.environ.get("EMBED_BACKEND", "torch")
+            self.retrieval_backend = os.environ.get("RETRIEVAL_BACKEND", "chroma")
+            self.flat_index_path = os.environ.get("FLAT_INDEX_PATH", "flat_index")
             self.LLM_model = os.environ.get("MODEL")
-            self.client = Groq()
+            self.llm_backend = os.environ.get("LLM_BACKEND", "groq")
+            # The LLM clients are created on first use, importing groq only then
+            self.client = None
+            self.async_client = None
+            self._client_lock = threading.Lock()
             self.json_file_path = os.environ.get("JSON_PATH")
+            self.qa_log_path = os.environ.get("QA_LOG_PATH") or os.path.splitext(self.json_file_path or "qa_history")[0] + ".jsonl"
             self.folder = os.environ.get("FILE_PATH")
+            self.manifest_path = os.environ.get("MANIFEST_PATH", "ingest_manifest.json")
+            self.answer_cache_path = os.environ.get("ANSWER_CACHE_PATH", "answer_cache.json")
+            self.lexical_index_path = os.environ.get("LEXICAL_INDEX_PATH", "lexical_index")
+            self.analytics_db_path = os.environ.get("ANALYTICS_DB_PATH", "analytics.sqlite")
+            self.schema_registry_path = os.environ.get("SCHEMA_REGISTRY_PATH", "schema_registry.json")
 
         except Exception as e:
             print(f"Error initializing clients: {e}")
             raise
 
+    def create_client(self, asynchronous: bool = False):
+        """
+        Creates the LLM client for LLM_BACKEND: "groq" (default) or "fake", a local stand-in for benchmarks.
+        """
+        if self.llm_backend == "fake":
+            from app.fake_llm import FakeLLMClient, AsyncFakeLLMClient
+            return AsyncFakeLLMClient() if asynchronous else FakeLLMClient()
+        if self.llm_backend != "groq":
+            raise ValueError(f"Unknown LLM_BACKEND: {self.llm_backend}")
+        from groq import Groq, AsyncGroq
+        return AsyncGroq() if asynchronous else Groq()
+
     def get_vector_store_path(self):
         return self.vector_store_path
 
     def get_embedding_model(self):
         return self.embedding_model
 
+    def get_embedding_backend(self):
+        return self.embedding_backend
+
+    def get_retrieval_backend(self):
+        return self.retrieval_backend
+
+    def get_flat_index_path(self):
+        return self.flat_index_path
+
     def get_LLM_model(self):
         return self.LLM_model
 
     def get_client(self):
-        return self.client
+        with self._client_lock:
+            if self.client is None:
+                self.client = self.create_client()
+            return self.client
+
+    def get_async_client(self):
+        # Created on first use so the synchronous UI path never opens an async HTTP client
+        with self._client_lock:
+            if self.async_client is None:
+                self.async_client = self.create_client(asynchronous=True)
+            return self.async_client
 
     def get_json_file_path(self):
         return self.json_file_path
 
+    def get_qa_log_path(self):
+        return self.qa_log_path
+
     def get_folder(self):
-        return self.folder
\ No newline at end of file
+        return self.folder
+
+    def get_manifest_path(self):
+        return self.manifest_path
+
+    def get_answer_cache_path(self):
+        return self.answer_cache_path
+
+    def get_lexical_index_path(self):
+        return self.lexical_index_path
+
+    def get_analytics_db_path(self):
+        return self.analytics_db_path
+
+    def get_schema_registry_path(self):
+        return self.schema_registry_path
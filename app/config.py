@@ -1,7 +1,54 @@
 CHUNK_SIZE = 500 # maximum size of each chunk
+CHUNKING_MODE = "records" # "records" packs whole CSV rows into each chunk and repeats the schema header; "sentence" splits the file text on '. '
+CHUNK_OVERLAP_ROWS = 0 # number of rows repeated at the start of the next chunk in "records" chunking mode
 BATCH_SIZE = 100  # number of documents processed and inserted into the ChromaDB collection in each batch
+INGEST_BATCH_ROWS = 5000 # number of CSV rows read, formatted, chunked and inserted at a time in streaming ingestion mode
+EMBED_BATCH_SIZE = 256 # number of chunks embedded per SentenceTransformer call (and written per upsert) in the ingestion pipeline
+EMBED_THREADS = 0 # CPU threads of the embedding model; 0 keeps the PyTorch / ONNX Runtime default
+PIPELINE_QUEUE_SIZE = 8 # maximum number of batches waiting between two stages of the ingestion pipeline
 TEMPERATURE = 0.7 # controls the randomness of the model’s output
 MAX_TOKENS = 1024  # Max token limit
 TOP_P = 1 # cumulative probability of the token selection
-N_CHUNKS = 2 # no of similar chunks (context) to be retrieved from vectorDB
-CONFIDENCE_THRESHOLD = 0.6 # filters semantic search results by only including documents with a similarity (distance) score greater than or equal to a specified value, ensuring relevance
\ No newline at end of file
+N_CHUNKS = 10 # no of candidate chunks retrieved from vectorDB; the context packer keeps as many as fit the token budget
+MODEL_CONTEXT_WINDOW = 8192 # context window of the LLM in tokens
+CONTEXT_TOKEN_BUDGET = 3000 # maximum tokens of retrieved context in the prompt, capped by the context window minus MAX_TOKENS and PROMPT_RESERVE_TOKENS
+PROMPT_RESERVE_TOKENS = 1024 # tokens kept free for the system prompt, chat history and question
+SCHEMA_MAX_COLUMNS = 6 # column descriptions attached to the context per source file, chosen by the terms of the question
+HYBRID_SEARCH = True # fuse BM25 lexical hits with the vector search results
+HYBRID_CANDIDATES = 20 # candidates taken from each retriever before reciprocal-rank fusion
+RRF_K = 60 # reciprocal-rank fusion constant, larger values flatten the rank weights
+BM25_K1 = 1.5 # BM25 term frequency saturation
+BM25_B = 0.75 # BM25 document length normalisation
+RERANK_MMR = True # rerank over-fetched search candidates by maximal marginal relevance, so near-duplicate chunks do not fill the context
+RERANK_CANDIDATES = 30 # candidates fetched with their embeddings for reranking, of which N_CHUNKS are kept
+MMR_LAMBDA = 0.7 # weight of query relevance against novelty in the MMR score; 1.0 keeps the search order
+MAX_CHUNKS_PER_SOURCE = 0 # chunks of the same source file kept by the reranker; 0 disables the cap
+FILTER_PUSHDOWN = True # restrict the vector search to chunks matching the borough, document type and year named in the question
+ANALYTICS_ENABLED = True # answer aggregate and filter questions with SQL over the analytics store
+ANALYTICS_MAX_ROWS = 20 # maximum rows of a structured query result passed to the LLM
+QUERY_CACHE_SIZE = 1024 # maximum number of cached query embeddings and semantic search results
+QUERY_CACHE_TTL = 3600 # seconds a cached query embedding or search result stays valid; None keeps entries until evicted
+FLAT_INDEX_DTYPE = "float32" # storage type of the embedding matrix of the flat index (RETRIEVAL_BACKEND=flat); "float16" halves its size and page cache footprint, but converting it back makes searches several times slower
+FLAT_INDEX_THREADS = 1 # threads that search blocks of the flat index in parallel
+FLAT_INDEX_BLOCK_ROWS = 65536 # rows of the flat index compared with the query per matrix product
+ANSWER_CACHE_SIZE = 500 # maximum number of LLM answers kept in the semantic answer cache; 0 disables it
+ANSWER_CACHE_THRESHOLD = 0.95 # minimum cosine similarity between two query embeddings for a cached answer to be reused
+ANSWER_CACHE_SAVE_INTERVAL = 30 # minimum seconds between two writes of the answer cache to disk
+QA_LOG_BATCH_SIZE = 50 # maximum number of Q&A records written to the log in one batch
+QA_LOG_FLUSH_INTERVAL = 1.0 # seconds the Q&A log writer waits for new records before checking again
+QA_LOG_FSYNC = "batch" # fsync policy of the Q&A log: "always" (every record), "batch" (every batch) or "never"
+QA_LOG_MAX_BYTES = 50 * 1024 * 1024 # size at which the Q&A log is rotated; 0 disables rotation
+QA_LOG_BACKUP_COUNT = 5 # number of rotated Q&A log files kept
+QA_LOG_QUEUE_SIZE = 10000 # maximum number of Q&A records waiting to be written before new ones are dropped
+CONFIDENCE_THRESHOLD = 0.2 # minimum cosine similarity between the query and a retrieved chunk (converted from the search distance, where smaller is closer) for the chunk to be packed into the context
+MAX_CONCURRENT_REQUESTS = 8 # RAG requests the async pipeline processes at the same time
+MAX_QUEUE_DEPTH = 32 # requests allowed to wait for a free slot before new ones get an immediate "busy" response
+RETRIEVAL_WORKERS = 8 # threads running the blocking retrieval steps of the async pipeline
+BATCH_QUERY_SIZE = 64 # questions whose retrieval is batched into one embedding call and one vector query in batch_query.py
+LLM_REQUESTS_PER_MINUTE = 30 # rate limit of the LLM calls batch_query.py issues; 0 disables it
+API_HOST = "127.0.0.1" # bind address of api.py; "0.0.0.0" exposes the unauthenticated API (and its Groq credits) on every interface
+API_PORT = 8000 # port of the JSON/HTTP API served by api.py
+API_WORKERS = 1 # worker processes of the API server, each with its own pipeline over the shared on-disk store
+METRICS_PORT = 9464 # port of the Prometheus text endpoint (GET /metrics), 0 disables it
+METRICS_HOST = "127.0.0.1" # bind address of the metrics endpoint; "0.0.0.0" exposes it on every interface, e.g. for a Prometheus server on another host
+WARMUP_QUERY = "NYC property records" # query run once at startup to load the embedding model before the first user request; set to None to skip
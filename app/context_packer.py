@@ -0,0 +1,134 @@
+from typing import Any, Dict, List, Optional, Tuple
+from app.config import CONTEXT_TOKEN_BUDGET, MODEL_CONTEXT_WINDOW, MAX_TOKENS, PROMPT_RESERVE_TOKENS
+
+_HEADER_MARKER = "FILE METADATA:"
+_DATA_MARKER = "DATA RECORDS:"
+_SEPARATOR = "\n\n---\n\n"
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token count of a text (about four characters per token for English and CSV records).
+    """
+    return (len(text) + 3) // 4
+
+
+class ContextPacker:
+    """
+    Pack retrieved chunks into the LLM context within a token budget.
+
+    Chunks are taken in retrieval order, without reranking. Records already packed from an earlier
+    chunk (overlapping or duplicated chunks) are dropped when they repeat exactly, and the schema
+    header of a source file is written once, followed by the records of all its chunks, instead of
+    once per chunk. Chunks are added until the budget is used up, so the number of chunks in the
+    prompt depends on their size rather than a fixed k. Column descriptions are not part of the
+    chunks: they come from the schema registry and are written once per source section, counting
+    towards the budget.
+    """
+
+    def __init__(self, token_budget: Optional[int] = None):
+        available = MODEL_CONTEXT_WINDOW - MAX_TOKENS - PROMPT_RESERVE_TOKENS
+        self.token_budget = max(0, min(token_budget or CONTEXT_TOKEN_BUDGET, available))
+
+    @staticmethod
+    def split_chunk(document: str) -> Tuple[str, List[str]]:
+        """
+        Split a chunk into its schema header ("" if it has none) and its records.
+        """
+        if _HEADER_MARKER in document and _DATA_MARKER in document:
+            header, data = document.split(_DATA_MARKER, 1)
+            header = header.replace(_HEADER_MARKER, "").strip()
+            return header, [line.strip() for line in data.splitlines() if line.strip()]
+        return "", [document.strip()]
+
+    @staticmethod
+    def header_source(header: str) -> str:
+        """
+        The source file named in a schema header, "" if there is none.
+        """
+        for line in header.splitlines():
+            if line.startswith("Source:"):
+                return line[len("Source:"):].strip()
+        return ""
+
+    @staticmethod
+    def format_section(header: str, records: List[str], columns: str = "") -> str:
+        if header:
+            columns = f"\n{columns}" if columns else ""
+            return header + columns + "\nData Records:\n" + "\n".join(records)
+        return "\n".join(records)
+
+    @classmethod
+    def unpacked_context(cls, documents: List[str]) -> str:
+        """
+        The context as it would be without packing: every chunk with its own header.
+        """
+        return _SEPARATOR.join(cls.format_section(*cls.split_chunk(document)) for document in documents)
+
+    def pack(self, ids: List[str], documents: List[str],
+             column_info: Optional[Dict[str, str]] = None) -> Tuple[str, List[str], Dict[str, Any]]:
+        """
+        Pack the ranked chunks.
+        Args:
+            ids (list): Chunk ids, best first.
+            documents (list): The chunk texts.
+            column_info (dict, optional): Column descriptions by source file, added to the section of that file.
+        Returns:
+            tuple: The context text, the ids of the chunks it uses and packing statistics.
+        """
+        sections = {}  # header -> records, in order of first use
+        seen_records = set()
+        used_ids = []
+        fitted = []  # packed and duplicate chunks, i.e. what an unpacked context would contain
+        duplicates = 0
+        headers_dropped = 0
+        column_info = column_info or {}
+        columns = {}  # header -> column descriptions of its source
+        tokens = 0
+
+        for chunk_id, document in zip(ids, documents):
+            header, records = self.split_chunk(document)
+            new_records = []
+            for record in records:
+                key = " ".join(record.lower().split())
+                if key not in seen_records:
+                    seen_records.add(key)
+                    new_records.append(record)
+            if not new_records:
+                duplicates += 1
+                fitted.append(document)
+                continue
+
+            cost = sum(estimate_tokens(record + "\n") for record in new_records)
+            if header not in sections:
+                columns.setdefault(header, column_info.get(self.header_source(header), ""))
+                cost += estimate_tokens(self.format_section(header, [], columns[header]) + _SEPARATOR)
+            # Always pack the best chunk, even when it alone exceeds the budget
+            if used_ids and tokens + cost > self.token_budget:
+                for record in new_records:
+                    seen_records.discard(" ".join(record.lower().split()))
+                continue
+
+            if header in sections:
+                headers_dropped += 1
+            sections.setdefault(header, []).extend(new_records)
+            used_ids.append(chunk_id)
+            fitted.append(document)
+            tokens += cost
+
+        context = _SEPARATOR.join(self.format_section(header, records, columns[header])
+                                  for header, records in sections.items())
+        packed_tokens = estimate_tokens(context)
+        unpacked_tokens = estimate_tokens(self.unpacked_context(fitted))
+        stats = {
+            "candidates": len(ids),
+            "packed_chunks": len(used_ids),
+            "duplicates_dropped": duplicates,
+            "over_budget": len(ids) - len(used_ids) - duplicates,
+            "headers_dropped": headers_dropped,
+            "token_budget": self.token_budget,
+            "context_tokens": packed_tokens,
+            "column_info_tokens": sum(estimate_tokens(columns[header]) for header in sections),
+            "tokens_saved": max(0, unpacked_tokens - packed_tokens),
+        }
+        return context, used_ids, stats
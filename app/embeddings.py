@@ -0,0 +1,83 @@
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from chromadb.utils import embedding_functions
+from app.config import EMBED_BATCH_SIZE, EMBED_THREADS
+
+# Backends that produce interchangeable vectors share a precision: the ONNX export of a model
+# matches its PyTorch fp32 output to float rounding, int8 quantization shifts every vector.
+EMBED_BACKENDS = {"torch": "fp32", "onnx": "fp32", "int8": "int8"}
+EMBEDDING_SIGNATURE_KEY = "embedding_signature"
+
+
+def embedding_signature(model_name: str, backend: str) -> str:
+    """
+    Identifies the vector space a model and backend embed into, e.g. "all-MiniLM-L6-v2:fp32".
+    """
+    return f"{model_name}:{EMBED_BACKENDS[backend]}"
+
+
+class SentenceTransformerEmbedder(embedding_functions.SentenceTransformerEmbeddingFunction):
+    """
+    Chroma's SentenceTransformer embedding function with direct, batched access to the model,
+    so ingestion can compute embeddings itself and pass them to collection.add/upsert.
+    Vectors are identical to the ones Chroma computes for queries, and always unit length.
+
+    The model runs on one of the CPU backends in EMBED_BACKENDS: "torch" (PyTorch fp32, the
+    default), "onnx" (ONNX Runtime, exported on first use; needs optimum[onnxruntime]) or "int8"
+    (PyTorch with the Linear layers dynamically quantized to int8).
+    """
+
+    # Loaded models by (model name, backend); Chroma's own cache is keyed by model name only
+    models: Dict[Tuple[str, str], Any] = {}
+
+    def __init__(self, model_name: str, device: str = "cpu", batch_size: int = EMBED_BATCH_SIZE,
+                 backend: str = "torch", threads: int = EMBED_THREADS):
+        if backend not in EMBED_BACKENDS:
+            raise ValueError(f"Unsupported embedding backend: {backend} (expected one of {', '.join(EMBED_BACKENDS)})")
+        key = (model_name, backend)
+        if key not in self.models:
+            self.models[key] = self.load_model(model_name, device, backend, threads)
+        self._model = self.models[key]
+        # Distances are turned into cosine similarities assuming unit vectors, which not every model
+        # produces itself (all-MiniLM-L6-v2 ends with a Normalize layer, others do not)
+        self._normalize_embeddings = True
+        self.model_name = model_name
+        self.backend = backend
+        self.batch_size = batch_size
+        self.signature = embedding_signature(model_name, backend)
+
+    @staticmethod
+    def load_model(model_name: str, device: str, backend: str, threads: int):
+        """
+        Load the SentenceTransformer on the requested backend; threads > 0 limits its CPU threads.
+        """
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        if threads:
+            torch.set_num_threads(threads)
+        if backend == "onnx":
+            import onnxruntime
+
+            session_options = onnxruntime.SessionOptions()
+            if threads:
+                session_options.intra_op_num_threads = threads
+            return SentenceTransformer(model_name, device="cpu", backend="onnx",
+                                       model_kwargs={"provider": "CPUExecutionProvider",
+                                                     "session_options": session_options})
+
+        model = SentenceTransformer(model_name, device=device if backend == "torch" else "cpu")
+        if backend == "int8":
+            model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+        return model
+
+    def embed(self, texts: List[str], batch_size: Optional[int] = None) -> np.ndarray:
+        """
+        Embed texts in batches of batch_size (defaults to EMBED_BATCH_SIZE).
+        """
+        return self._model.encode(
+            list(texts),
+            batch_size=batch_size or self.batch_size,
+            convert_to_numpy=True,
+            normalize_embeddings=self._normalize_embeddings,
+        )
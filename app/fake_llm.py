@@ -0,0 +1,82 @@
+import os
+import time
+import asyncio
+from types import SimpleNamespace
+from typing import Dict, List
+
+DEFAULT_ANSWER = ("Based on the records provided, the matching property documents are listed above "
+                  "with their borough, block, lot, document type and recorded amount.")
+
+
+class FakeLLMClient:
+    """
+    A local stand-in for the Groq client, used by benchmarks and offline runs (LLM_BACKEND=fake).
+    Mimics chat.completions.create: waits `latency` seconds before the first token, then emits
+    the answer word by word at `tokens_per_second`.
+    """
+
+    def __init__(self, latency: float = None, tokens_per_second: float = None, answer: str = DEFAULT_ANSWER):
+        self.latency = float(os.environ.get("FAKE_LLM_LATENCY", 0.5)) if latency is None else latency
+        self.tokens_per_second = (float(os.environ.get("FAKE_LLM_TOKENS_PER_SECOND", 200))
+                                  if tokens_per_second is None else tokens_per_second)
+        self.answer = answer
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def tokens(self, max_tokens: int = None) -> List[str]:
+        words = self.answer.split(" ")
+        tokens = [word + " " for word in words[:-1]] + words[-1:]
+        return tokens[:max_tokens] if max_tokens else tokens
+
+    @staticmethod
+    def chunk(content: str, usage: Dict[str, int] = None):
+        chunk = SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content))])
+        # Like Groq, the last chunk carries the token usage
+        chunk.x_groq = SimpleNamespace(usage=SimpleNamespace(**usage)) if usage else None
+        return chunk
+
+    @staticmethod
+    def usage(messages: List[Dict[str, str]], tokens: List[str]) -> Dict[str, int]:
+        prompt_chars = sum(len(message.get("content", "")) for message in messages or [])
+        return {"prompt_tokens": prompt_chars // 4, "completion_tokens": len(tokens)}
+
+    @staticmethod
+    def completion(content: str, usage: Dict[str, int]):
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+                               usage=SimpleNamespace(**usage))
+
+    def create(self, model: str = None, messages: List[Dict[str, str]] = None, stream: bool = False,
+               max_tokens: int = None, **kwargs):
+        self.calls += 1
+        tokens = self.tokens(max_tokens)
+        if not stream:
+            time.sleep(self.latency + len(tokens) / self.tokens_per_second)
+            return self.completion("".join(tokens), self.usage(messages, tokens))
+        return self._stream(tokens, self.usage(messages, tokens))
+
+    def _stream(self, tokens: List[str], usage: Dict[str, int]):
+        time.sleep(self.latency)
+        for i, token in enumerate(tokens):
+            time.sleep(1 / self.tokens_per_second)
+            yield self.chunk(token, usage if i == len(tokens) - 1 else None)
+
+
+class AsyncFakeLLMClient(FakeLLMClient):
+    """
+    Async counterpart of FakeLLMClient, standing in for groq.AsyncGroq.
+    """
+
+    async def create(self, model: str = None, messages: List[Dict[str, str]] = None, stream: bool = False,
+                     max_tokens: int = None, **kwargs):
+        self.calls += 1
+        tokens = self.tokens(max_tokens)
+        if not stream:
+            await asyncio.sleep(self.latency + len(tokens) / self.tokens_per_second)
+            return self.completion("".join(tokens), self.usage(messages, tokens))
+        return self._astream(tokens, self.usage(messages, tokens))
+
+    async def _astream(self, tokens: List[str], usage: Dict[str, int]):
+        await asyncio.sleep(self.latency)
+        for i, token in enumerate(tokens):
+            await asyncio.sleep(1 / self.tokens_per_second)
+            yield self.chunk(token, usage if i == len(tokens) - 1 else None)
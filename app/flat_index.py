@@ -0,0 +1,319 @@
+import os
+import json
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+import numpy as np
+from app.config import BATCH_SIZE, FLAT_INDEX_DTYPE, FLAT_INDEX_THREADS, FLAT_INDEX_BLOCK_ROWS
+
+_FORMAT_VERSION = 1
+_ARRAYS = ("embeddings", "norms", "document_offsets", "metadata_offsets", "ids", "sorted_ids", "sorted_rows")
+
+
+class FlatIndex:
+    """
+    A read-only, memory-mapped export of the vector store for serving replicas.
+
+    The index is a directory of flat files: the embedding matrix (float16 or float32, one row per
+    chunk) with the norm of every row, the documents and JSON metadatas as UTF-8 blobs with offset
+    tables, the chunk ids (also sorted, for lookups by id), and one array per metadata field for
+    `where` filters.
+    load() memory-maps all of it, so opening the index takes milliseconds, and worker processes
+    serving the same index share its pages in the OS page cache instead of each holding a copy.
+
+    Searches are exact: the query vectors are compared with every row, block by block, with NumPy
+    matrix products and a partial sort per block, optionally with the blocks split over threads.
+    It answers query, get and count like the ChromaDB collection it was exported from, with the
+    same distances, so RAGProcessor uses it unchanged.
+    """
+
+    def __init__(self, path: str, arrays: Dict[str, np.ndarray], meta: Dict[str, Any], embedding_function=None,
+                 threads: int = FLAT_INDEX_THREADS, block_rows: int = FLAT_INDEX_BLOCK_ROWS):
+        self.path = path
+        self.name = meta.get("name", "flat_index")
+        self.embeddings = arrays["embeddings"]
+        self.norms = arrays["norms"]
+        self.document_offsets = arrays["document_offsets"]
+        self.metadata_offsets = arrays["metadata_offsets"]
+        self.ids = arrays["ids"]
+        self.sorted_ids = arrays["sorted_ids"]
+        self.sorted_rows = arrays["sorted_rows"]
+        self.documents_blob = np.memmap(os.path.join(path, "documents.bin"), dtype=np.uint8, mode='r') \
+            if self.document_offsets[-1] else np.zeros(0, dtype=np.uint8)
+        self.metadatas_blob = np.memmap(os.path.join(path, "metadatas.bin"), dtype=np.uint8, mode='r') \
+            if self.metadata_offsets[-1] else np.zeros(0, dtype=np.uint8)
+        self.fields = meta.get("fields", [])
+        self.space = meta.get("space", "l2")
+        self._metadata = meta.get("collection_metadata")
+        self.embedding_function = embedding_function
+        self.threads = max(1, threads)
+        self.block_rows = max(1, block_rows)
+        self._columns = {}
+        self._executor = ThreadPoolExecutor(self.threads, thread_name_prefix="flat-index") if self.threads > 1 else None
+
+    @property
+    def metadata(self) -> Optional[Dict[str, Any]]:
+        return self._metadata
+
+    def count(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def export(cls, collection, path: str, dtype: str = FLAT_INDEX_DTYPE, page_size: int = BATCH_SIZE * 50) -> int:
+        """
+        Write every chunk of a ChromaDB collection to an index directory, replacing an existing
+        index only once the new one is complete. Returns the number of chunks exported.
+        """
+        n_rows = collection.count()
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+
+        embeddings = None
+        norms = np.zeros(n_rows, dtype=np.float32)
+        document_offsets = np.zeros(n_rows + 1, dtype=np.int64)
+        metadata_offsets = np.zeros(n_rows + 1, dtype=np.int64)
+        ids = []
+        fields = {}  # metadata field -> {row: value}
+        row = 0
+        with open(os.path.join(tmp_path, "documents.bin"), 'wb') as documents_file, \
+                open(os.path.join(tmp_path, "metadatas.bin"), 'wb') as metadatas_file:
+            while row < n_rows:
+                page = collection.get(include=["embeddings", "documents", "metadatas"], limit=page_size, offset=row)
+                if not len(page["ids"]):
+                    break
+                vectors = np.asarray(page["embeddings"], dtype=np.float32)
+                if embeddings is None:
+                    embeddings = np.lib.format.open_memmap(os.path.join(tmp_path, "embeddings.npy"), mode='w+',
+                                                           dtype=dtype, shape=(n_rows, vectors.shape[1]))
+                end = row + len(page["ids"])
+                embeddings[row:end] = vectors
+                # Norms of the stored (possibly rounded) vectors, so distances match what is searched
+                norms[row:end] = np.linalg.norm(np.asarray(embeddings[row:end], dtype=np.float32), axis=1)
+                for i, (chunk_id, document, metadata) in enumerate(zip(page["ids"], page["documents"],
+                                                                         page["metadatas"])):
+                    document_bytes = (document or "").encode('utf-8')
+                    metadata_bytes = json.dumps(metadata or {}).encode('utf-8')
+                    documents_file.write(document_bytes)
+                    metadatas_file.write(metadata_bytes)
+                    document_offsets[row + i + 1] = document_offsets[row + i] + len(document_bytes)
+                    metadata_offsets[row + i + 1] = metadata_offsets[row + i] + len(metadata_bytes)
+                    ids.append(chunk_id)
+                    for field, value in (metadata or {}).items():
+                        fields.setdefault(field, {})[row + i] = value
+                row = end
+
+        if row != n_rows:
+            raise RuntimeError(f"The collection changed during the export ({row} of {n_rows} chunks read)")
+        if embeddings is None:
+            np.save(os.path.join(tmp_path, "embeddings.npy"), np.zeros((0, 0), dtype=dtype))
+        else:
+            embeddings.flush()
+            del embeddings
+        ids = np.asarray(ids, dtype=str)
+        np.save(os.path.join(tmp_path, "norms.npy"), norms)
+        np.save(os.path.join(tmp_path, "document_offsets.npy"), document_offsets)
+        np.save(os.path.join(tmp_path, "metadata_offsets.npy"), metadata_offsets)
+        np.save(os.path.join(tmp_path, "ids.npy"), ids)
+        order = np.argsort(ids, kind="stable")
+        np.save(os.path.join(tmp_path, "sorted_ids.npy"), ids[order])
+        np.save(os.path.join(tmp_path, "sorted_rows.npy"), order.astype(np.int64))
+
+        # One column per metadata field: numbers and flags as float64 with NaN where missing, text as str
+        os.makedirs(os.path.join(tmp_path, "fields"))
+        field_names = []
+        for number, (field, values) in enumerate(sorted(fields.items())):
+            numeric = all(isinstance(value, (bool, int, float)) for value in values.values())
+            column = np.full(n_rows, np.nan) if numeric else np.full(n_rows, "", dtype=object)
+            column[list(values)] = [value if numeric else str(value) for value in values.values()]
+            np.save(os.path.join(tmp_path, "fields", f"{number}.npy"), column if numeric else column.astype(str))
+            field_names.append(field)
+
+        space = (collection.metadata or {}).get("hnsw:space", "l2")
+        with open(os.path.join(tmp_path, "meta.json"), 'w') as file:
+            json.dump({"version": _FORMAT_VERSION, "name": collection.name, "n_rows": n_rows, "dtype": dtype,
+                       "space": space, "fields": field_names, "collection_metadata": collection.metadata}, file)
+
+        old_path = f"{path}.old-{os.getpid()}"
+        if os.path.exists(path):
+            os.replace(path, old_path)
+        os.replace(tmp_path, path)
+        shutil.rmtree(old_path, ignore_errors=True)
+        return n_rows
+
+    @classmethod
+    def load(cls, path: str, embedding_function=None, threads: int = FLAT_INDEX_THREADS,
+             block_rows: int = FLAT_INDEX_BLOCK_ROWS) -> Optional["FlatIndex"]:
+        """
+        Memory-map an index written by export(), or return None if there is none.
+        """
+        meta_path = os.path.join(path, "meta.json")
+        if not os.path.exists(meta_path):
+            return None
+        try:
+            with open(meta_path, 'r') as file:
+                meta = json.load(file)
+            if meta.get("version") != _FORMAT_VERSION:
+                print(f"Ignoring flat index with unsupported version {meta.get('version')}, export it again")
+                return None
+            arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode='r') for name in _ARRAYS}
+            return cls(path, arrays, meta, embedding_function, threads, block_rows)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Error loading flat index: {e}")
+            return None
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+
+    def _column(self, field: str) -> Optional[np.ndarray]:
+        """
+        The memory-mapped values of a metadata field, None if no chunk has it.
+        """
+        if field not in self._columns:
+            column = None
+            if field in self.fields:
+                column = np.load(os.path.join(self.path, "fields", f"{self.fields.index(field)}.npy"), mmap_mode='r')
+            self._columns[field] = column
+        return self._columns[field]
+
+    def _mask(self, where: Dict[str, Any]) -> np.ndarray:
+        """
+        Rows matching a ChromaDB `where` filter ($and, $or, $eq, $ne, $gt, $gte, $lt, $lte, $in, $nin).
+        """
+        mask = np.ones(self.count(), dtype=bool)
+        for key, condition in where.items():
+            if key in ("$and", "$or"):
+                masks = [self._mask(clause) for clause in condition]
+                combined = np.logical_and.reduce(masks) if key == "$and" else np.logical_or.reduce(masks)
+                mask &= combined
+                continue
+            column = self._column(key)
+            if column is None:
+                return np.zeros(self.count(), dtype=bool)
+            if not isinstance(condition, dict):
+                condition = {"$eq": condition}
+            numeric = column.dtype.kind == 'f'
+            present = ~np.isnan(column) if numeric else column != ""
+            for operator, operand in condition.items():
+                if operator in ("$in", "$nin"):
+                    values = [float(value) for value in operand] if numeric else [str(value) for value in operand]
+                    matched = np.isin(column, values) & present
+                    mask &= matched if operator == "$in" else ~matched & present
+                    continue
+                value = float(operand) if numeric else str(operand)
+                if operator == "$eq":
+                    mask &= column == value
+                elif operator == "$ne":
+                    mask &= (column != value) & present
+                elif operator == "$gt":
+                    mask &= column > value
+                elif operator == "$gte":
+                    mask &= column >= value
+                elif operator == "$lt":
+                    mask &= column < value
+                elif operator == "$lte":
+                    mask &= column <= value
+                else:
+                    raise ValueError(f"Unsupported where operator: {operator}")
+        return mask
+
+    def _search_block(self, start: int, end: int, queries: np.ndarray, query_norms: np.ndarray, k: int,
+                      mask: Optional[np.ndarray]):
+        block = np.asarray(self.embeddings[start:end], dtype=np.float32)
+        dots = block @ queries.T  # rows x queries
+        norms = np.asarray(self.norms[start:end])[:, None]
+        if self.space == "cosine":
+            denominators = norms * query_norms[None, :]
+            distances = 1.0 - dots / np.where(denominators == 0, 1.0, denominators)
+        elif self.space == "ip":
+            distances = 1.0 - dots
+        else:
+            distances = np.maximum(norms ** 2 + query_norms[None, :] ** 2 - 2.0 * dots, 0.0)
+        if mask is not None:
+            distances[~mask[start:end]] = np.inf
+        if end - start > k:
+            top = np.argpartition(distances, k - 1, axis=0)[:k]
+        else:
+            top = np.broadcast_to(np.arange(end - start)[:, None], distances.shape)
+        return top + start, np.take_along_axis(distances, top, axis=0)
+
+    def search(self, query_embeddings, n_results: int, where: Optional[Dict[str, Any]] = None):
+        """
+        Exact nearest rows of every query. Returns one (rows, distances) pair per query, nearest first.
+        """
+        queries = np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32))
+        if not self.count() or n_results <= 0:
+            return [(np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)) for _ in queries]
+        mask = self._mask(where) if where else None
+        k = min(n_results, self.count())
+        query_norms = np.linalg.norm(queries, axis=1)
+        blocks = [(start, min(start + self.block_rows, self.count()))
+                  for start in range(0, self.count(), self.block_rows)]
+        if self._executor is not None and len(blocks) > 1:
+            parts = list(self._executor.map(
+                lambda block: self._search_block(block[0], block[1], queries, query_norms, k, mask), blocks))
+        else:
+            parts = [self._search_block(start, end, queries, query_norms, k, mask) for start, end in blocks]
+
+        rows = np.concatenate([part[0] for part in parts], axis=0)
+        distances = np.concatenate([part[1] for part in parts], axis=0)
+        results = []
+        for q in range(len(queries)):
+            order = np.argsort(distances[:, q], kind="stable")[:k]
+            order = order[np.isfinite(distances[order, q])]
+            results.append((rows[order, q], distances[order, q]))
+        return results
+
+    def _document(self, row: int) -> str:
+        return bytes(self.documents_blob[self.document_offsets[row]:self.document_offsets[row + 1]]).decode('utf-8')
+
+    def _metadata_of(self, row: int) -> Dict[str, Any]:
+        return json.loads(bytes(self.metadatas_blob[self.metadata_offsets[row]:self.metadata_offsets[row + 1]]))
+
+    def _records(self, rows, include: List[str]) -> Dict[str, Any]:
+        records = {"ids": [str(self.ids[row]) for row in rows]}
+        records["documents"] = [self._document(row) for row in rows] if "documents" in include else None
+        records["metadatas"] = [self._metadata_of(row) for row in rows] if "metadatas" in include else None
+        records["embeddings"] = (np.asarray(self.embeddings[np.asarray(rows, dtype=np.int64)], dtype=np.float32)
+                                 if "embeddings" in include else None)
+        return records
+
+    def query(self, query_embeddings=None, query_texts=None, n_results: int = 10,
+              where: Optional[Dict[str, Any]] = None,
+              include: List[str] = ("metadatas", "documents", "distances")) -> Dict[str, Any]:
+        """
+        collection.query: the n_results nearest chunks of every query, in the ChromaDB result format.
+        """
+        if query_embeddings is None:
+            query_embeddings = self.embedding_function(list(query_texts))
+        results = {"ids": [], "documents": [], "metadatas": [], "distances": [], "embeddings": []}
+        for rows, distances in self.search(query_embeddings, n_results, where):
+            records = self._records(rows, include)
+            for field in ("ids", "documents", "metadatas", "embeddings"):
+                results[field].append(records[field])
+            results["distances"].append([float(distance) for distance in distances])
+        for field in ("documents", "metadatas", "embeddings", "distances"):
+            if field not in include:
+                results[field] = None
+        return results
+
+    def get(self, ids: Optional[List[str]] = None, where: Optional[Dict[str, Any]] = None,
+            limit: Optional[int] = None, offset: Optional[int] = None,
+            include: List[str] = ("metadatas", "documents")) -> Dict[str, Any]:
+        """
+        collection.get: chunks by id and/or `where` filter, in the ChromaDB result format.
+        """
+        if ids is not None:
+            ids = np.asarray(ids, dtype=str)
+            positions = np.minimum(np.searchsorted(self.sorted_ids, ids), max(self.count() - 1, 0))
+            found = self.sorted_ids[positions] == ids if self.count() else np.zeros(len(ids), dtype=bool)
+            rows = np.asarray(self.sorted_rows[positions[found]])
+        else:
+            rows = np.arange(self.count())
+        if where:
+            rows = rows[self._mask(where)[rows]]
+        rows = rows[offset or 0:]
+        if limit is not None:
+            rows = rows[:limit]
+        return self._records(rows.tolist(), include)
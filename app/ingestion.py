@@ -1,7 +1,12 @@
 import os
-from typing import Tuple, List
-from app.config import BATCH_SIZE
+from typing import Dict, Iterator, Optional, Tuple, List
+from app.config import BATCH_SIZE, INGEST_BATCH_ROWS, CHUNKING_MODE
+from app.manifest import IngestManifest
 from app.preProcessing import DocumentProcessor
+from app.metrics import span
+from app.chunk_filters import row_fields, chunk_fields
+
+INGEST_METRIC = "ingest_stage_seconds"
 
 class DocumentIngestor:
     """
@@ -9,7 +14,10 @@ class DocumentIngestor:
     into a ChromaDB collection.
     """
 
-    def __init__(self):
+    def __init__(self, chunking_mode: str = CHUNKING_MODE):
+        if chunking_mode not in ("records", "sentence"):
+            raise ValueError(f"Unsupported chunking mode: {chunking_mode}")
+        self.chunking_mode = chunking_mode
         self.document_processor_instance = DocumentProcessor()
 
     def process_csv_with_metadata(self, csv_path: str, metadata_path: str) -> Tuple[List, List, List]:
@@ -17,27 +25,123 @@ class DocumentIngestor:
         Process a CSV file and its metadata file.
         """
         try:
-            content = self.document_processor_instance.read_csv_with_metadata(csv_path, metadata_path)
-            chunks = self.document_processor_instance.chunking(content)
-            
-            # Generate metadata for storage
-            file_name = os.path.basename(csv_path)
-            metadatas = [
-                {
-                    "source": file_name,
-                    "chunk": i,
-                    "content_type": "csv_with_metadata",
-                    "metadata_file": os.path.basename(metadata_path)
-                }
-                for i in range(len(chunks))
-            ]
-            
-            ids = [f"{file_name}_chunk_{i}" for i in range(len(chunks))]
+            if self.chunking_mode == "records":
+                ids, chunks, metadatas = [], [], []
+                for batch_ids, batch_chunks, batch_metadatas in self.iter_record_chunks(csv_path, metadata_path, None):
+                    ids.extend(batch_ids)
+                    chunks.extend(batch_chunks)
+                    metadatas.extend(batch_metadatas)
+                return ids, chunks, metadatas
+
+            with span("read", metric=INGEST_METRIC):
+                content = self.document_processor_instance.read_csv_with_metadata(csv_path, metadata_path)
+            with span("chunk", metric=INGEST_METRIC):
+                chunks = self.document_processor_instance.chunking(content)
+            ids, metadatas = self.build_chunk_records(csv_path, metadata_path, len(chunks))
             return ids, chunks, metadatas
         
         except Exception as e:
             raise Exception(f"Error processing CSV with metadata: {e}")
 
+    @staticmethod
+    def build_chunk_records(csv_path: str, metadata_path: str, n_chunks: int, start: int = 0,
+                            row_ranges: Optional[List[Tuple[int, int]]] = None) -> Tuple[List, List]:
+        """
+        Generate the ids and storage metadata for n_chunks chunks, numbered from start.
+        Record-aligned chunks also store the first and last source row they contain.
+        """
+        file_name = os.path.basename(csv_path)
+        metadatas = [
+            {
+                "source": file_name,
+                "chunk": i,
+                "content_type": "csv_with_metadata",
+                "metadata_file": os.path.basename(metadata_path)
+            }
+            for i in range(start, start + n_chunks)
+        ]
+        if row_ranges is not None:
+            for metadata, (row_start, row_end) in zip(metadatas, row_ranges):
+                metadata["row_start"] = row_start
+                metadata["row_end"] = row_end
+        ids = [f"{file_name}_chunk_{i}" for i in range(start, start + n_chunks)]
+        return ids, metadatas
+
+    def iter_csv_with_metadata(self, csv_path: str, metadata_path: str,
+                               batch_rows: int = INGEST_BATCH_ROWS) -> Iterator[Tuple[List, List, List]]:
+        """
+        Stream a CSV file and its metadata file, yielding (ids, chunks, metadatas) one row batch at a time.
+        Chunk ids keep the {file_name}_chunk_{i} scheme and are numbered continuously across batches.
+        """
+        if self.chunking_mode == "records":
+            yield from self.iter_record_chunks(csv_path, metadata_path, batch_rows)
+            return
+
+        try:
+            next_chunk = 0
+            for content in self.document_processor_instance.iter_csv_with_metadata(csv_path, metadata_path, batch_rows):
+                with span("chunk", metric=INGEST_METRIC):
+                    chunks = self.document_processor_instance.chunking(content)
+                ids, metadatas = self.build_chunk_records(csv_path, metadata_path, len(chunks), next_chunk)
+                next_chunk += len(chunks)
+                yield ids, chunks, metadatas
+
+        except Exception as e:
+            raise Exception(f"Error streaming CSV with metadata: {e}") from e
+
+    def iter_record_chunks(self, csv_path: str, metadata_path: str,
+                           batch_rows: Optional[int] = INGEST_BATCH_ROWS) -> Iterator[Tuple[List, List, List]]:
+        """
+        Stream a CSV file as record-aligned chunks, yielding (ids, chunks, metadatas) per row batch.
+        The last, possibly under-filled chunk of each batch is carried over and packed together with
+        the next batch, so the chunks do not depend on batch_rows. Each chunk also gets the
+        filterable borough, document type and date fields of its rows (see app.chunk_filters).
+        """
+        try:
+            processor = self.document_processor_instance
+            file_name = os.path.basename(csv_path)
+            schema_header = None
+            pending_rows = []
+            pending_fields = {"borough": [], "doc_type": [], "date": []}
+            pending_start = 0
+            next_chunk = 0
+
+            for _, data_rows, df in processor.iter_csv_rows(csv_path, metadata_path, batch_rows):
+                if schema_header is None:
+                    schema_header = processor.build_schema_header(file_name)
+                rows = pending_rows + data_rows
+                batch_fields = row_fields(df)
+                fields = {name: pending_fields[name] + values for name, values in batch_fields.items()}
+                rows_offset = pending_start
+                with span("chunk", metric=INGEST_METRIC):
+                    chunks = processor.chunk_records(rows, schema_header, row_offset=rows_offset)
+                if not chunks:
+                    continue
+
+                # Hold back the last chunk: it may still have room for rows from the next batch
+                _, pending_start, _ = chunks.pop()
+                pending_rows = rows[pending_start - rows_offset:]
+                pending_fields = {name: values[pending_start - rows_offset:] for name, values in fields.items()}
+                yield self._record_batch(csv_path, metadata_path, chunks, next_chunk, fields, rows_offset)
+                next_chunk += len(chunks)
+
+            if pending_rows:
+                with span("chunk", metric=INGEST_METRIC):
+                    chunks = processor.chunk_records(pending_rows, schema_header, row_offset=pending_start)
+                yield self._record_batch(csv_path, metadata_path, chunks, next_chunk, pending_fields, pending_start)
+
+        except Exception as e:
+            raise Exception(f"Error chunking CSV records: {e}") from e
+
+    def _record_batch(self, csv_path: str, metadata_path: str, chunks: List[Tuple[str, int, int]],
+                      start: int, fields: Dict[str, list], fields_offset: int) -> Tuple[List, List, List]:
+        texts = [text for text, _, _ in chunks]
+        row_ranges = [(row_start, row_end) for _, row_start, row_end in chunks]
+        ids, metadatas = self.build_chunk_records(csv_path, metadata_path, len(chunks), start, row_ranges)
+        for metadata, (row_start, row_end) in zip(metadatas, row_ranges):
+            metadata.update(chunk_fields(fields, row_start - fields_offset, row_end - fields_offset))
+        return ids, texts, metadatas
+
     def insert_documents_into_collection(self, collection, ids, texts, metadatas):
         """
         Inserts documents into the ChromaDB collection in batches.
@@ -53,20 +157,34 @@ class DocumentIngestor:
         try:
             for i in range(0, len(texts), BATCH_SIZE):
                 end_idx = min(i + BATCH_SIZE, len(texts))
-                collection.add(
-                    documents=texts[i:end_idx],
-                    metadatas=metadatas[i:end_idx],
-                    ids=ids[i:end_idx]
-                )
+                with span("embed_and_write", metric=INGEST_METRIC):
+                    collection.add(
+                        documents=texts[i:end_idx],
+                        metadatas=metadatas[i:end_idx],
+                        ids=ids[i:end_idx]
+                    )
         except Exception as e:
             raise Exception(f"Error inserting documents into collection: {e}") from e
 
-    def ingest_documents(self, collection, file_path: str, metadata_path: str):
+    @staticmethod
+    def diff_documents(ids, texts, metadatas, known_hashes: Dict[str, str]) -> Tuple[Dict[str, str], Dict[str, int], List[int]]:
         """
-        Processes and ingests all documents from a specified folder into a ChromaDB collection.
+        Compare a batch of chunks with the content hashes from the last ingestion of the file.
+        Returns:
+            tuple: The content hash of every chunk, the added/updated/unchanged counts and the
+            positions of the new or changed chunks.
         """
-        try:
-            ids, texts, metadatas = self.process_csv_with_metadata(file_path, metadata_path)
-            self.insert_documents_into_collection(collection, ids, texts, metadatas)
-        except Exception as e:
-            raise Exception(f"Error ingesting documents: {e}") from e
+        hashes = {}
+        changed = []
+        counts = {"added": 0, "updated": 0, "unchanged": 0}
+        with span("diff", metric=INGEST_METRIC):
+            for i, (chunk_id, text, metadata) in enumerate(zip(ids, texts, metadatas)):
+                chunk_hash = IngestManifest.chunk_hash(text, metadata)
+                hashes[chunk_id] = chunk_hash
+                previous = known_hashes.get(chunk_id)
+                if previous == chunk_hash:
+                    counts["unchanged"] += 1
+                    continue
+                counts["added" if previous is None else "updated"] += 1
+                changed.append(i)
+        return hashes, counts, changed
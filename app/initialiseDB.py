@@ -1,15 +1,43 @@
 import os
-import chromadb
-from chromadb.utils import embedding_functions
+import threading
+import time
+from typing import TYPE_CHECKING
+from app.config import WARMUP_QUERY
+from app.metrics import REGISTRY
+
+# chromadb and sentence-transformers (torch) take seconds to import; they are imported on the
+# first load of the store, which a background warm-up can do while the server is already listening
+if TYPE_CHECKING:
+    from app.embeddings import SentenceTransformerEmbedder
 
 class VectorDBSetup:
     """
     Class to handle the initialization of the ChromaDB vector store and collection.
+
+    The client, embedding function and collection are shared process-wide, so the
+    embedding model is loaded once and reused by every query instead of per request.
+    With the "flat" retrieval backend the collection is a read-only FlatIndex exported from
+    the ChromaDB store (app/flat_index.py), which serves queries without opening ChromaDB.
     """
 
-    def __init__(self, client_manager):
+    RETRIEVAL_BACKENDS = ("chroma", "flat")
+
+    _lock = threading.RLock()
+    _store_key = None
+    _collection = None
+    _embedder = None
+    timings = {}
+
+    def __init__(self, client_manager, retrieval_backend: str = None):
         self.vector_store_path = client_manager.get_vector_store_path()
         self.embedding_model = client_manager.get_embedding_model()
+        self.embedding_backend = client_manager.get_embedding_backend()
+        self.retrieval_backend = retrieval_backend or client_manager.get_retrieval_backend()
+        if self.retrieval_backend not in self.RETRIEVAL_BACKENDS:
+            raise ValueError(f"Unsupported retrieval backend: {self.retrieval_backend} "
+                             f"(expected one of {', '.join(self.RETRIEVAL_BACKENDS)})")
+        self.flat_index_path = client_manager.get_flat_index_path()
+        self.manifest_path = client_manager.get_manifest_path()
         
 
     def initialize_vectorDB(self):
@@ -17,8 +45,13 @@ class VectorDBSetup:
         Initializes the ChromaDB client and retrieves or creates a collection.
         """
         try:
+            import chromadb
+            from app.embeddings import SentenceTransformerEmbedder
+
             client = chromadb.PersistentClient(path=self.vector_store_path)
-            sentence_transformer_ef = embedding_functions.SentenceTransformerEmbeddingFunction(model_name=self.embedding_model)
+            sentence_transformer_ef = SentenceTransformerEmbedder(model_name=self.embedding_model,
+                                                                  backend=self.embedding_backend)
+            self.embedder = sentence_transformer_ef
 
             collection = client.get_or_create_collection(
                 name="documents_collection", 
@@ -29,3 +62,141 @@ class VectorDBSetup:
         except Exception as e:
             raise RuntimeError(f"Failed to initialize vector database: {e}")
 
+    def initialize_flat_index(self, embedder: "SentenceTransformerEmbedder" = None):
+        """
+        Memory-maps the flat index exported from the vector store and loads the embedding model,
+        unless the embedder of the previously loaded index is passed in.
+        """
+        from app.embeddings import SentenceTransformerEmbedder
+        from app.flat_index import FlatIndex
+
+        self.embedder = embedder or SentenceTransformerEmbedder(model_name=self.embedding_model,
+                                                                backend=self.embedding_backend)
+        index = FlatIndex.load(self.flat_index_path, embedding_function=self.embedder)
+        if index is None:
+            raise RuntimeError(f"No flat index at {self.flat_index_path}, "
+                               f"export it with `python setupDB.py --export-flat-index`")
+        return index
+
+    def get_collection(self):
+        """
+        Returns the shared collection, loading the client and embedding model on first use.
+        """
+        store_key = self.store_key()
+        if VectorDBSetup._collection is not None and VectorDBSetup._store_key == store_key:
+            return VectorDBSetup._collection
+
+        with VectorDBSetup._lock:
+            if VectorDBSetup._collection is None or VectorDBSetup._store_key != store_key:
+                self._load(store_key)
+            return VectorDBSetup._collection
+
+    def store_key(self) -> tuple:
+        """
+        Identifies the loaded store. The flat index is a snapshot that setupDB.py replaces on export,
+        so its key includes the mtime of the exported meta.json, and a new export is loaded on the next query.
+        """
+        store_key = (self.vector_store_path, self.embedding_model, self.embedding_backend, self.retrieval_backend)
+        if self.retrieval_backend != "flat":
+            return store_key
+        try:
+            export_mtime = os.stat(os.path.join(self.flat_index_path, "meta.json")).st_mtime_ns
+        except OSError:
+            # An export swaps the index directory in two renames; keep serving the loaded index meanwhile
+            loaded = VectorDBSetup._store_key
+            export_mtime = loaded[-1] if loaded is not None and loaded[:-1] == store_key else None
+        return store_key + (export_mtime,)
+
+    def store_version(self, collection) -> tuple:
+        """
+        Cheap fingerprint of the store contents. It changes when the collection is reloaded (which
+        includes a re-exported flat index), when its size changes, or when an ingestion run rewrites the manifest.
+        """
+        try:
+            manifest_mtime = os.stat(self.manifest_path).st_mtime
+        except OSError:
+            manifest_mtime = None
+        return id(collection), collection.count(), manifest_mtime
+
+    def get_embedder(self) -> "SentenceTransformerEmbedder":
+        """
+        Returns the embedding function of the shared collection, for computing embeddings directly.
+        """
+        self.get_collection()
+        return VectorDBSetup._embedder
+
+    def _load(self, store_key):
+        """
+        Cold path: builds the client, embedding function and collection and records the load time.
+        """
+        start = time.perf_counter()
+        if self.retrieval_backend == "flat":
+            # A re-exported index reuses the embedding model that is already loaded
+            previous = VectorDBSetup._store_key
+            same_model = previous is not None and previous[:-1] == store_key[:-1]
+            collection = self.initialize_flat_index(VectorDBSetup._embedder if same_model else None)
+        else:
+            collection = self.initialize_vectorDB()
+        VectorDBSetup.timings["cold_load_seconds"] = time.perf_counter() - start
+        REGISTRY.observe("rag_stage_seconds", VectorDBSetup.timings["cold_load_seconds"], stage="vector_store_load")
+        VectorDBSetup._collection = collection
+        VectorDBSetup._embedder = self.embedder
+        VectorDBSetup._store_key = store_key
+        print(f"Vector store loaded in {VectorDBSetup.timings['cold_load_seconds']:.2f}s")
+        self.check_embedding_compatibility(collection)
+
+    def check_embedding_compatibility(self, collection, write: bool = False):
+        """
+        Compare the embedding signature stamped on the collection with the configured model and backend.
+        Vectors of different signatures must not be mixed in one collection: writes are refused, and
+        queries only warn, since their results are merely less accurate. The first write stamps a
+        collection that has no signature yet.
+        """
+        from app.embeddings import EMBEDDING_SIGNATURE_KEY, embedding_signature
+
+        signature = embedding_signature(self.embedding_model, self.embedding_backend)
+        metadata = collection.metadata or {}
+        stored = metadata.get(EMBEDDING_SIGNATURE_KEY)
+        if stored is None and collection.count() > 0:
+            # Collections written before the signature was introduced were embedded with PyTorch fp32
+            stored = embedding_signature(self.embedding_model, "torch")
+        if stored is not None and stored != signature:
+            message = (f"the collection holds {stored} embeddings but EMBED_MODEL/EMBED_BACKEND "
+                       f"produce {signature} embeddings")
+            if write:
+                raise RuntimeError(f"Refusing to write: {message}. Re-ingest into a new VECTOR_STORE "
+                                   f"or switch back to a compatible backend.")
+            print(f"Warning: {message}, query results will be less accurate")
+        elif write and metadata.get(EMBEDDING_SIGNATURE_KEY) != signature:
+            collection.modify(metadata={**metadata, EMBEDDING_SIGNATURE_KEY: signature})
+
+    def reload(self):
+        """
+        Drops the shared handles and loads them again, e.g. after the store was re-ingested.
+        """
+        with VectorDBSetup._lock:
+            VectorDBSetup._collection = None
+            VectorDBSetup._embedder = None
+            VectorDBSetup._store_key = None
+            return self.get_collection()
+
+    def warm_up(self, query: str = WARMUP_QUERY) -> dict:
+        """
+        Loads the collection and optionally runs one query so the first user request hits the warm path.
+        Returns the cold and warm timings in seconds.
+        """
+        collection = self.get_collection()
+        if query and collection.count() > 0:
+            start = time.perf_counter()
+            collection.query(query_texts=[query], n_results=1)
+            VectorDBSetup.timings["warmup_query_seconds"] = time.perf_counter() - start
+            REGISTRY.observe("rag_stage_seconds", VectorDBSetup.timings["warmup_query_seconds"], stage="warmup_query")
+
+            start = time.perf_counter()
+            collection.query(query_texts=[query], n_results=1)
+            VectorDBSetup.timings["warm_query_seconds"] = time.perf_counter() - start
+            print(
+                f"Warm-up query took {VectorDBSetup.timings['warmup_query_seconds']:.2f}s, "
+                f"warm query took {VectorDBSetup.timings['warm_query_seconds']:.3f}s"
+            )
+        return dict(VectorDBSetup.timings)
@@ -0,0 +1,179 @@
+import os
+import re
+import json
+import shutil
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from app.config import BM25_K1, BM25_B, BATCH_SIZE
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+_FORMAT_VERSION = 1
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercased alphanumeric tokens, so document ids, BBL parts and street names match exactly.
+    """
+    return _TOKEN_PATTERN.findall(text.lower())
+
+
+class BM25Index:
+    """
+    A BM25 inverted index over the chunks of the vector store.
+
+    The index is stored as a directory of flat numpy arrays: the sorted vocabulary, one offset per
+    term into the concatenated postings (chunk positions and term frequencies), the chunk lengths
+    and the chunk ids. load() memory-maps the arrays, so opening a large index is cheap and only the
+    postings of the query terms are paged in.
+    """
+
+    def __init__(self, terms: np.ndarray, offsets: np.ndarray, postings: np.ndarray, frequencies: np.ndarray,
+                 doc_lengths: np.ndarray, doc_ids: List[str], k1: float = BM25_K1, b: float = BM25_B):
+        self.terms = terms
+        self.offsets = offsets
+        self.postings = postings
+        self.frequencies = frequencies
+        self.doc_lengths = doc_lengths
+        self.doc_ids = doc_ids
+        self.k1 = k1
+        self.b = b
+        self.n_docs = len(doc_ids)
+        self.avg_length = float(doc_lengths.mean()) if self.n_docs else 0.0
+        # The BM25 length normalisation of every chunk does not depend on the query
+        self.length_norm = (k1 * (1 - b + b * np.asarray(doc_lengths, dtype=np.float32) / max(self.avg_length, 1e-9))
+                            if self.n_docs else np.zeros(0, dtype=np.float32))
+
+    @classmethod
+    def build(cls, documents: Iterable[Tuple[str, str]], k1: float = BM25_K1, b: float = BM25_B) -> "BM25Index":
+        """
+        Build the index from (chunk id, text) pairs.
+        """
+        term_postings = {}
+        doc_ids = []
+        doc_lengths = []
+        for doc_id, text in documents:
+            tokens = tokenize(text)
+            position = len(doc_ids)
+            doc_ids.append(doc_id)
+            doc_lengths.append(len(tokens))
+            for term, frequency in Counter(tokens).items():
+                term_postings.setdefault(term, []).append((position, frequency))
+
+        terms = sorted(term_postings)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(term_postings[term]) for term in terms])
+        postings = np.empty(offsets[-1], dtype=np.int32)
+        frequencies = np.empty(offsets[-1], dtype=np.float32)
+        for i, term in enumerate(terms):
+            entries = np.asarray(term_postings[term])
+            postings[offsets[i]:offsets[i + 1]] = entries[:, 0]
+            frequencies[offsets[i]:offsets[i + 1]] = entries[:, 1]
+
+        return cls(np.asarray(terms, dtype=str), offsets, postings, frequencies,
+                   np.asarray(doc_lengths, dtype=np.int32), doc_ids, k1, b)
+
+    @classmethod
+    def build_from_collection(cls, collection, page_size: int = BATCH_SIZE * 50) -> "BM25Index":
+        """
+        Build the index from every chunk of a ChromaDB collection, reading it page by page.
+        """
+        def documents():
+            offset = 0
+            while True:
+                page = collection.get(include=["documents"], limit=page_size, offset=offset)
+                if not page["ids"]:
+                    return
+                yield from zip(page["ids"], page["documents"])
+                offset += len(page["ids"])
+
+        return cls.build(documents())
+
+    def save(self, path: str):
+        """
+        Write the index directory, replacing an existing index only once the new one is complete.
+        """
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        np.save(os.path.join(tmp_path, "terms.npy"), self.terms)
+        np.save(os.path.join(tmp_path, "offsets.npy"), self.offsets)
+        np.save(os.path.join(tmp_path, "postings.npy"), self.postings)
+        np.save(os.path.join(tmp_path, "frequencies.npy"), self.frequencies)
+        np.save(os.path.join(tmp_path, "doc_lengths.npy"), self.doc_lengths)
+        with open(os.path.join(tmp_path, "doc_ids.json"), 'w') as file:
+            json.dump(self.doc_ids, file)
+        with open(os.path.join(tmp_path, "meta.json"), 'w') as file:
+            json.dump({"version": _FORMAT_VERSION, "k1": self.k1, "b": self.b, "n_docs": self.n_docs}, file)
+
+        old_path = f"{path}.old-{os.getpid()}"
+        if os.path.exists(path):
+            os.replace(path, old_path)
+        os.replace(tmp_path, path)
+        shutil.rmtree(old_path, ignore_errors=True)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["BM25Index"]:
+        """
+        Memory-map an index saved with save(), or return None if there is none.
+        """
+        meta_path = os.path.join(path, "meta.json")
+        if not os.path.exists(meta_path):
+            return None
+        try:
+            with open(meta_path, 'r') as file:
+                meta = json.load(file)
+            if meta.get("version") != _FORMAT_VERSION:
+                print(f"Ignoring lexical index with unsupported version {meta.get('version')}, re-run setupDB.py")
+                return None
+            with open(os.path.join(path, "doc_ids.json"), 'r') as file:
+                doc_ids = json.load(file)
+            arrays = {
+                name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode='r')
+                for name in ("terms", "offsets", "postings", "frequencies", "doc_lengths")
+            }
+            return cls(arrays["terms"], arrays["offsets"], arrays["postings"], arrays["frequencies"],
+                       arrays["doc_lengths"], doc_ids, meta["k1"], meta["b"])
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Error loading lexical index, lexical search is disabled: {e}")
+            return None
+
+    def _term_index(self, term: str) -> int:
+        i = int(np.searchsorted(self.terms, term))
+        return i if i < len(self.terms) and self.terms[i] == term else -1
+
+    def search(self, query: str, n_results: int) -> List[Tuple[str, float]]:
+        """
+        Return the n_results best (chunk id, BM25 score) pairs for the query, best first.
+        """
+        if not self.n_docs:
+            return []
+        scores = np.zeros(self.n_docs, dtype=np.float32)
+        for term in set(tokenize(query)):
+            i = self._term_index(term)
+            if i < 0:
+                continue
+            start, end = int(self.offsets[i]), int(self.offsets[i + 1])
+            docs = np.asarray(self.postings[start:end])
+            frequencies = np.asarray(self.frequencies[start:end])
+            idf = np.log(1 + (self.n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            scores[docs] += idf * frequencies * (self.k1 + 1) / (frequencies + self.length_norm[docs])
+
+        matched = np.flatnonzero(scores)
+        if not len(matched):
+            return []
+        if len(matched) > n_results:
+            matched = matched[np.argpartition(-scores[matched], n_results - 1)[:n_results]]
+        matched = matched[np.argsort(-scores[matched], kind="stable")]
+        return [(self.doc_ids[i], float(scores[i])) for i in matched]
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int) -> Dict[str, float]:
+    """
+    Fuse ranked id lists: every list contributes 1 / (k + rank) to each id it contains.
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return scores
@@ -1,44 +1,75 @@
-import os
-from typing import List, Tuple
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
 from app.prompts import PROMPTS
 from app.config import TEMPERATURE, MAX_TOKENS, TOP_P
-from dotenv import load_dotenv
-# Load environment variables
-load_dotenv()
-os.environ["GROQ_API_KEY"] = os.getenv('GROQ_API_KEY')
+from app.metrics import span, record_tokens
 
 class LLMProcessor:
     """
     A class to handle generating responses from an LLM model using Groq API.
     """
 
+    ERROR_RESPONSE = "An error occurred while generating the response. Please try again later."
+
     def __init__(self, client_manager):
         self.LLM_model = client_manager.get_LLM_model()
-        self.client = client_manager.get_client()
+        self.client_manager = client_manager
 
-    def generate_response(self, query: str, context: str, chat_history: List[Tuple[str, str]]) -> str:
+    @property
+    def client(self):
+        # The client, and the groq import, are created on the first LLM call or during warm-up
+        return self.client_manager.get_client()
+
+    def build_messages(self, query: str, context: str, chat_history: List[Tuple[str, str]]) -> List[Dict[str, str]]:
         """
-        Generate a response considering chat history.
+        Build the chat messages for a query, its context and the recent chat history.
         """
-        try:
-            # Format chat history for context
-            formatted_history = ""
-            if chat_history:
-                formatted_history = "\n".join([
-                    f"Human: {h[0]}\nAssistant: {h[1]}" 
-                    for h in chat_history[-3:]  # Include last 3 exchanges
-                ])
+        # Format chat history for context
+        formatted_history = ""
+        if chat_history:
+            formatted_history = "\n".join([
+                f"Human: {h[0]}\nAssistant: {h[1]}" 
+                for h in chat_history[-3:]  # Include last 3 exchanges
+            ])
+
+        return [
+            {"role": "system", "content": PROMPTS.SYSTEM_PROMPT},
+            {"role": "user", "content": PROMPTS.CHAT_PROMPT.format(
+                query=query,
+                context=context,
+                chat_history=formatted_history
+            )}
+        ]
 
+    @staticmethod
+    def chunk_usage(chunk) -> Optional[Dict[str, int]]:
+        """
+        Token usage reported on a stream chunk; Groq sends it on the last chunk under x_groq.
+        """
+        usage = getattr(chunk, "usage", None)
+        if usage is None:
+            x_groq = getattr(chunk, "x_groq", None)
+            usage = getattr(x_groq, "usage", None)
+        if usage is None:
+            return None
+        return {
+            "prompt_tokens": getattr(usage, "prompt_tokens", None),
+            "completion_tokens": getattr(usage, "completion_tokens", None),
+        }
+
+    def generate_response_stream(self, query: str, context: str, chat_history: List[Tuple[str, str]],
+                                 retrieval_details: Optional[Dict[str, Any]] = None) -> Iterator[str]:
+        """
+        Generate a response considering chat history, yielding text deltas as the model produces them.
+        Errors are raised to the caller, which decides how to report a partially streamed answer.
+        The LLM timing and token counts are recorded in retrieval_details when given.
+        """
+        with span("prompt_build", retrieval_details):
+            messages = self.build_messages(query, context, chat_history)
+
+        with span("llm", retrieval_details):
             response = self.client.chat.completions.create(
                 model=self.LLM_model,
-                messages=[
-                    {"role": "system", "content": PROMPTS.SYSTEM_PROMPT},
-                    {"role": "user", "content": PROMPTS.CHAT_PROMPT.format(
-                        query=query,
-                        context=context,
-                        chat_history=formatted_history
-                    )}
-                ],
+                messages=messages,
                 temperature=TEMPERATURE,
                 max_tokens=MAX_TOKENS,
                 top_p=TOP_P,
@@ -46,12 +77,48 @@ class LLMProcessor:
                 stop=None,
             )
 
-            output = ""
             for chunk in response:
-                output += chunk.choices[0].delta.content or ""
+                usage = self.chunk_usage(chunk)
+                if usage:
+                    record_tokens(usage, retrieval_details)
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    yield delta
+
+    async def agenerate_response_stream(self, query: str, context: str, chat_history: List[Tuple[str, str]],
+                                        retrieval_details: Optional[Dict[str, Any]] = None) -> AsyncIterator[str]:
+        """
+        Async variant of generate_response_stream using the shared AsyncGroq client.
+        """
+        with span("prompt_build", retrieval_details):
+            messages = self.build_messages(query, context, chat_history)
 
-            return output
+        with span("llm", retrieval_details):
+            response = await self.client_manager.get_async_client().chat.completions.create(
+                model=self.LLM_model,
+                messages=messages,
+                temperature=TEMPERATURE,
+                max_tokens=MAX_TOKENS,
+                top_p=TOP_P,
+                stream=True,
+                stop=None,
+            )
+
+            async for chunk in response:
+                usage = self.chunk_usage(chunk)
+                if usage:
+                    record_tokens(usage, retrieval_details)
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    yield delta
+
+    def generate_response(self, query: str, context: str, chat_history: List[Tuple[str, str]]) -> str:
+        """
+        Generate a response considering chat history.
+        """
+        try:
+            return "".join(self.generate_response_stream(query, context, chat_history))
 
         except Exception as e:
             print(f"Error generating response: {e}")
-            return "An error occurred while generating the response. Please try again later."
+            return self.ERROR_RESPONSE
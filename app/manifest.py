@@ -0,0 +1,141 @@
+import os
+import json
+import hashlib
+from typing import Dict, List, Optional
+from app.config import CHUNK_SIZE, CHUNKING_MODE, CHUNK_OVERLAP_ROWS
+
+
+class IngestManifest:
+    """
+    A class to record what has been ingested into the vector store, so that re-running the
+    ingestion only touches the chunks whose source data or metadata file changed.
+
+    For each source file the manifest stores the size, mtime and SHA-256 of the CSV and its
+    metadata file, the chunking settings, and a content hash for every chunk id.
+    """
+
+    VERSION = 1
+    # Bumped when the chunk text format changes, so that every file is re-chunked.
+    # 2: the column metadata moved from the chunk text to the schema registry
+    CHUNK_FORMAT = 2
+
+    def __init__(self, manifest_path: str):
+        self.manifest_path = manifest_path
+        self.files = {}
+        # Whether the entries differ from the file on disk; saving bumps the manifest mtime, which
+        # makes every serving process clear its query caches
+        self.changed = False
+        self.load()
+
+    def load(self):
+        """
+        Loads the manifest from disk, starting empty if it does not exist yet.
+        """
+        self.changed = False
+        if not os.path.exists(self.manifest_path):
+            self.files = {}
+            return
+        try:
+            with open(self.manifest_path, 'r') as file:
+                data = json.load(file)
+            if data.get("version") != self.VERSION:
+                print(f"Ignoring manifest with unsupported version {data.get('version')}")
+                self.files = {}
+            else:
+                self.files = data.get("files", {})
+        except json.JSONDecodeError as e:
+            print(f"Error reading manifest file, treating every file as new: {e}")
+            self.files = {}
+
+    def save(self):
+        """
+        Writes the manifest atomically, so an interrupted run never leaves a truncated file.
+        """
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, 'w') as file:
+            json.dump({"version": self.VERSION, "files": self.files}, file)
+        os.replace(tmp_path, self.manifest_path)
+        self.changed = False
+
+    @staticmethod
+    def file_sha256(path: str) -> str:
+        """
+        Hash a file in 1 MiB blocks so large CSVs are never loaded into memory.
+        """
+        digest = hashlib.sha256()
+        with open(path, 'rb') as file:
+            for block in iter(lambda: file.read(1 << 20), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    @staticmethod
+    def chunk_hash(text: str, metadata: dict) -> str:
+        """
+        Content hash of a chunk's text and storage metadata.
+        """
+        digest = hashlib.sha256(text.encode('utf-8'))
+        digest.update(json.dumps(metadata, sort_keys=True, default=str).encode('utf-8'))
+        return digest.hexdigest()[:16]
+
+    @classmethod
+    def chunking_settings(cls) -> dict:
+        return {
+            "chunk_format": cls.CHUNK_FORMAT,
+            "chunking_mode": CHUNKING_MODE,
+            "chunk_size": CHUNK_SIZE,
+            "chunk_overlap_rows": CHUNK_OVERLAP_ROWS,
+        }
+
+    def file_signature(self, csv_path: str, metadata_path: str, previous: Optional[dict] = None) -> dict:
+        """
+        Describe the current state of a CSV file and its metadata file.
+        Hashes are reused from the previous signature when size and mtime did not change.
+        """
+        signature = {"settings": self.chunking_settings()}
+        for key, path in (("data", csv_path), ("metadata", metadata_path)):
+            stat = os.stat(path)
+            entry = {"size": stat.st_size, "mtime": stat.st_mtime}
+            old = (previous or {}).get(key)
+            if old and old["size"] == entry["size"] and old["mtime"] == entry["mtime"]:
+                entry["sha256"] = old["sha256"]
+            else:
+                entry["sha256"] = self.file_sha256(path)
+            signature[key] = entry
+        return signature
+
+    def is_unchanged(self, file_name: str, signature: dict) -> bool:
+        """
+        A file is unchanged when its data, metadata and chunking settings all match the manifest.
+        """
+        previous = self.files.get(file_name, {}).get("signature")
+        if not previous:
+            return False
+        return (
+            previous["settings"] == signature["settings"]
+            and previous["data"]["sha256"] == signature["data"]["sha256"]
+            and previous["metadata"]["sha256"] == signature["metadata"]["sha256"]
+        )
+
+    def get_signature(self, file_name: str) -> Optional[dict]:
+        return self.files.get(file_name, {}).get("signature")
+
+    def get_chunk_hashes(self, file_name: str) -> Dict[str, str]:
+        return self.files.get(file_name, {}).get("chunks", {})
+
+    def update_file(self, file_name: str, signature: dict, chunk_hashes: Dict[str, str]):
+        entry = {"signature": signature, "chunks": chunk_hashes}
+        if self.files.get(file_name) != entry:
+            self.files[file_name] = entry
+            self.changed = True
+
+    def update_signature(self, file_name: str, signature: dict):
+        if file_name in self.files and self.files[file_name]["signature"] != signature:
+            self.files[file_name]["signature"] = signature
+            self.changed = True
+
+    def remove_file(self, file_name: str):
+        if self.files.pop(file_name, None) is not None:
+            self.changed = True
+
+    def file_names(self) -> List[str]:
+        return list(self.files.keys())
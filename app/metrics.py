@@ -0,0 +1,170 @@
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram in the Prometheus style.
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """
+    In-process histograms and counters, keyed on metric name and labels, rendered in the
+    Prometheus text exposition format.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+        self._help = {}
+
+    @staticmethod
+    def _key(name: str, labels: Dict[str, Any]) -> Tuple[str, Tuple[Tuple[str, str], ...]]:
+        return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+    def observe(self, name: str, value: float, help: str = "", **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            if key not in self._histograms:
+                self._histograms[key] = Histogram()
+            self._histograms[key].observe(value)
+            if help:
+                self._help.setdefault(name, help)
+
+    def inc(self, name: str, amount: float = 1, help: str = "", **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+            if help:
+                self._help.setdefault(name, help)
+
+    def clear(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    @staticmethod
+    def _labels(labels: Tuple[Tuple[str, str], ...], extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+        pairs = labels + extra
+        if not pairs:
+            return ""
+        escaped = (value.replace("\\", "\\\\").replace('"', '\\"') for _, value in pairs)
+        return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + "}"
+
+    def render(self) -> str:
+        """
+        Prometheus text format of every metric.
+        """
+        lines = []
+        with self._lock:
+            names = {}
+            for (name, labels), counter in sorted(self._counters.items()):
+                names.setdefault(name, ("counter", []))[1].append((labels, counter))
+            for (name, labels), histogram in sorted(self._histograms.items()):
+                names.setdefault(name, ("histogram", []))[1].append((labels, histogram))
+
+            for name, (kind, series) in names.items():
+                if self._help.get(name):
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in series:
+                    if kind == "counter":
+                        lines.append(f"{name}{self._labels(labels)} {value}")
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(value.buckets + (float("inf"),), value.counts):
+                        cumulative += count
+                        le = "+Inf" if bound == float("inf") else repr(bound)
+                        lines.append(f"{name}_bucket{self._labels(labels, (('le', le),))} {cumulative}")
+                    lines.append(f"{name}_sum{self._labels(labels)} {value.sum}")
+                    lines.append(f"{name}_count{self._labels(labels)} {value.count}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+
+@contextmanager
+def span(stage: str, retrieval_details: Optional[Dict[str, Any]] = None, metric: str = "rag_stage_seconds"):
+    """
+    Time a stage: the duration goes into the `metric` histogram labelled with the stage and,
+    when retrieval_details is given, is added to retrieval_details["timings"][stage].
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        REGISTRY.observe(metric, elapsed, help="Duration of each pipeline stage in seconds", stage=stage)
+        if retrieval_details is not None:
+            timings = retrieval_details.setdefault("timings", {})
+            timings[stage] = timings.get(stage, 0.0) + elapsed
+
+
+def record_cache(cache: str, hit: bool, retrieval_details: Optional[Dict[str, Any]] = None):
+    """
+    Count a cache lookup, and record its outcome in retrieval_details["cache_hits"][cache].
+    """
+    REGISTRY.inc("rag_cache_lookups_total", help="Cache lookups by cache", cache=cache)
+    if hit:
+        REGISTRY.inc("rag_cache_hits_total", help="Cache hits by cache", cache=cache)
+    if retrieval_details is not None:
+        retrieval_details.setdefault("cache_hits", {})[cache] = hit
+
+
+def record_tokens(usage: Dict[str, int], retrieval_details: Optional[Dict[str, Any]] = None):
+    """
+    Count the prompt/completion tokens of an LLM call, and store them in retrieval_details["tokens"].
+    """
+    for kind in ("prompt_tokens", "completion_tokens"):
+        if usage.get(kind) is not None:
+            REGISTRY.inc("llm_tokens_total", usage[kind], help="LLM tokens by kind", kind=kind[:-len("_tokens")])
+    if retrieval_details is not None:
+        retrieval_details["tokens"] = dict(usage)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """
+    Serve GET /metrics in Prometheus text format from a daemon thread.
+    """
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    print(f"Metrics available at http://{host}:{server.server_address[1]}/metrics")
+    return server
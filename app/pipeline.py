@@ -0,0 +1,188 @@
+import time
+import queue
+import threading
+from typing import List
+from app.config import EMBED_BATCH_SIZE, PIPELINE_QUEUE_SIZE
+from app.metrics import REGISTRY
+
+_STOP = object()
+
+
+class StageStats:
+    """
+    Throughput counters of one pipeline stage. busy_seconds excludes the time the stage
+    spent waiting for input or blocked on a full output queue.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.items = 0
+        self.calls = 0
+        self.busy_seconds = 0.0
+        self.wait_seconds = 0.0
+
+    def report(self, elapsed: float) -> str:
+        rate = self.items / self.busy_seconds if self.busy_seconds else 0.0
+        utilisation = self.busy_seconds / elapsed if elapsed else 0.0
+        return (f"{self.name:<6} {self.items:>9} chunks in {self.calls:>6} calls, "
+                f"busy {self.busy_seconds:8.1f}s ({utilisation:6.1%}), {rate:10.1f} chunks/sec while busy")
+
+
+class EmbeddingPipeline:
+    """
+    A three-stage chunk -> embed -> write pipeline connected by bounded queues.
+
+    The caller's thread is the chunk stage and hands batches to submit(). An embedding thread
+    computes vectors with the SentenceTransformer in batches of embed_batch_size, and a writer
+    thread upserts them with collection.upsert(embeddings=...). Parsing, embedding and disk
+    writes overlap, and the bounded queues keep memory in check by blocking the faster stage.
+    """
+
+    def __init__(self, collection, embedder, embed_batch_size: int = EMBED_BATCH_SIZE,
+                 queue_size: int = PIPELINE_QUEUE_SIZE):
+        self.collection = collection
+        self.embedder = embedder
+        self.embed_batch_size = embed_batch_size
+        self.embed_queue = queue.Queue(maxsize=queue_size)
+        self.write_queue = queue.Queue(maxsize=queue_size)
+        self.stats = {name: StageStats(name) for name in ("chunk", "embed", "write")}
+        self.errors = []
+        self.start = time.perf_counter()
+        self._last_submit = self.start
+        self._threads = [
+            threading.Thread(target=self._run_stage, args=(self._embed_loop,), name="embed", daemon=True),
+            threading.Thread(target=self._run_stage, args=(self._write_loop,), name="write", daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, ids: List[str], texts: List[str], metadatas: List[dict]):
+        """
+        Queue a batch of chunks for embedding and writing; blocks while the embed queue is full.
+        """
+        self._raise_if_failed()
+        self._record_chunk_stage(len(ids))
+        self._put(self.embed_queue, ("upsert", ids, texts, metadatas), self.stats["chunk"])
+
+    def submit_delete(self, ids: List[str]):
+        """
+        Queue chunk ids for deletion by the writer thread.
+        """
+        self._raise_if_failed()
+        self._record_chunk_stage(0)
+        self._put(self.write_queue, ("delete", ids, None, None, None), self.stats["chunk"])
+
+    def close(self):
+        """
+        Flush all stages, wait for them to finish and print the per-stage throughput.
+        Raises the first error any stage hit.
+        """
+        self._record_chunk_stage(0)
+        self._put(self.embed_queue, _STOP, self.stats["chunk"])
+        for thread in self._threads:
+            thread.join()
+        self._raise_if_failed()
+        self.report()
+
+    def report(self):
+        elapsed = time.perf_counter() - self.start
+        print(f"Ingestion pipeline stages over {elapsed:.1f}s (the busiest stage is the bottleneck):")
+        for stats in self.stats.values():
+            print(f"  {stats.report(elapsed)}")
+
+    def _record_chunk_stage(self, n_items: int):
+        # The chunk stage runs in the caller's thread: its busy time is the time between
+        # two hand-offs minus the time it spent blocked on the queue
+        now = time.perf_counter()
+        stats = self.stats["chunk"]
+        stats.busy_seconds += now - self._last_submit
+        stats.items += n_items
+        stats.calls += 1 if n_items else 0
+        self._last_submit = now
+
+    def _put(self, target: queue.Queue, item, stats: StageStats):
+        start = time.perf_counter()
+        while True:
+            try:
+                target.put(item, timeout=0.5)
+                break
+            except queue.Full:
+                self._raise_if_failed()
+        blocked = time.perf_counter() - start
+        stats.wait_seconds += blocked
+        if stats.name == "chunk":
+            self._last_submit += blocked
+
+    def _get(self, source: queue.Queue, stats: StageStats):
+        start = time.perf_counter()
+        item = source.get()
+        stats.wait_seconds += time.perf_counter() - start
+        return item
+
+    def _run_stage(self, loop):
+        try:
+            loop()
+        except Exception as e:
+            self.errors.append(e)
+            # Unblock the neighbouring stages so close() can return the error
+            for target in (self.embed_queue, self.write_queue):
+                while True:
+                    try:
+                        target.get_nowait()
+                    except queue.Empty:
+                        break
+                try:
+                    target.put_nowait(_STOP)
+                except queue.Full:
+                    pass
+
+    def _raise_if_failed(self):
+        if self.errors:
+            raise RuntimeError(f"Ingestion pipeline failed: {self.errors[0]}") from self.errors[0]
+
+    def _embed_loop(self):
+        stats = self.stats["embed"]
+        ids, texts, metadatas = [], [], []
+        while True:
+            item = self._get(self.embed_queue, stats)
+            if item is not _STOP:
+                _, batch_ids, batch_texts, batch_metadatas = item
+                ids.extend(batch_ids)
+                texts.extend(batch_texts)
+                metadatas.extend(batch_metadatas)
+
+            # Embed in full batches; the remainder waits for more input unless the pipeline is closing
+            while len(ids) >= self.embed_batch_size or (item is _STOP and ids):
+                n = self.embed_batch_size
+                start = time.perf_counter()
+                embeddings = self.embedder.embed(texts[:n], batch_size=n)
+                elapsed = time.perf_counter() - start
+                stats.busy_seconds += elapsed
+                REGISTRY.observe("ingest_stage_seconds", elapsed, stage="embed")
+                stats.items += len(embeddings)
+                stats.calls += 1
+                self._put(self.write_queue, ("upsert", ids[:n], texts[:n], metadatas[:n], embeddings), stats)
+                del ids[:n], texts[:n], metadatas[:n]
+
+            if item is _STOP:
+                self._put(self.write_queue, _STOP, stats)
+                return
+
+    def _write_loop(self):
+        stats = self.stats["write"]
+        while True:
+            item = self._get(self.write_queue, stats)
+            if item is _STOP:
+                return
+            action, ids, texts, metadatas, embeddings = item
+
+            start = time.perf_counter()
+            if action == "delete":
+                self.collection.delete(ids=ids)
+            else:
+                self.collection.upsert(ids=ids, embeddings=embeddings, documents=texts, metadatas=metadatas)
+                stats.items += len(ids)
+            elapsed = time.perf_counter() - start
+            stats.busy_seconds += elapsed
+            REGISTRY.observe("ingest_stage_seconds", elapsed, stage=action)
+            stats.calls += 1
@@ -1,7 +1,7 @@
 import os
 import pandas as pd
-from typing import Dict
-from app.config import CHUNK_SIZE
+from typing import Dict, Iterator, List, Optional, Tuple
+from app.config import CHUNK_SIZE, CHUNK_OVERLAP_ROWS, INGEST_BATCH_ROWS
 
 class DocumentProcessor:
     """
@@ -9,6 +9,10 @@ class DocumentProcessor:
     and chunking different types of files (txt, pdf, docx, csv).
     """
 
+    def __init__(self):
+        # Number of CSV rows formatted by this processor, used for ingestion throughput reporting
+        self.rows_read = 0
+
     @staticmethod
     def normalize_column_name(column_name: str) -> str:
         """
@@ -36,22 +40,57 @@ class DocumentProcessor:
         """
         try:
             metadata_df = pd.read_csv(metadata_file_path)
-            metadata_dict = {}
-            
-            for _, row in metadata_df.iterrows():
-                # Store using original column name from metadata
-                metadata_dict[row['column_name']] = {
-                    'data_type': row['data_type'],
-                    'values': row['values'],
-                    'full_name': row['full_name'],
-                    'description': row['description'],
-                    'notes': row['notes']
-                }
+            fields = ['data_type', 'values', 'full_name', 'description', 'notes']
+
+            # Store using original column name from metadata
+            metadata_dict = dict(zip(
+                metadata_df['column_name'],
+                metadata_df[fields].to_dict('records')
+            ))
             
             return metadata_dict
         except Exception as e:
             raise Exception(f"Error reading metadata file: {e}")
 
+    def read_schema(self, file_path: str, metadata_file_path: str) -> List[Dict]:
+        """
+        Column metadata of a CSV file for the schema registry, reading only its header row.
+        """
+        from app.schema_registry import SchemaRegistry
+
+        try:
+            headers = pd.read_csv(file_path, nrows=0).columns.tolist()
+            metadata_dict = self.read_metadata_file(metadata_file_path)
+            column_mapping = self.create_column_mapping(headers, list(metadata_dict.keys()))
+            return SchemaRegistry.build_columns(headers, column_mapping, metadata_dict)
+        except Exception as e:
+            raise Exception(f"Error reading schema of {file_path}: {e}")
+
+    def format_rows(self, df: pd.DataFrame, column_mapping: dict, metadata_dict: Dict) -> List[str]:
+        """
+        Format each record as a single line of labelled values.
+        The label prefixes are built once per column and the columns are joined with
+        vectorized string operations instead of a per-row, per-cell Python loop.
+        """
+        self.rows_read += len(df)
+        if df.empty:
+            return []
+
+        prefixes = []
+        for header in df.columns:
+            if header in column_mapping:
+                prefixes.append(f"{header} ({metadata_dict[column_mapping[header]]['full_name']}): ")
+            else:
+                prefixes.append(f"{header}: ")
+
+        # df.to_numpy() gives the same common-dtype values that iterrows() yields per row,
+        # so str() of each cell (e.g. ints upcast to float in all-numeric frames) is unchanged.
+        values = df.to_numpy()
+        data_rows = prefixes[0] + values[:, 0].astype(str).astype(object)
+        for j in range(1, values.shape[1]):
+            data_rows = data_rows + (", " + prefixes[j]) + values[:, j].astype(str).astype(object)
+        return data_rows.tolist()
+
     def read_csv_with_metadata(self, file_path: str, metadata_file_path: str) -> str:
         """
         Read CSV file and its metadata, handling column name mismatches.
@@ -64,48 +103,78 @@ class DocumentProcessor:
                 list(metadata_dict.keys())
             )
             
-            # Process each row with metadata
-            headers = df.columns.tolist()
-            
-            # Add metadata header section
-            metadata_header = "FILE METADATA:\n"
-            for csv_col in headers:
-                if csv_col in column_mapping:
-                    metadata_col = column_mapping[csv_col]
-                    metadata_header += (
-                        f"Column: {csv_col}\n"
-                        f"Type: {metadata_dict[metadata_col]['data_type']}\n"
-                        f"Description: {metadata_dict[metadata_col]['description']}\n"
-                        f"Notes: {metadata_dict[metadata_col]['notes']}\n\n"
-                    )
-                else:
-                    metadata_header += (
-                        f"Column: {csv_col}\n"
-                        f"Type: unknown\n"
-                        f"Description: No metadata available\n"
-                        f"Notes: No metadata available\n\n"
-                    )
+            # The column descriptions live in the schema registry, the text only names its source
+            schema_header = self.build_schema_header(os.path.basename(file_path))
             
-            data_rows = []
-            for _, row in df.iterrows():
-                row_items = []
-                for header in headers:
-                    if header in column_mapping:
-                        metadata_col = column_mapping[header]
-                        row_items.append(
-                            f"{header} ({metadata_dict[metadata_col]['full_name']}): {row[header]}"
-                        )
-                    else:
-                        row_items.append(f"{header}: {row[header]}")
-                data_rows.append(", ".join(row_items))
+            # Process each row with metadata
+            data_rows = self.format_rows(df, column_mapping, metadata_dict)
             
-            # Combine metadata and data with clear section separation
-            return f"{metadata_header}\n\nDATA RECORDS:\n" + "\n".join(data_rows)
+            return schema_header + "\n".join(data_rows)
             
         except Exception as e:
             print(f"Error details: {str(e)}")
             raise Exception(f"Error processing CSV with metadata: {e}")
 
+    def iter_csv_rows(self, file_path: str, metadata_file_path: str,
+                      batch_rows: Optional[int] = INGEST_BATCH_ROWS) -> Iterator[Tuple[str, List[str], pd.DataFrame]]:
+        """
+        Stream a CSV file with its metadata, one batch of rows at a time.
+        Args:
+            file_path (str): Path to the CSV file.
+            metadata_file_path (str): Path to the metadata CSV file.
+            batch_rows (int, optional): Number of rows read per batch, or None to read the whole file at once.
+        Yields:
+            tuple: The schema header, the formatted rows of the batch and the batch DataFrame.
+        """
+        try:
+            metadata_dict = self.read_metadata_file(metadata_file_path)
+            column_mapping = None
+            reader = [pd.read_csv(file_path)] if batch_rows is None else pd.read_csv(file_path, chunksize=batch_rows)
+
+            for df in reader:
+                if column_mapping is None:
+                    column_mapping = self.create_column_mapping(
+                        df.columns.tolist(),
+                        list(metadata_dict.keys())
+                    )
+                    schema_header = self.build_schema_header(os.path.basename(file_path))
+                yield schema_header, self.format_rows(df, column_mapping, metadata_dict), df
+
+        except Exception as e:
+            print(f"Error details: {str(e)}")
+            raise Exception(f"Error streaming CSV with metadata: {e}")
+
+    def iter_csv_with_metadata(self, file_path: str, metadata_file_path: str,
+                               batch_rows: int = INGEST_BATCH_ROWS) -> Iterator[str]:
+        """
+        Stream a CSV file with its metadata, yielding the document text one batch of rows at a time.
+        The first batch carries the schema header, so memory is bounded by batch_rows, not file size.
+        Args:
+            file_path (str): Path to the CSV file.
+            metadata_file_path (str): Path to the metadata CSV file.
+            batch_rows (int, optional): Number of rows read per batch. Defaults to INGEST_BATCH_ROWS.
+        Yields:
+            str: The formatted text of one batch of rows.
+        """
+        for i, (schema_header, data_rows, _) in enumerate(self.iter_csv_rows(file_path, metadata_file_path, batch_rows)):
+            if i == 0:
+                yield schema_header + "\n".join(data_rows)
+            else:
+                yield "\n".join(data_rows)
+
+    @staticmethod
+    def build_schema_header(file_name: str) -> str:
+        """
+        Build the schema header repeated on every record-aligned chunk. It only names the source file:
+        the records label their values with the column names, and the column descriptions are kept
+        once per file in the schema registry (app/schema_registry.py).
+        """
+        return (
+            "FILE METADATA:\n"
+            f"Source: {file_name}\n\n"
+            "DATA RECORDS:\n"
+        )
+
     def log_column_mapping(self, csv_columns: list, metadata_columns: list, mapping: dict):
         """
         Debug helper to log column mapping details.
@@ -168,3 +237,36 @@ class DocumentProcessor:
             return chunks
         except Exception as e:
             raise RuntimeError(f"Error during text chunking: {e}")
+
+    def chunk_records(self, rows: List[str], header: str = "", chunk_size: int = CHUNK_SIZE,
+                      overlap_rows: int = CHUNK_OVERLAP_ROWS, row_offset: int = 0) -> List[Tuple[str, int, int]]:
+        """
+        Pack whole records into chunks of up to chunk_size characters without ever splitting a row.
+        A row longer than chunk_size becomes a chunk on its own.
+        Args:
+            rows (list): The formatted records, one per row.
+            header (str, optional): Schema header prepended to every chunk; it does not count towards chunk_size.
+            chunk_size (int, optional): The maximum size of the records in each chunk. Defaults to CHUNK_SIZE.
+            overlap_rows (int, optional): Number of trailing rows repeated at the start of the next chunk.
+            row_offset (int, optional): Index of rows[0] in the source file.
+        Returns:
+            list: (chunk text, first row index, last row index) tuples.
+        """
+        try:
+            chunks = []
+            start = 0
+            while start < len(rows):
+                end = start
+                size = 0
+                while end < len(rows) and (end == start or size + len(rows[end]) + 1 <= chunk_size):
+                    size += len(rows[end]) + 1
+                    end += 1
+
+                chunks.append((header + "\n".join(rows[start:end]), row_offset + start, row_offset + end - 1))
+                if end == len(rows):
+                    break
+                start = max(end - overlap_rows, start + 1)
+
+            return chunks
+        except Exception as e:
+            raise RuntimeError(f"Error during record chunking: {e}")
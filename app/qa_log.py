@@ -0,0 +1,183 @@
+import os
+import json
+import queue
+import atexit
+import threading
+from typing import Any, Dict, Optional
+from app.config import (QA_LOG_BATCH_SIZE, QA_LOG_FLUSH_INTERVAL, QA_LOG_FSYNC, QA_LOG_MAX_BYTES,
+                        QA_LOG_BACKUP_COUNT, QA_LOG_QUEUE_SIZE)
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, rotation is then only safe with a single writer process
+    fcntl = None
+
+_STOP = object()
+
+
+class QALogger:
+    """
+    An append-only JSON Lines log of questions and answers.
+
+    log() only enqueues the record; a background thread writes records in batches with a single
+    O_APPEND write per batch, so concurrent processes never interleave partial lines. The log is
+    rotated to <path>.1 ... <path>.<backup_count> once it exceeds max_bytes.
+    fsync policy: "always" syncs after every record, "batch" after every batch, "never" leaves it to the OS.
+    """
+
+    def __init__(self, log_path: str, legacy_json_path: Optional[str] = None,
+                 batch_size: int = QA_LOG_BATCH_SIZE, flush_interval: float = QA_LOG_FLUSH_INTERVAL,
+                 fsync: str = QA_LOG_FSYNC, max_bytes: int = QA_LOG_MAX_BYTES,
+                 backup_count: int = QA_LOG_BACKUP_COUNT, queue_size: int = QA_LOG_QUEUE_SIZE):
+        if fsync not in ("always", "batch", "never"):
+            raise ValueError(f"Unsupported fsync policy: {fsync}")
+        self.log_path = log_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+
+        if legacy_json_path:
+            self.migrate_legacy_json(legacy_json_path)
+
+        self._thread = threading.Thread(target=self._run, name="qa-log-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def log(self, record: Dict[str, Any]):
+        """
+        Queue a record for writing without blocking the request path.
+        Records are dropped (and counted) if the writer falls queue_size records behind.
+        """
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        """
+        Write all queued records and stop the writer thread.
+        """
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join()
+
+    def migrate_legacy_json(self, json_path: str):
+        """
+        One-time migration of the old qa_history.json array into the JSON Lines log.
+        The old file is renamed to <json_path>.migrated afterwards. This runs under the lock of the
+        log, so when several processes start together only the first one migrates the records.
+        """
+        if not os.path.exists(json_path):
+            return
+        fd = self._open_locked()
+        try:
+            try:
+                with open(json_path, 'r') as file:
+                    content = file.read()
+            except FileNotFoundError:
+                # Migrated by another process while this one waited for the lock
+                return
+            if not content.strip():
+                return
+            try:
+                qa_history = json.loads(content)
+            except json.JSONDecodeError as e:
+                print(f"Error reading JSON file, not migrating it: {e}")
+                return
+            if not isinstance(qa_history, list):
+                return
+
+            lines = [self._encode(record) for record in qa_history]
+            if lines:
+                os.write(fd, b"".join(lines))
+                if self.fsync != "never":
+                    os.fsync(fd)
+            try:
+                os.replace(json_path, f"{json_path}.migrated")
+            except FileNotFoundError:
+                return
+        finally:
+            os.close(fd)
+        print(f"Migrated {len(qa_history)} Q&A records from {json_path} to {self.log_path}")
+
+    @staticmethod
+    def _encode(record: Dict[str, Any]) -> bytes:
+        return (json.dumps(record, default=str) + "\n").encode('utf-8')
+
+    def _run(self):
+        while True:
+            try:
+                records = [self._queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+            while len(records) < self.batch_size:
+                try:
+                    records.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = any(record is _STOP for record in records)
+            lines = [self._encode(record) for record in records if record is not _STOP]
+            try:
+                self._write_lines(lines)
+            except OSError as e:
+                print(f"Error writing Q&A log: {e}")
+            if stop:
+                return
+
+    def _write_lines(self, lines):
+        if not lines:
+            return
+        fd = self._open_locked()
+        try:
+            size = os.fstat(fd).st_size
+            if self.max_bytes and size > 0 and size + sum(map(len, lines)) > self.max_bytes:
+                self._rotate()
+                os.close(fd)
+                fd = self._open_locked()
+
+            if self.fsync == "always":
+                for line in lines:
+                    os.write(fd, line)
+                    os.fsync(fd)
+            else:
+                os.write(fd, b"".join(lines))
+                if self.fsync == "batch":
+                    os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def _open_locked(self) -> int:
+        """
+        Open the current log for appending with an exclusive lock. If another process rotated the
+        log while this one waited for the lock, the fd points at a backup and the log is reopened.
+        """
+        while True:
+            fd = os.open(self.log_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            if not fcntl:
+                return fd
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                if os.fstat(fd).st_ino == os.stat(self.log_path).st_ino:
+                    return fd
+            except FileNotFoundError:
+                pass
+            os.close(fd)
+
+    def _rotate(self):
+        """
+        Shift the <path>.N backups up by one and move the current log to <path>.1.
+        Called with the lock of the current log held.
+        """
+        for i in range(self.backup_count - 1, 0, -1):
+            source = f"{self.log_path}.{i}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.log_path}.{i + 1}")
+        if self.backup_count > 0:
+            os.replace(self.log_path, f"{self.log_path}.1")
+        else:
+            os.remove(self.log_path)
@@ -1,9 +1,23 @@
 import json
-import os
-from typing import Dict, List, Tuple, Any
+import time
+import threading
+import numpy as np
+from typing import Dict, Iterator, List, Optional, Tuple, Any
 from app.initialiseDB import VectorDBSetup
 from app.llm import LLMProcessor
-from app.config import N_CHUNKS, CONFIDENCE_THRESHOLD
+from app.qa_log import QALogger
+from app.answer_cache import SemanticAnswerCache
+from app.cache import LRUCache
+from app.metrics import REGISTRY, span, record_cache
+from app.lexical import BM25Index, reciprocal_rank_fusion
+from app.analytics import AnalyticsStore, AnalyticsRouter
+from app.chunk_filters import extract_where
+from app.context_packer import ContextPacker
+from app.schema_registry import SchemaRegistry
+from app.rerank import MMRReranker
+from app.config import (N_CHUNKS, CONFIDENCE_THRESHOLD, QUERY_CACHE_SIZE, QUERY_CACHE_TTL, HYBRID_SEARCH,
+                        HYBRID_CANDIDATES, RRF_K, ANALYTICS_ENABLED, FILTER_PUSHDOWN, RERANK_MMR,
+                        RERANK_CANDIDATES)
 
 class RAGProcessor:
     """
@@ -13,13 +27,104 @@ class RAGProcessor:
 
     def __init__(self, client_manager):
         self.json_file_path = client_manager.get_json_file_path()
+        self.qa_logger = QALogger(client_manager.get_qa_log_path(), legacy_json_path=self.json_file_path)
         self.vector_db_instance = VectorDBSetup(client_manager)
         self.llm_processor_instance = LLMProcessor(client_manager)
+        self.embedding_cache = LRUCache(QUERY_CACHE_SIZE, QUERY_CACHE_TTL)
+        self.results_cache = LRUCache(QUERY_CACHE_SIZE, QUERY_CACHE_TTL)
+        self.answer_cache = SemanticAnswerCache(client_manager.get_answer_cache_path())
+        self.lexical_index_path = client_manager.get_lexical_index_path()
+        self.lexical_index = None
+        self.analytics_store = AnalyticsStore(client_manager.get_analytics_db_path())
+        self.analytics_router = None
+        self.context_packer = ContextPacker()
+        self.schema_registry = SchemaRegistry(client_manager.get_schema_registry_path())
+        self.reranker = MMRReranker() if RERANK_MMR else None
+        self.store_version = None
+        self._store_lock = threading.Lock()
+        self.ready = threading.Event()
 
     @staticmethod
-    def semantic_search(collection, query: str, n_results: int = 2) -> dict:
+    def normalize_query(query: str) -> str:
         """
-        Perform semantic search on the collection.
+        Normalize a query for cache lookups: case and whitespace do not change the embedding.
+        """
+        return " ".join(query.lower().split())
+
+    def check_store_version(self, collection):
+        """
+        Clear the query caches when the collection was reloaded or re-ingested since the last query.
+        Called from every retrieval thread; the lock makes sure only one of them reloads the side stores.
+        """
+        store_version = self.vector_db_instance.store_version(collection)
+        if store_version == self.store_version:
+            return
+        with self._store_lock:
+            if store_version == self.store_version:
+                return
+            self.embedding_cache.clear()
+            self.results_cache.clear()
+            # The answer cache outlives the process, so it only compares the store contents
+            self.answer_cache.check_store(store_version[1:])
+            # setupDB.py rebuilds the lexical index and schema registry with every ingestion, so reopen them as well
+            self.schema_registry.load()
+            self.lexical_index = BM25Index.load(self.lexical_index_path) if HYBRID_SEARCH else None
+            if ANALYTICS_ENABLED and self.analytics_store.open():
+                self.analytics_router = AnalyticsRouter(self.analytics_store)
+            else:
+                self.analytics_router = None
+            self.store_version = store_version
+
+    def warm_up(self, asynchronous: bool = False):
+        """
+        Load everything the first request needs: the vector store and embedding model (with a
+        warm-up query), the lexical index, the analytics store and the LLM client. Sets `ready`.
+        """
+        start = time.perf_counter()
+        self.vector_db_instance.warm_up()
+        self.check_store_version(self.vector_db_instance.get_collection())
+        client_manager = self.llm_processor_instance.client_manager
+        if asynchronous:
+            client_manager.get_async_client()
+        else:
+            client_manager.get_client()
+        elapsed = time.perf_counter() - start
+        REGISTRY.observe("rag_stage_seconds", elapsed, stage="warm_up")
+        self.ready.set()
+        print(f"Ready to answer queries after a {elapsed:.2f}s warm-up")
+
+    def start_warm_up(self, asynchronous: bool = False) -> threading.Thread:
+        """
+        Run warm_up() in a background thread, so the UI or API can start listening right away.
+        Requests that arrive earlier wait for the shared vector store to finish loading.
+        """
+        def run():
+            try:
+                self.warm_up(asynchronous)
+            except Exception as e:
+                print(f"Warm-up failed, the model will load on the first query instead: {e}")
+
+        thread = threading.Thread(target=run, name="warm-up", daemon=True)
+        thread.start()
+        return thread
+
+    def embed_query(self, query: str, retrieval_details: Optional[Dict[str, Any]] = None):
+        """
+        Embed a query, reusing the cached embedding of an identical normalized query.
+        """
+        key = self.normalize_query(query)
+        embedding = self.embedding_cache.get(key)
+        if retrieval_details is not None:
+            record_cache("query_embedding", embedding is not None, retrieval_details)
+        if embedding is None:
+            with span("embedding", retrieval_details):
+                embedding = self.vector_db_instance.get_embedder().embed([query])[0]
+            self.embedding_cache.set(key, embedding)
+        return embedding
+
+    def semantic_search(self, collection, query: str, n_results: int = 2) -> dict:
+        """
+        Perform semantic search on the collection, served from the LRU caches for repeated queries.
         Args:
             collection: The ChromaDB collection to search.
             query (str): The query to search for in the collection.
@@ -27,45 +132,283 @@ class RAGProcessor:
         Returns:
             dict: The search results containing documents and distances.
         """
-        return collection.query(query_texts=[query], n_results=n_results)
+        return self.cached_search(collection, query, n_results)[0]
+
+    def cached_search(self, collection, query: str, n_results: int,
+                      retrieval_details: Optional[Dict[str, Any]] = None) -> Tuple[dict, bool]:
+        """
+        Semantic search that also reports whether the results came from the cache.
+        Boroughs, document types and years named in the query are pushed down into the search as a
+        `where` filter; if no chunk matches it, the search is repeated without the filter.
+        With a reranker, RERANK_CANDIDATES candidates are searched and n_results of them kept.
+        Stage timings, cache outcomes and the filter used are recorded in retrieval_details when given.
+        """
+        self.check_store_version(collection)
+        where = extract_where(query) if FILTER_PUSHDOWN else None
+        key = self.search_key(query, n_results, where)
+        cached = self.results_cache.get(key)
+        record_cache("search_results", cached is not None, retrieval_details)
+        if cached is not None:
+            results, search_filter = cached
+        else:
+            query_embedding = self.embed_query(query, retrieval_details)
+            n_search = self.search_size(n_results)
+            results = self.search_collection(collection, query, query_embedding, n_search, where, retrieval_details)
+            search_filter = None
+            if where is not None:
+                search_filter = {"where": where, "matched": len(results["ids"][0]), "fallback": False}
+                if not results["ids"][0]:
+                    results = self.search_collection(collection, query, query_embedding, n_search, None,
+                                                     retrieval_details)
+                    search_filter["fallback"] = True
+            results = self.rerank_results(query_embedding, results, n_results, retrieval_details)
+            self.results_cache.set(key, (results, search_filter))
+        if retrieval_details is not None and search_filter is not None:
+            retrieval_details["filter"] = search_filter
+        return results, cached is not None
+
+    def search_key(self, query: str, n_results: int, where: Optional[Dict[str, Any]]) -> tuple:
+        return self.normalize_query(query), n_results, json.dumps(where, sort_keys=True)
+
+    def search_size(self, n_results: int) -> int:
+        """
+        Number of candidates to search for n_results chunks: over-fetched when they are reranked.
+        """
+        return max(n_results, RERANK_CANDIDATES) if self.reranker is not None else n_results
+
+    def search_include(self) -> List[str]:
+        fields = ["documents", "metadatas", "distances"]
+        return fields + ["embeddings"] if self.reranker is not None else fields
+
+    def rerank_results(self, query_embedding, results: dict, n_results: int,
+                       retrieval_details: Optional[Dict[str, Any]] = None) -> dict:
+        """
+        Pick n_results of the searched candidates with the MMR reranker, if there is one.
+        """
+        if self.reranker is None:
+            return results
+        with span("rerank", retrieval_details):
+            results, stats = self.reranker.rerank(query_embedding, results, n_results)
+        if retrieval_details is not None:
+            retrieval_details["rerank"] = stats
+        return results
+
+    def batch_search(self, collection, queries: List[str], n_results: int) -> int:
+        """
+        Fill the embedding and search result caches for many queries at once: one embedding call
+        for every query not cached yet, and one collection.query per distinct `where` filter with all
+        the query embeddings. cached_search then serves these queries from the cache. Queries whose
+        filter matches nothing are left to cached_search, which retries them without the filter.
+        Returns:
+            int: The number of search results cached.
+        """
+        self.check_store_version(collection)
+        pending = {}
+        for query in queries:
+            where = extract_where(query) if FILTER_PUSHDOWN else None
+            pending.setdefault(self.search_key(query, n_results, where), (query, where))
+        if not pending:
+            return 0
+
+        missing = list({self.normalize_query(query): query for query, _ in pending.values()
+                        if self.embedding_cache.get(self.normalize_query(query)) is None}.values())
+        if missing:
+            with span("embedding"):
+                embeddings = self.vector_db_instance.get_embedder().embed(missing)
+            for query, embedding in zip(missing, embeddings):
+                self.embedding_cache.set(self.normalize_query(query), embedding)
+
+        groups = {}
+        for key, (query, where) in pending.items():
+            groups.setdefault(json.dumps(where, sort_keys=True), []).append(key)
+        n_search = self.search_size(n_results)
+        n_candidates = max(n_search, HYBRID_CANDIDATES) if self.lexical_index is not None else n_search
+        cached = 0
+        for keys in groups.values():
+            where = pending[keys[0]][1]
+            query_embeddings = [self.embed_query(pending[key][0]) for key in keys]
+            with span("vector_search"):
+                vector = collection.query(query_embeddings=query_embeddings, n_results=n_candidates, where=where,
+                                          include=self.search_include())
+            for i, key in enumerate(keys):
+                query = pending[key][0]
+                results = {field: [vector[field][i]] for field in ["ids"] + self.search_include()}
+                if self.lexical_index is not None:
+                    results = self.fuse_results(collection, query, query_embeddings[i], results, n_search, where)
+                if where is not None and not results["ids"][0]:
+                    continue
+                results = self.rerank_results(query_embeddings[i], results, n_results)
+                search_filter = None
+                if where is not None:
+                    search_filter = {"where": where, "matched": len(results["ids"][0]), "fallback": False}
+                self.results_cache.set(key, (results, search_filter))
+                cached += 1
+        return cached
+
+    def search_collection(self, collection, query: str, query_embedding, n_results: int,
+                          where: Optional[Dict[str, Any]] = None,
+                          retrieval_details: Optional[Dict[str, Any]] = None) -> dict:
+        """
+        Vector search, fused with the lexical index when there is one, restricted to `where`.
+        """
+        if self.lexical_index is not None:
+            return self.hybrid_search(collection, query, query_embedding, n_results, where, retrieval_details)
+        with span("vector_search", retrieval_details):
+            return collection.query(query_embeddings=[query_embedding], n_results=n_results, where=where,
+                                    include=self.search_include())
 
     @staticmethod
-    def get_context(results: Dict) -> str:
+    def embedding_distance(query_embedding, embeddings, space: str) -> np.ndarray:
         """
-        Enhanced context retrieval with metadata-aware formatting.
+        Distances between the query and chunk embeddings in the collection's distance space,
+        on the same scale as the distances collection.query returns.
         """
-        documents = results['documents'][0]
-        formatted_contexts = []
+        query_vector = np.asarray(query_embedding, dtype=np.float32)
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        if space == "cosine":
+            norms = np.linalg.norm(vectors, axis=1) * np.linalg.norm(query_vector)
+            return 1.0 - (vectors @ query_vector) / np.where(norms == 0, 1.0, norms)
+        if space == "ip":
+            return 1.0 - vectors @ query_vector
+        return np.sum((vectors - query_vector) ** 2, axis=1)
 
-        for doc in documents:
-            if "FILE METADATA:" in doc:
-                # Split metadata and data sections
-                metadata_section, data_section = doc.split("DATA RECORDS:")
-                formatted_metadata = "Column Information:\n" + metadata_section.replace("FILE METADATA:", "").strip()
-                formatted_data = "Data Records:\n" + data_section.strip()
-                formatted_contexts.append(f"{formatted_metadata}\n\n{formatted_data}")
-            else:
-                formatted_contexts.append(doc)
+    @staticmethod
+    def distance_similarity(distance: float, space: str) -> float:
+        """
+        Cosine similarity for a distance returned by collection.query, where smaller is closer.
+        SentenceTransformerEmbedder normalizes every embedding, so the squared L2 distance is
+        2 - 2 * cosine similarity.
+        """
+        if space in ("cosine", "ip"):
+            return 1.0 - distance
+        return 1.0 - distance / 2.0
+
+    def hybrid_search(self, collection, query: str, query_embedding, n_results: int,
+                      where: Optional[Dict[str, Any]] = None,
+                      retrieval_details: Optional[Dict[str, Any]] = None) -> dict:
+        """
+        Vector search for HYBRID_CANDIDATES chunks, fused with the BM25 candidates by fuse_results.
+        """
+        n_candidates = max(n_results, HYBRID_CANDIDATES)
+        with span("vector_search", retrieval_details):
+            vector = collection.query(query_embeddings=[query_embedding], n_results=n_candidates, where=where,
+                                      include=self.search_include())
+        return self.fuse_results(collection, query, query_embedding, vector, n_results, where, retrieval_details)
+
+    def fuse_results(self, collection, query: str, query_embedding, vector: dict, n_results: int,
+                     where: Optional[Dict[str, Any]] = None,
+                     retrieval_details: Optional[Dict[str, Any]] = None) -> dict:
+        """
+        Fuse the vector and BM25 candidates with reciprocal-rank fusion and return the top n_results
+        in the collection.query result format. Chunks found only by the lexical index get their
+        distance computed from the stored embeddings, so the confidence filter treats both alike.
+        The lexical index knows nothing about chunk metadata, so with a `where` filter its
+        candidates are checked against the filter when they are fetched. The embeddings are carried
+        through when the vector results include them, for the reranker.
+        """
+        n_candidates = max(n_results, HYBRID_CANDIDATES)
+        with span("lexical_search", retrieval_details):
+            lexical = self.lexical_index.search(query, n_candidates)
+
+        with span("fusion", retrieval_details):
+            vector_ids = vector["ids"][0]
+            vector_embeddings = vector.get("embeddings")
+            vector_embeddings = vector_embeddings[0] if vector_embeddings is not None else [None] * len(vector_ids)
+            fused = reciprocal_rank_fusion([vector_ids, [chunk_id for chunk_id, _ in lexical]], RRF_K)
+            ranked_ids = sorted(fused, key=lambda chunk_id: -fused[chunk_id])
+
+            found = {
+                chunk_id: (document, metadata, distance, embedding)
+                for chunk_id, document, metadata, distance, embedding in zip(
+                    vector_ids, vector["documents"][0], vector["metadatas"][0], vector["distances"][0],
+                    vector_embeddings)
+            }
+            # Without a filter only the lexical-only chunks that make the cut need fetching; with one,
+            # any of them may be filtered out, so fetch them all and let the next ones move up
+            candidates = ranked_ids if where is not None else ranked_ids[:n_results]
+            missing = [chunk_id for chunk_id in candidates if chunk_id not in found]
+            if missing:
+                extra = collection.get(ids=missing, where=where, include=["documents", "metadatas", "embeddings"])
+                if len(extra["ids"]):
+                    space = (collection.metadata or {}).get("hnsw:space", "l2")
+                    distances = self.embedding_distance(query_embedding, extra["embeddings"], space)
+                    for chunk_id, document, metadata, distance, embedding in zip(
+                            extra["ids"], extra["documents"], extra["metadatas"], distances, extra["embeddings"]):
+                        found[chunk_id] = (document, metadata, float(distance), embedding)
+
+        # Ids of a lexical index older than the collection may no longer exist
+        top_ids = [chunk_id for chunk_id in ranked_ids if chunk_id in found][:n_results]
+        if retrieval_details is not None:
+            retrieval_details["hybrid"] = {
+                "vector_candidates": len(vector_ids),
+                "lexical_candidates": len(lexical),
+                "lexical_only": len([chunk_id for chunk_id in top_ids if chunk_id in missing]),
+            }
+        results = {
+            "ids": [top_ids],
+            "documents": [[found[chunk_id][0] for chunk_id in top_ids]],
+            "metadatas": [[found[chunk_id][1] for chunk_id in top_ids]],
+            "distances": [[found[chunk_id][2] for chunk_id in top_ids]],
+        }
+        if vector.get("embeddings") is not None:
+            results["embeddings"] = [[found[chunk_id][3] for chunk_id in top_ids]]
+        return results
+
+    def clear_caches(self):
+        """
+        Empty the query and answer caches, e.g. to measure cold query latency.
+        """
+        self.embedding_cache.clear()
+        self.results_cache.clear()
+        self.answer_cache.clear()
+
+    def cache_stats(self) -> Dict[str, dict]:
+        return {
+            "query_embeddings": self.embedding_cache.stats(),
+            "search_results": self.results_cache.stats(),
+            "answers": self.answer_cache.stats(),
+        }
 
-        return "\n\n---\n\n".join(formatted_contexts)
+    @staticmethod
+    def build_explanation(retrieval_details: Dict) -> Dict:
+        """
+        Summarize the retrieval details for the explanation panel and API responses.
+        """
+        explanation = {
+            "chunks_retrieved": len(retrieval_details["chunks"]),
+            "relevant_files": list(set(chunk["source"] for chunk in retrieval_details["chunks"])),
+            "confidence_scores": [f"{score:.2f}" for score in retrieval_details["scores"]],
+            "processing_steps": retrieval_details["steps"],
+            "search_cache_hit": retrieval_details.get("search_cache_hit", False),
+            "answer_cache_hit": retrieval_details.get("answer_cache_hit", False)
+        }
+        if retrieval_details.get("answer_cache_hit"):
+            explanation["cached_question"] = retrieval_details["cached_question"]
+        if "time_to_first_token" in retrieval_details:
+            explanation["time_to_first_token"] = f"{retrieval_details['time_to_first_token']:.2f}s"
+        if "analytics" in retrieval_details:
+            explanation["analytics_query"] = retrieval_details["analytics"]["description"]
+        if "packing" in retrieval_details:
+            explanation["context_packing"] = retrieval_details["packing"]
+        if "filter" in retrieval_details:
+            explanation["metadata_filter"] = retrieval_details["filter"]
+        if "rerank" in retrieval_details:
+            explanation["reranking"] = retrieval_details["rerank"]
+        if "timings" in retrieval_details:
+            explanation["stage_timings"] = {stage: f"{seconds * 1000:.0f}ms" for stage, seconds in retrieval_details["timings"].items()}
+        if "tokens" in retrieval_details:
+            explanation["tokens"] = retrieval_details["tokens"]
+        if "queue_wait_seconds" in retrieval_details:
+            explanation["queue_wait"] = f"{retrieval_details['queue_wait_seconds']:.2f}s"
+        if retrieval_details.get("busy"):
+            explanation["queue"] = retrieval_details["queue"]
+        return explanation
 
     def save_qa_to_json(self, qa_data):
-        try:
-            if os.path.exists(self.json_file_path) and os.path.getsize(self.json_file_path) > 0:
-                with open(self.json_file_path, 'r') as file:
-                    qa_history = json.load(file)
-            else:
-                qa_history = []
-                
-            qa_history.append(qa_data)
-            
-            with open(self.json_file_path, 'w') as file:
-                json.dump(qa_history, file, indent=4)
-        except json.JSONDecodeError as e:
-            print(f"Error reading JSON file: {e}")
-            qa_history = [qa_data]  # Start fresh if file is corrupted
-            with open(self.json_file_path, 'w') as file:
-                json.dump(qa_history, file, indent=4)
+        """
+        Append a Q&A record to the JSON Lines log; the write happens on a background thread.
+        """
+        self.qa_logger.log(qa_data)
 
     def extract_context_from_history(self, chat_history: List[Tuple[str, str]]) -> str:
         """
@@ -101,99 +444,249 @@ class RAGProcessor:
         Extract source file information from context.
         """
         if "FILE METADATA:" in context:
+            metadata_section = context.split("FILE METADATA:", 1)[1].split("DATA RECORDS:", 1)[0]
+            for line in metadata_section.splitlines():
+                if line.startswith("Source:"):
+                    return line[len("Source:"):].strip()
             return context.split("FILE METADATA:")[0].strip()
         return "Unknown source"
 
-    def rag_query_with_explanation(self, query: str, chat_history: List[Tuple[str, str]]) -> Tuple[str, Dict[str, Any]]:
-        """
-        Enhanced RAG query with detailed explanation of the retrieval process.
-        """
-        # Initialize retrieval_details at the start
-        retrieval_details = {
+    @staticmethod
+    def new_retrieval_details() -> Dict[str, Any]:
+        return {
             "steps": [],
             "chunks": [],
             "scores": [],
-            "metadata_used": False
+            "metadata_used": False,
+            "answer_cache_hit": False
         }
+
+    def prepare_query(self, query: str, chat_history: List[Tuple[str, str]],
+                      retrieval_details: Dict[str, Any]) -> Tuple[Optional[str], Dict[str, Any], Optional[Dict[str, Any]]]:
+        """
+        Run everything before the LLM call: retrieval, filtering, the answer cache and query enhancement.
+        Returns:
+            tuple: A final response if no LLM call is needed (else None), the retrieval details, and
+            the inputs of the LLM call (else None).
+        """
+        # Step 1: Get the shared, already-loaded vector DB collection
+        with span("db_init", retrieval_details):
+            collection = self.vector_db_instance.get_collection()
+        if not collection:
+            retrieval_details["error"] = "Failed to initialize vector database"
+            return "Unable to access the database.", retrieval_details, None
         
-        try:
-            # Step 1: Initialize Vector DB
-            collection = self.vector_db_instance.initialize_vectorDB()
-            if not collection:
-                retrieval_details["error"] = "Failed to initialize vector database"
-                return "Unable to access the database.", retrieval_details
-            
-            # Step 1: Query Analysis
-            retrieval_details["steps"].append("Analyzing query type")
-            metadata_query = any(term in query.lower() for term in 
-                               ["metadata", "column", "field", "description", "data type", "what kind of"])
-            retrieval_details["metadata_used"] = metadata_query
-
-            # Step 2: Context from Chat History
-            retrieval_details["steps"].append("Checking chat history for context")
-            history_context = self.extract_context_from_history(chat_history)
-            
-            # Step 3: Semantic Search
-            retrieval_details["steps"].append("Performing semantic search")
-            n_results = N_CHUNKS * (2 if metadata_query else 1)
-            results = self.semantic_search(collection, query, n_results)
-            
-            if not results or not results.get('documents') or not results['documents'][0]:
-                retrieval_details["error"] = "No results found in semantic search"
-                return "No relevant information found.", retrieval_details
-
-            # Step 4: Context Filtering
-            retrieval_details["steps"].append("Filtering relevant contexts")
-            valid_contexts = []
-            valid_scores = []
-            for context, distance in zip(results['documents'][0], results['distances'][0]):
-                if distance >= CONFIDENCE_THRESHOLD:
+        # Step 1: Query Analysis
+        retrieval_details["steps"].append("Analyzing query type")
+        metadata_query = any(term in query.lower() for term in 
+                           ["metadata", "column", "field", "description", "data type", "what kind of"])
+        retrieval_details["metadata_used"] = metadata_query
+
+        # Step 2: Context from Chat History
+        retrieval_details["steps"].append("Checking chat history for context")
+        history_context = self.extract_context_from_history(chat_history)
+
+        # Aggregate and filter questions are answered from all records, not from a few chunks;
+        # questions about the columns themselves need the schema registry, so they skip the router
+        self.check_store_version(collection)
+        if self.analytics_router is not None and not metadata_query:
+            with span("analytics", retrieval_details):
+                analytics = self.analytics_router.answer(query)
+            if analytics:
+                retrieval_details["steps"].append("Answered with a structured query over all records")
+                retrieval_details["analytics"] = {
+                    key: analytics[key] for key in ("description", "sql", "params", "rows", "seconds")
+                }
+                enhanced_query = self.enhance_query(query, metadata_query, history_context)
+                return None, retrieval_details, {
+                    "enhanced_query": enhanced_query,
+                    "context": analytics["context"],
+                    "metadata_query": metadata_query,
+                    "query_embedding": None,
+                    "chunk_ids": [],
+                    "history_key": None,
+                }
+        
+        # Step 3: Semantic Search
+        retrieval_details["steps"].append("Performing semantic search")
+        results, retrieval_details["search_cache_hit"] = self.cached_search(collection, query, N_CHUNKS,
+                                                                            retrieval_details)
+        
+        if not results or not results.get('documents') or not results['documents'][0]:
+            retrieval_details["error"] = "No results found in semantic search"
+            return "No relevant information found.", retrieval_details, None
+
+        # Step 4: Context Filtering, on the similarity to the query (distances are smaller for closer chunks)
+        retrieval_details["steps"].append("Filtering relevant contexts")
+        valid_contexts = []
+        valid_scores = []
+        valid_ids = []
+        valid_sources = []
+        with span("filtering", retrieval_details):
+            space = (collection.metadata or {}).get("hnsw:space", "l2")
+            for chunk_id, context, metadata, distance in zip(results['ids'][0], results['documents'][0],
+                                                             results['metadatas'][0], results['distances'][0]):
+                similarity = self.distance_similarity(distance, space)
+                if similarity >= CONFIDENCE_THRESHOLD:
                     valid_contexts.append(context)
-                    valid_scores.append(distance)
-                    retrieval_details["chunks"].append({
-                        "source": self.extract_source_from_context(context),
-                        "score": distance
-                    })
-            
-            retrieval_details["scores"] = valid_scores
+                    valid_scores.append(similarity)
+                    valid_ids.append(chunk_id)
+                    valid_sources.append((metadata or {}).get("source"))
 
-            if not valid_contexts:
-                return "No data met the confidence threshold.", retrieval_details
+        if not valid_contexts:
+            return "No data met the confidence threshold.", retrieval_details, None
 
-            # Step 5: Context Combination
-            retrieval_details["steps"].append("Combining contexts and generating response")
-            context = self.get_context({
-                'documents': [valid_contexts], 
-                'distances': [valid_scores]
+        # Step 5: Context Packing, as many of the ranked chunks as fit the prompt token budget
+        retrieval_details["steps"].append("Packing contexts into the prompt token budget")
+        with span("context_packing", retrieval_details):
+            # Only the descriptions of the columns the question refers to, all of them for metadata questions
+            column_info = self.schema_registry.column_info(valid_sources, query, all_columns=metadata_query)
+            context, packed_ids, retrieval_details["packing"] = self.context_packer.pack(valid_ids, valid_contexts,
+                                                                                         column_info)
+        REGISTRY.inc("rag_context_tokens_saved_total", retrieval_details["packing"]["tokens_saved"],
+                     help="Context tokens saved by deduplication and header sharing")
+        scores = dict(zip(valid_ids, valid_scores))
+        contexts = dict(zip(valid_ids, valid_contexts))
+        for chunk_id in packed_ids:
+            retrieval_details["chunks"].append({
+                "source": self.extract_source_from_context(contexts[chunk_id]),
+                "score": scores[chunk_id]
             })
+        retrieval_details["scores"] = [scores[chunk_id] for chunk_id in packed_ids]
+        valid_ids = packed_ids
 
-            # Step 6: Query Enhancement
-            enhanced_query = self.enhance_query(query, metadata_query, history_context)
-            retrieval_details["steps"].append("Enhanced query with context and metadata awareness")
-
-            # Step 7: Generate Response
-            response = self.llm_processor_instance.generate_response(
-                enhanced_query, 
-                context,
-                chat_history
-            )
-
-            # Save Q&A data
-            qa_data = {
+        # Reuse the answer to a near-duplicate question over the same chunks without calling the LLM
+        query_embedding = self.embed_query(query)
+        history_key = self.answer_cache.history_key(chat_history)
+        with span("answer_cache", retrieval_details):
+            cached = self.answer_cache.lookup(query_embedding, valid_ids, history_key)
+        record_cache("answer", cached is not None, retrieval_details)
+        if cached:
+            current = retrieval_details
+            retrieval_details = dict(cached["retrieval_details"])
+            for key in ("time_to_first_token", "tokens"):
+                retrieval_details.pop(key, None)
+            retrieval_details["steps"] = retrieval_details["steps"] + ["Reused cached answer to a similar question"]
+            # Timings and cache outcomes describe this request, not the one that produced the answer
+            for key in ("search_cache_hit", "filter", "packing", "timings", "cache_hits", "queue_wait_seconds"):
+                if key in current:
+                    retrieval_details[key] = current[key]
+                else:
+                    retrieval_details.pop(key, None)
+            retrieval_details["answer_cache_hit"] = True
+            retrieval_details["cached_question"] = cached["query"]
+            retrieval_details["cache_similarity"] = cached["similarity"]
+            self.save_qa_to_json({
                 "question": query,
-                "answer": response,
+                "answer": cached["answer"],
                 "query_type": "metadata" if metadata_query else "data",
                 "retrieval_details": retrieval_details
-            }
+            })
+            return cached["answer"], retrieval_details, None
+
+        # Step 6: Query Enhancement
+        retrieval_details["steps"].append("Combining contexts and generating response")
+        with span("prompt_build", retrieval_details):
+            enhanced_query = self.enhance_query(query, metadata_query, history_context)
+        retrieval_details["steps"].append("Enhanced query with context and metadata awareness")
+
+        return None, retrieval_details, {
+            "enhanced_query": enhanced_query,
+            "context": context,
+            "metadata_query": metadata_query,
+            "query_embedding": query_embedding,
+            "chunk_ids": valid_ids,
+            "history_key": history_key,
+        }
+
+    def finish_query(self, query: str, response: str, retrieval_details: Dict[str, Any], generation: Dict[str, Any]):
+        """
+        Log the completed answer and store it in the answer cache.
+        """
+        # Save Q&A data
+        qa_data = {
+            "question": query,
+            "answer": response,
+            "query_type": "metadata" if generation["metadata_query"] else "data",
+            "retrieval_details": retrieval_details
+        }
+        with span("logging"):
             self.save_qa_to_json(qa_data)
 
-            return response, retrieval_details
+            # Analytics answers have no query embedding and are recomputed from the current data
+            if response != self.llm_processor_instance.ERROR_RESPONSE and generation["query_embedding"] is not None:
+                self.answer_cache.add(query, generation["query_embedding"], generation["chunk_ids"],
+                                      generation["history_key"], response, retrieval_details)
+
+    @staticmethod
+    def record_request(start: float, retrieval_details: Dict[str, Any]):
+        """
+        Feed the end-to-end latency, time to first token and outcome of a request into the metrics.
+        """
+        REGISTRY.observe("rag_request_seconds", time.perf_counter() - start, help="End-to-end RAG request latency")
+        if "time_to_first_token" in retrieval_details:
+            REGISTRY.observe("rag_time_to_first_token_seconds", retrieval_details["time_to_first_token"],
+                             help="Time from request start to the first LLM token")
+        if "error" in retrieval_details:
+            outcome = "error"
+        elif retrieval_details.get("busy"):
+            outcome = "busy"
+        elif retrieval_details.get("answer_cache_hit"):
+            outcome = "cached"
+        else:
+            outcome = "answered"
+        REGISTRY.inc("rag_requests_total", help="RAG requests by outcome", outcome=outcome)
+
+    def rag_query_stream(self, query: str, chat_history: List[Tuple[str, str]]) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Streaming RAG query: yields (answer so far, retrieval details) as the LLM produces tokens.
+        The complete answer is logged and cached once the stream ends.
+        """
+        start = time.perf_counter()
+        # Initialize retrieval_details at the start
+        retrieval_details = self.new_retrieval_details()
+        
+        try:
+            response, retrieval_details, generation = self.prepare_query(query, chat_history, retrieval_details)
+            if generation is None:
+                yield response, retrieval_details
+                return
+
+            # Step 7: Generate Response
+            parts = []
+            try:
+                for delta in self.llm_processor_instance.generate_response_stream(
+                    generation["enhanced_query"],
+                    generation["context"],
+                    chat_history,
+                    retrieval_details
+                ):
+                    if not parts:
+                        retrieval_details["time_to_first_token"] = time.perf_counter() - start
+                    parts.append(delta)
+                    yield "".join(parts), retrieval_details
+                response = "".join(parts)
+            except Exception as e:
+                print(f"Error generating response: {e}")
+                response = self.llm_processor_instance.ERROR_RESPONSE
+                yield response, retrieval_details
+
+            self.finish_query(query, response, retrieval_details, generation)
 
         except Exception as e:
             error_message = f"Error during RAG query process: {str(e)}"
             retrieval_details["error"] = error_message
             retrieval_details["steps"].append("Error occurred during processing")
             print(error_message)
-            return "An error occurred while processing your query.", retrieval_details
+            yield "An error occurred while processing your query.", retrieval_details
+        finally:
+            self.record_request(start, retrieval_details)
 
-    
\ No newline at end of file
+    def rag_query_with_explanation(self, query: str, chat_history: List[Tuple[str, str]]) -> Tuple[str, Dict[str, Any]]:
+        """
+        Enhanced RAG query with detailed explanation of the retrieval process.
+        """
+        response, retrieval_details = "", {}
+        for response, retrieval_details in self.rag_query_stream(query, chat_history):
+            pass
+        return response, retrieval_details
@@ -0,0 +1,91 @@
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from app.config import MMR_LAMBDA, MAX_CHUNKS_PER_SOURCE
+
+
+def _normalized(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1.0, norms)
+
+
+def mmr_select(query_embedding, embeddings, k: int, lambda_mult: float = MMR_LAMBDA,
+               sources: Optional[List[Any]] = None, max_per_source: int = 0) -> List[int]:
+    """
+    Greedy maximal marginal relevance: pick k candidates, each time the one maximising
+    lambda_mult * sim(query, c) - (1 - lambda_mult) * max sim(c, already picked), by cosine similarity.
+    The candidate-candidate similarities are one matrix product, and every step updates the
+    redundancy of all candidates at once. With max_per_source, a source that has been picked
+    max_per_source times is masked out, so fewer than k may be returned.
+    Returns:
+        list: Positions of the picked candidates, in the order they were picked.
+    """
+    vectors = _normalized(np.asarray(embeddings, dtype=np.float32))
+    n_candidates = len(vectors)
+    if n_candidates == 0 or k <= 0:
+        return []
+    relevance = vectors @ _normalized(np.asarray(query_embedding, dtype=np.float32))
+    similarity = vectors @ vectors.T
+
+    capped = max_per_source > 0 and sources is not None
+    if capped:
+        _, source_codes = np.unique([str(source) for source in sources], return_inverse=True)
+        source_counts = np.zeros(source_codes.max() + 1, dtype=np.int64)
+
+    available = np.ones(n_candidates, dtype=bool)
+    redundancy = np.zeros(n_candidates, dtype=np.float32)
+    selected = []
+    while len(selected) < k and available.any():
+        scores = lambda_mult * relevance - (1.0 - lambda_mult) * redundancy
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        redundancy = similarity[best] if len(selected) == 1 else np.maximum(redundancy, similarity[best])
+        if capped:
+            source_counts[source_codes[best]] += 1
+            if source_counts[source_codes[best]] >= max_per_source:
+                available &= source_codes != source_codes[best]
+    return selected
+
+
+class MMRReranker:
+    """
+    Reranks an over-fetched set of search candidates with maximal marginal relevance, so that
+    near-identical chunks (e.g. neighbouring chunks of the same file) do not take several of the
+    few context slots. The candidates need their embeddings, which the search includes when a
+    reranker is configured.
+    """
+
+    def __init__(self, lambda_mult: float = MMR_LAMBDA, max_per_source: int = MAX_CHUNKS_PER_SOURCE):
+        self.lambda_mult = lambda_mult
+        self.max_per_source = max_per_source
+
+    def rerank(self, query_embedding, results: dict, n_results: int) -> Tuple[dict, Dict[str, Any]]:
+        """
+        Keep n_results of the candidates of a single-query result in the collection.query format.
+        The embeddings are dropped from the returned results, which are cached.
+        Returns:
+            tuple: The reranked results and their statistics (candidates, kept chunks, distinct sources,
+            and how many of the kept chunks were not in the top n_results of the search).
+        """
+        ids = results["ids"][0]
+        embeddings = results.get("embeddings")
+        embeddings = embeddings[0] if embeddings is not None and len(embeddings) else None
+        metadatas = results["metadatas"][0] if results.get("metadatas") else [None] * len(ids)
+        sources = [(metadata or {}).get("source") for metadata in metadatas]
+        if embeddings is None or len(embeddings) != len(ids):
+            # Nothing to compare the candidates with, keep the search order
+            picked = list(range(min(n_results, len(ids))))
+        else:
+            picked = mmr_select(query_embedding, embeddings, n_results, self.lambda_mult, sources,
+                                self.max_per_source)
+
+        reranked = {field: [[results[field][0][i] for i in picked]]
+                    for field in ("ids", "documents", "metadatas", "distances") if results.get(field)}
+        stats = {
+            "candidates": len(ids),
+            "kept": len(picked),
+            "sources": len(set(sources[i] for i in picked)),
+            "promoted": len([i for i in picked if i >= n_results]),
+        }
+        return reranked, stats
@@ -0,0 +1,142 @@
+import os
+import re
+import json
+import math
+from typing import Dict, List
+from app.config import SCHEMA_MAX_COLUMNS
+
+# Question words that say nothing about which column is meant
+_STOP_WORDS = {
+    "a", "an", "and", "are", "at", "by", "for", "from", "how", "in", "is", "it", "me", "of", "on",
+    "or", "show", "the", "to", "was", "what", "when", "where", "which", "who", "with", "record", "records",
+}
+
+
+def _terms(text: str) -> set:
+    """
+    Lower-case word terms of a text, with a trailing plural "s" removed.
+    """
+    terms = set()
+    for word in re.findall(r"[a-z0-9]+", text.lower()):
+        if len(word) > 3 and word.endswith("s"):
+            word = word[:-1]
+        if word not in _STOP_WORDS:
+            terms.add(word)
+    return terms
+
+
+def _text(value) -> str:
+    """
+    Metadata cell as text; empty for missing values (NaN in pandas-read metadata files).
+    """
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return ""
+    return str(value).strip()
+
+
+class SchemaRegistry:
+    """
+    Column metadata (full name, type, description, notes and values) of every ingested file,
+    stored once per source file in a small JSON side store instead of in the text of every chunk.
+
+    Chunks only name their source. At query time `column_info` selects the descriptions of the
+    columns a question refers to, for the source files that made it into the context.
+    """
+
+    VERSION = 1
+
+    def __init__(self, registry_path: str):
+        self.registry_path = registry_path
+        self.sources: Dict[str, List[dict]] = {}
+        self.load()
+
+    def load(self):
+        """
+        Loads the registry from disk, starting empty if it does not exist yet.
+        """
+        self.sources = {}
+        if not self.registry_path or not os.path.exists(self.registry_path):
+            return
+        try:
+            with open(self.registry_path, 'r') as file:
+                data = json.load(file)
+            if data.get("version") != self.VERSION:
+                print(f"Ignoring schema registry with unsupported version {data.get('version')}")
+            else:
+                self.sources = data.get("sources", {})
+        except json.JSONDecodeError as e:
+            print(f"Error reading schema registry, column descriptions are not available: {e}")
+
+    def save(self):
+        """
+        Writes the registry atomically.
+        """
+        tmp_path = f"{self.registry_path}.tmp"
+        with open(tmp_path, 'w') as file:
+            json.dump({"version": self.VERSION, "sources": self.sources}, file)
+        os.replace(tmp_path, self.registry_path)
+
+    @staticmethod
+    def build_columns(headers: list, column_mapping: dict, metadata_dict: Dict) -> List[dict]:
+        """
+        The registry entry of a file: one record per CSV column, in file order.
+        Columns without metadata keep only their name.
+        """
+        columns = []
+        for csv_col in headers:
+            column = {"name": str(csv_col)}
+            if csv_col in column_mapping:
+                metadata = metadata_dict[column_mapping[csv_col]]
+                for field in ("full_name", "data_type", "description", "notes", "values"):
+                    value = _text(metadata.get(field))
+                    if value:
+                        column[field] = value
+            columns.append(column)
+        return columns
+
+    def register(self, source: str, columns: List[dict]):
+        self.sources[source] = columns
+
+    def remove(self, source: str):
+        self.sources.pop(source, None)
+
+    def relevant_columns(self, source: str, query: str, all_columns: bool = False,
+                         limit: int = SCHEMA_MAX_COLUMNS) -> List[dict]:
+        """
+        Columns of source whose name or full name shares terms with the query, best match first.
+        With all_columns (questions about the metadata itself) every column is returned.
+        """
+        columns = self.sources.get(source, [])
+        if all_columns:
+            return columns
+        query_terms = _terms(query)
+        scored = []
+        for position, column in enumerate(columns):
+            score = len(query_terms & _terms(f"{column['name']} {column.get('full_name', '')}"))
+            if score:
+                scored.append((-score, position, column))
+        return [column for _, _, column in sorted(scored, key=lambda item: item[:2])[:limit]]
+
+    @staticmethod
+    def format_column(column: dict) -> str:
+        label = column["name"]
+        details = [detail for detail in (column.get("full_name"), column.get("data_type")) if detail]
+        if details:
+            label += f" ({', '.join(details)})"
+        line = f"- {label}: {column.get('description') or 'No description available'}"
+        if column.get("values"):
+            line += f" Values: {column['values']}."
+        if column.get("notes"):
+            line += f" Notes: {column['notes']}"
+        return line
+
+    def column_info(self, sources: List[str], query: str, all_columns: bool = False) -> Dict[str, str]:
+        """
+        Column Information block of each source file that has relevant columns, by source.
+        """
+        info = {}
+        for source in dict.fromkeys(sources):
+            columns = self.relevant_columns(source, query, all_columns)
+            if columns:
+                info[source] = "Column Information:\n" + "\n".join(self.format_column(column) for column in columns)
+        return info
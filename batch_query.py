@@ -0,0 +1,179 @@
+"""
+Answer a file of questions without the UI, e.g. to regression-test the answers after a change.
+
+    python batch_query.py questions.jsonl --output answers.jsonl --concurrency 8 --requests-per-minute 30
+
+Every input line is a JSON object with a "question" (or "query") and an optional "id"; other fields
+are copied to the output. Retrieval is batched: the questions of a batch are embedded in one call
+and searched with one vector query per distinct metadata filter. The answers are then generated
+concurrently, with no more than --requests-per-minute LLM calls started per minute (answers from
+the answer cache do not count), and each result is written as one JSON line as soon as it is
+complete.
+"""
+import sys
+import json
+import time
+import asyncio
+import argparse
+from typing import Any, Dict, Iterator, List, Tuple
+from app.rag import RAGProcessor
+from app.async_rag import AsyncRAGProcessor
+from app.config import N_CHUNKS, BATCH_QUERY_SIZE, LLM_REQUESTS_PER_MINUTE, MAX_CONCURRENT_REQUESTS
+import app.clients as client
+from dotenv import load_dotenv
+# Load environment variables
+load_dotenv()
+
+
+class RateLimiter:
+    """
+    Spaces out requests so that at most per_minute of them start in any minute.
+    """
+
+    def __init__(self, per_minute: float):
+        self.interval = 60.0 / per_minute if per_minute > 0 else 0.0
+        self.next_slot = 0.0
+
+    async def wait(self) -> float:
+        """
+        Wait for the next free slot and return the seconds waited.
+        """
+        if not self.interval:
+            return 0.0
+        now = time.monotonic()
+        delay = max(0.0, self.next_slot - now)
+        self.next_slot = max(now, self.next_slot) + self.interval
+        if delay:
+            await asyncio.sleep(delay)
+        return delay
+
+
+def read_questions(path: str) -> List[Tuple[str, str, Dict[str, Any]]]:
+    """
+    Read (id, question, input record) from a JSON Lines file.
+    """
+    questions = []
+    with open(path, 'r', encoding='utf-8') as file:
+        for line_number, line in enumerate(file, start=1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            question = record.get("question") or record.get("query")
+            if not question:
+                raise ValueError(f"{path}:{line_number}: no 'question' field")
+            questions.append((str(record.get("id", line_number)), question, record))
+    return questions
+
+
+def batches(items: list, size: int) -> Iterator[list]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def result_record(question_id: str, question: str, record: Dict[str, Any], response: str,
+                  retrieval_details: Dict[str, Any], seconds: float, rate_limit_wait: float,
+                  batch: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    The output line of one question: the answer, where it came from and how long each stage took.
+    """
+    result = {key: value for key, value in record.items() if key not in ("question", "query")}
+    result.update({
+        "id": question_id,
+        "question": question,
+        "answer": response,
+        "seconds": seconds,
+        "rate_limit_wait_seconds": rate_limit_wait,
+        "time_to_first_token": retrieval_details.get("time_to_first_token"),
+        "timings": retrieval_details.get("timings", {}),
+        "tokens": retrieval_details.get("tokens"),
+        "sources": sorted(set(chunk["source"] for chunk in retrieval_details.get("chunks", []))),
+        "answer_cache_hit": retrieval_details.get("answer_cache_hit", False),
+        "analytics_sql": retrieval_details.get("analytics", {}).get("sql"),
+        "retrieval_batch": batch,
+    })
+    if "error" in retrieval_details:
+        result["error"] = retrieval_details["error"]
+    return result
+
+
+async def run_batch_queries(questions: List[Tuple[str, str, Dict[str, Any]]], output, batch_size: int,
+                            concurrency: int, requests_per_minute: float) -> Dict[str, Any]:
+    """
+    Answer the questions batch by batch and write one JSON line per answer to output.
+    """
+    rag = RAGProcessor(client.ClientManager())
+    # Every question of a batch is admitted, at most `concurrency` of them run at once
+    async_rag = AsyncRAGProcessor(rag, max_concurrency=concurrency, max_queue_depth=batch_size)
+    limiter = RateLimiter(requests_per_minute)
+    loop = asyncio.get_running_loop()
+    latencies, errors = [], 0
+
+    async def answer(question_id, question, record, batch):
+        nonlocal errors
+        rate_limit_wait = 0.0
+
+        async def take_rate_limit_slot():
+            # Only questions that reach the LLM count towards the rate limit, not answer cache hits
+            nonlocal rate_limit_wait
+            rate_limit_wait = await limiter.wait()
+
+        start = time.perf_counter()
+        response, retrieval_details = await async_rag.rag_query_with_explanation(question, [],
+                                                                               take_rate_limit_slot)
+        seconds = time.perf_counter() - start - rate_limit_wait
+        latencies.append(seconds)
+        errors += "error" in retrieval_details
+        result = result_record(question_id, question, record, response, retrieval_details, seconds,
+                               rate_limit_wait, batch)
+        output.write(json.dumps(result, default=str) + "\n")
+        output.flush()
+
+    start = time.perf_counter()
+    try:
+        collection = await loop.run_in_executor(async_rag.executor, rag.vector_db_instance.get_collection)
+        for number, batch in enumerate(batches(questions, batch_size)):
+            batch_start = time.perf_counter()
+            cached = await loop.run_in_executor(async_rag.executor, rag.batch_search, collection,
+                                                [question for _, question, _ in batch], N_CHUNKS)
+            batch_info = {"number": number, "size": len(batch), "searches": cached,
+                          "retrieval_seconds": time.perf_counter() - batch_start}
+            await asyncio.gather(*[answer(question_id, question, record, batch_info)
+                                   for question_id, question, record in batch])
+    finally:
+        async_rag.executor.shutdown()
+        rag.qa_logger.close()
+
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "questions": len(latencies),
+        "errors": errors,
+        "seconds": elapsed,
+        "questions_per_second": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_seconds": latencies[len(latencies) // 2] if latencies else None,
+        "max_seconds": latencies[-1] if latencies else None,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="JSON Lines file of questions")
+    parser.add_argument("--output", help="JSON Lines file the answers are written to (default: stdout)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_QUERY_SIZE,
+                        help=f"questions retrieved together (default: {BATCH_QUERY_SIZE})")
+    parser.add_argument("--concurrency", type=int, default=MAX_CONCURRENT_REQUESTS,
+                        help=f"questions answered at the same time (default: {MAX_CONCURRENT_REQUESTS})")
+    parser.add_argument("--requests-per-minute", type=float, default=LLM_REQUESTS_PER_MINUTE,
+                        help=f"maximum questions started per minute, 0 for no limit (default: {LLM_REQUESTS_PER_MINUTE})")
+    args = parser.parse_args()
+
+    questions = read_questions(args.input)
+    output = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    try:
+        summary = asyncio.run(run_batch_queries(questions, output, args.batch_size, args.concurrency,
+                                                args.requests_per_minute))
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    print(f"Answered {summary['questions']} questions ({summary['errors']} errors) in {summary['seconds']:.1f}s, "
+          f"{summary['questions_per_second']:.2f} questions/sec", file=sys.stderr)
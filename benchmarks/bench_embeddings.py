@@ -0,0 +1,134 @@
+"""
+Embedding throughput and recall drift of the CPU embedding backends (app.embeddings.EMBED_BACKENDS).
+
+    python -m benchmarks.bench_embeddings --backends torch,onnx,int8 --batch-sizes 32,256 --threads 4
+
+Every backend embeds the same record-aligned chunks of synthetic ACRIS data. Load time and
+embeddings/sec are reported per batch size. Drift is measured against the torch fp32 vectors of the
+current setup: the cosine similarity between the two embeddings of each chunk, and the overlap of
+the top-k chunks retrieved for the same questions (recall@k of the backend w.r.t. torch).
+"""
+import json
+import time
+import argparse
+import numpy as np
+from app.config import EMBED_THREADS
+from app.preProcessing import DocumentProcessor
+from benchmarks.synthetic import acris_master_frame, acris_legals_frame, metadata_frame, sample_queries
+
+
+def chunk_texts(n_rows: int, seed: int = 0) -> list:
+    """
+    Record-aligned chunk texts with schema headers, as ingestion builds them, for both ACRIS files.
+    """
+    processor = DocumentProcessor()
+    chunks = []
+    for file_name, df in [("acris_real_property_master.csv", acris_master_frame(n_rows, seed)),
+                          ("acris_real_property_legals.csv", acris_legals_frame(n_rows, seed))]:
+        df = df.astype(str)
+        metadata_df = metadata_frame(df)
+        metadata_dict = dict(zip(metadata_df["column_name"], metadata_df.drop(columns="column_name").to_dict("records")))
+        column_mapping = processor.create_column_mapping(df.columns.tolist(), list(metadata_dict.keys()))
+        rows = processor.format_rows(df, column_mapping, metadata_dict)
+        header = processor.build_schema_header(file_name)
+        chunks.extend(text for text, _, _ in processor.chunk_records(rows, header))
+    return chunks
+
+
+def normalized(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def top_k(query_vectors: np.ndarray, chunk_vectors: np.ndarray, k: int) -> np.ndarray:
+    """
+    Indices of the k nearest chunks of every query by cosine similarity.
+    """
+    scores = normalized(query_vectors) @ normalized(chunk_vectors).T
+    return np.argsort(-scores, axis=1)[:, :k]
+
+
+def bench_backend(model_name: str, backend: str, threads: int, batch_sizes: list, texts: list,
+                  queries: list) -> dict:
+    from app.embeddings import SentenceTransformerEmbedder
+
+    start = time.perf_counter()
+    embedder = SentenceTransformerEmbedder(model_name=model_name, backend=backend, threads=threads)
+    load_seconds = time.perf_counter() - start
+    embedder.embed(texts[:8])
+
+    throughput = {}
+    vectors = None
+    for batch_size in batch_sizes:
+        start = time.perf_counter()
+        vectors = embedder.embed(texts, batch_size=batch_size)
+        throughput[batch_size] = len(texts) / (time.perf_counter() - start)
+    return {
+        "backend": backend,
+        "signature": embedder.signature,
+        "load_seconds": load_seconds,
+        "embeddings_per_second": throughput,
+        "chunk_vectors": vectors,
+        "query_vectors": embedder.embed(queries),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="all-MiniLM-L6-v2", help="SentenceTransformer model name or path")
+    parser.add_argument("--backends", default="torch,onnx,int8", help="comma-separated backends, torch is always run")
+    parser.add_argument("--batch-sizes", default="32,128,256", help="comma-separated embedding batch sizes")
+    parser.add_argument("--threads", type=int, default=EMBED_THREADS, help="CPU threads, 0 for the library default")
+    parser.add_argument("--rows", type=int, default=2000, help="rows per synthetic CSV file")
+    parser.add_argument("--queries", type=int, default=100, help="questions used for the top-k overlap")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="optional JSON file for the results")
+    args = parser.parse_args()
+
+    backends = ["torch"] + [b.strip() for b in args.backends.split(",") if b.strip() and b.strip() != "torch"]
+    batch_sizes = [int(size) for size in args.batch_sizes.split(",")]
+    texts = chunk_texts(args.rows, args.seed)
+    queries = sample_queries(args.queries, args.seed)
+    print(f"{len(texts)} chunks, {len(queries)} questions, threads={args.threads or 'default'}")
+
+    runs = []
+    for backend in backends:
+        try:
+            runs.append(bench_backend(args.model, backend, args.threads, batch_sizes, texts, queries))
+        except Exception as e:
+            print(f"{backend}: skipped ({e})")
+    if not runs or runs[0]["backend"] != "torch":
+        raise RuntimeError("The torch fp32 baseline could not be run")
+
+    baseline = runs[0]
+    baseline_top = top_k(baseline["query_vectors"], baseline["chunk_vectors"], args.k)
+    results = []
+    print(f"{'backend':<8}{'signature':<32}{'load s':>8}" + "".join(f"{f'emb/s@{b}':>12}" for b in batch_sizes)
+          + f"{'cosine':>9}{f'recall@{args.k}':>11}")
+    for run in runs:
+        cosine = np.sum(normalized(run["chunk_vectors"]) * normalized(baseline["chunk_vectors"]), axis=1)
+        retrieved = top_k(run["query_vectors"], run["chunk_vectors"], args.k)
+        overlap = np.mean([len(set(a) & set(b)) / args.k for a, b in zip(retrieved, baseline_top)])
+        result = {
+            "backend": run["backend"],
+            "signature": run["signature"],
+            "load_seconds": run["load_seconds"],
+            "embeddings_per_second": run["embeddings_per_second"],
+            "mean_cosine_to_torch": float(cosine.mean()),
+            "min_cosine_to_torch": float(cosine.min()),
+            f"recall@{args.k}_vs_torch": float(overlap),
+        }
+        results.append(result)
+        print(f"{run['backend']:<8}{run['signature']:<32}{run['load_seconds']:>8.2f}"
+              + "".join(f"{run['embeddings_per_second'][b]:>12.1f}" for b in batch_sizes)
+              + f"{cosine.mean():>9.4f}{overlap:>11.3f}")
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump({"args": vars(args), "chunks": len(texts), "results": results}, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
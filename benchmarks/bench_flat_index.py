@@ -0,0 +1,168 @@
+"""
+Startup time, memory and query latency of the flat index (RETRIEVAL_BACKEND=flat) against ChromaDB.
+
+    python -m benchmarks.bench_flat_index --rows 20000 --queries 200 --dtypes float32,float16 --threads 1,4
+
+The synthetic ACRIS data is ingested and exported to a flat index per --dtypes once. The questions are embedded
+up front, so that the measurements only cover the index. Then each backend runs in a fresh process,
+which reports:
+    import_seconds       importing chromadb, or app.flat_index
+    open_seconds         opening the PersistentClient and collection, or memory-mapping the index
+    first_query_seconds  the first query, which loads the HNSW index or pages in the matrix
+    latency              percentiles of the following queries, with the question's metadata filter
+    rss_mb               resident memory after the queries; rss_anon_mb is private to the process,
+                         and rss_file_mb is file-backed and shared with other processes mapping the index
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+import numpy as np
+from benchmarks.load_test import PROJECT_DIR
+from benchmarks.run import configure_environment, percentiles
+from benchmarks.synthetic import write_dataset, sample_queries
+
+
+def memory_mb() -> dict:
+    """
+    VmRSS, RssAnon and RssFile of this process from /proc (Linux), in MB.
+    """
+    memory = {}
+    try:
+        with open("/proc/self/status", 'r') as file:
+            for line in file:
+                name, _, value = line.partition(":")
+                if name in ("VmRSS", "RssAnon", "RssFile"):
+                    memory[name] = int(value.split()[0]) / 1024
+    except OSError:
+        pass
+    return {"rss_mb": memory.get("VmRSS"), "rss_anon_mb": memory.get("RssAnon"), "rss_file_mb": memory.get("RssFile")}
+
+
+def run_child(backend: str, threads: int, dtype: str, workdir: str, n_results: int) -> dict:
+    """
+    Measure one backend in this process; runs in a fresh interpreter started by main().
+    """
+    from app.chunk_filters import extract_where
+
+    with open(os.path.join(workdir, "queries.json"), 'r') as file:
+        queries = json.load(file)
+    query_embeddings = np.load(os.path.join(workdir, "query_embeddings.npy"))
+    wheres = [extract_where(query) for query in queries]
+
+    start = time.perf_counter()
+    if backend == "chroma":
+        import chromadb
+    else:
+        from app.flat_index import FlatIndex
+    import_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    if backend == "chroma":
+        client = chromadb.PersistentClient(path=os.environ["VECTOR_STORE"])
+        collection = client.get_collection("documents_collection", embedding_function=None)
+    else:
+        collection = FlatIndex.load(f"{os.environ['FLAT_INDEX_PATH']}_{dtype}", threads=threads)
+    open_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    collection.query(query_embeddings=[query_embeddings[0].tolist()], n_results=n_results)
+    first_query_seconds = time.perf_counter() - start
+
+    latencies = []
+    for embedding, where in zip(query_embeddings, wheres):
+        start = time.perf_counter()
+        results = collection.query(query_embeddings=[embedding.tolist()], n_results=n_results, where=where)
+        if where is not None and not results["ids"][0]:
+            collection.query(query_embeddings=[embedding.tolist()], n_results=n_results)
+        latencies.append(time.perf_counter() - start)
+
+    result = {
+        "backend": backend if backend == "chroma" else f"{dtype} x{threads}",
+        "chunks": collection.count(),
+        "import_seconds": import_seconds,
+        "open_seconds": open_seconds,
+        "first_query_seconds": first_query_seconds,
+        "latency": percentiles(latencies),
+    }
+    result.update(memory_mb())
+    return result
+
+
+def prepare(workdir: str, n_rows: int, n_queries: int, dtypes: list, seed: int):
+    """
+    Ingest the synthetic data, export a flat index per dtype and embed the questions.
+    """
+    if not os.path.exists(os.environ["MANIFEST_PATH"]):
+        write_dataset(os.environ["DATA_DIR"], os.environ["METADATA_DIR"], n_rows, seed)
+    from setupDB import setup_database
+    if setup_database() is None:
+        raise RuntimeError("Ingestion failed, see the output above")
+
+    import app.clients as client
+    from app.initialiseDB import VectorDBSetup
+    from app.flat_index import FlatIndex
+
+    vector_db_instance = VectorDBSetup(client.ClientManager(), retrieval_backend="chroma")
+    for dtype in dtypes:
+        FlatIndex.export(vector_db_instance.get_collection(), f"{os.environ['FLAT_INDEX_PATH']}_{dtype}", dtype)
+    queries = sample_queries(n_queries, seed)
+    embedder = vector_db_instance.get_embedder()
+    np.save(os.path.join(workdir, "query_embeddings.npy"), np.asarray(embedder.embed(queries), dtype=np.float32))
+    with open(os.path.join(workdir, "queries.json"), 'w') as file:
+        json.dump(queries, file)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=20_000, help="rows per synthetic CSV file")
+    parser.add_argument("--queries", type=int, default=200, help="questions searched per backend")
+    parser.add_argument("--n-results", type=int, default=20, help="chunks retrieved per question")
+    parser.add_argument("--dtypes", default="float32,float16", help="comma-separated FLAT_INDEX_DTYPE values to run")
+    parser.add_argument("--threads", default="1", help="comma-separated FLAT_INDEX_THREADS values to run")
+    parser.add_argument("--workdir", help="directory for the synthetic data and indexes (default: a temp dir)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="optional JSON file for the results")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="nycdb_flat_")
+    configure_environment(workdir)
+    if args.child:
+        backend, threads, dtype = args.child.split(":")
+        print(json.dumps(run_child(backend, int(threads), dtype, workdir, args.n_results)))
+        return
+
+    dtypes = [dtype.strip() for dtype in args.dtypes.split(",") if dtype.strip()]
+    prepare(workdir, args.rows, args.queries, dtypes, args.seed)
+    runs = [("chroma", 1, "")] + [("flat", int(threads), dtype) for dtype in dtypes
+                                  for threads in args.threads.split(",") if threads.strip()]
+    results = []
+    for backend, threads, dtype in runs:
+        process = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_flat_index", "--workdir", workdir,
+             "--n-results", str(args.n_results), "--child", f"{backend}:{threads}:{dtype}"],
+            cwd=PROJECT_DIR, env=dict(os.environ), capture_output=True, text=True)
+        if process.returncode != 0:
+            raise RuntimeError(f"{backend} run failed:\n{process.stderr[-2000:]}")
+        results.append(json.loads(process.stdout.strip().splitlines()[-1]))
+
+    print(f"{'backend':<12}{'chunks':>8}{'import s':>10}{'open s':>9}{'first q s':>11}{'p50 ms':>9}{'p99 ms':>9}"
+          f"{'RSS MB':>9}{'anon MB':>9}{'file MB':>9}")
+    for result in results:
+        latency = result["latency"]
+        print(f"{result['backend']:<12}{result['chunks']:>8}{result['import_seconds']:>10.2f}"
+              f"{result['open_seconds']:>9.3f}{result['first_query_seconds']:>11.3f}"
+              f"{latency.get('p50', 0) * 1000:>9.2f}{latency.get('p99', 0) * 1000:>9.2f}"
+              f"{result['rss_mb'] or 0:>9.0f}{result['rss_anon_mb'] or 0:>9.0f}{result['rss_file_mb'] or 0:>9.0f}")
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump({"args": vars(args), "workdir": workdir, "results": results}, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
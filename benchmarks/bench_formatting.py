@@ -0,0 +1,64 @@
+"""
+Micro-benchmark for DocumentProcessor.format_rows against the previous iterrows formatter.
+
+    python -m benchmarks.bench_formatting --rows 1000000 --legacy-rows 100000
+"""
+import argparse
+import time
+from app.preProcessing import DocumentProcessor
+from benchmarks.synthetic import acris_master_frame, metadata_frame
+
+
+def format_rows_iterrows(df, column_mapping, metadata_dict):
+    """
+    The row-by-row formatter that format_rows replaced, kept here as the baseline.
+    """
+    headers = df.columns.tolist()
+    data_rows = []
+    for _, row in df.iterrows():
+        row_items = []
+        for header in headers:
+            if header in column_mapping:
+                metadata_col = column_mapping[header]
+                row_items.append(
+                    f"{header} ({metadata_dict[metadata_col]['full_name']}): {row[header]}"
+                )
+            else:
+                row_items.append(f"{header}: {row[header]}")
+        data_rows.append(", ".join(row_items))
+    return data_rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000, help="rows formatted by the vectorized formatter")
+    parser.add_argument("--legacy-rows", type=int, default=100_000,
+                        help="rows formatted by the iterrows baseline (it is too slow for the full frame)")
+    args = parser.parse_args()
+
+    processor = DocumentProcessor()
+    df = acris_master_frame(args.rows)
+    metadata_df = metadata_frame(df)
+    metadata_dict = dict(zip(metadata_df["column_name"], metadata_df.drop(columns="column_name").to_dict("records")))
+    column_mapping = processor.create_column_mapping(df.columns.tolist(), list(metadata_dict.keys()))
+
+    legacy_df = df.head(args.legacy_rows)
+    start = time.perf_counter()
+    expected = format_rows_iterrows(legacy_df, column_mapping, metadata_dict)
+    legacy_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    rows = processor.format_rows(df, column_mapping, metadata_dict)
+    vectorized_seconds = time.perf_counter() - start
+
+    assert rows[:len(expected)] == expected, "vectorized output differs from the iterrows output"
+
+    legacy_rate = len(legacy_df) / legacy_seconds
+    vectorized_rate = len(df) / vectorized_seconds
+    print(f"iterrows:   {len(legacy_df):>9} rows in {legacy_seconds:7.2f}s  {legacy_rate:>12,.0f} rows/sec")
+    print(f"vectorized: {len(df):>9} rows in {vectorized_seconds:7.2f}s  {vectorized_rate:>12,.0f} rows/sec")
+    print(f"speedup:    {vectorized_rate / legacy_rate:.1f}x (output identical on the first {len(expected)} rows)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Recall@k of vector-only and hybrid (vector + BM25, reciprocal-rank fusion) retrieval on
+document id, BBL and address questions over synthetic ACRIS data.
+
+    python -m benchmarks.bench_recall --rows 5000 --queries 100 --k 1,2,5,10
+
+A query counts as a hit at k when one of the top k chunks contains a record it asks about.
+"""
+import os
+import json
+import argparse
+import tempfile
+import numpy as np
+from benchmarks.run import configure_environment
+from benchmarks.synthetic import write_dataset
+
+MASTER = "acris_real_property_master.csv"
+LEGALS = "acris_real_property_legals.csv"
+
+
+def build_queries(data_dir: str, n_queries: int, seed: int) -> list:
+    """
+    (kind, question, source file, matching row numbers) for id, BBL and address questions.
+    """
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    master = pd.read_csv(os.path.join(data_dir, MASTER), dtype=str)
+    legals = pd.read_csv(os.path.join(data_dir, LEGALS), dtype=str)
+    queries = []
+    for i in range(n_queries):
+        kind = ("document_id", "bbl", "address")[i % 3]
+        if kind == "document_id":
+            row = master.iloc[rng.integers(len(master))]
+            rows = np.flatnonzero(master["DOCUMENT ID"] == row["DOCUMENT ID"])
+            question = f"Show me the record with document ID {row['DOCUMENT ID']}"
+            queries.append((kind, question, MASTER, rows.tolist()))
+            continue
+        row = legals.iloc[rng.integers(len(legals))]
+        if kind == "bbl":
+            match = ((legals["BOROUGH"] == row["BOROUGH"]) & (legals["BLOCK"] == row["BLOCK"])
+                     & (legals["LOT"] == row["LOT"]))
+            question = f"Which documents cover borough {row['BOROUGH']} block {row['BLOCK']} lot {row['LOT']}?"
+        else:
+            match = (legals["STREET NUMBER"] == row["STREET NUMBER"]) & (legals["STREET NAME"] == row["STREET NAME"])
+            question = f"What is the most recent transaction on {row['STREET NUMBER']} {row['STREET NAME']}?"
+        queries.append((kind, question, LEGALS, np.flatnonzero(match).tolist()))
+    return queries
+
+
+def relevant_chunks(collection, source: str, rows: list) -> set:
+    """
+    Ids of the chunks of `source` whose row_start..row_end range contains one of the rows.
+    """
+    page = collection.get(where={"source": source}, include=["metadatas"])
+    return {
+        chunk_id for chunk_id, metadata in zip(page["ids"], page["metadatas"])
+        if any(metadata["row_start"] <= row <= metadata["row_end"] for row in rows)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=5000, help="rows per synthetic CSV file")
+    parser.add_argument("--queries", type=int, default=90, help="number of questions, split over the three kinds")
+    parser.add_argument("--k", default="1,2,5,10", help="comma-separated cut-offs")
+    parser.add_argument("--workdir", help="directory for the synthetic data and vector store (default: a temp dir)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="optional JSON file for the results")
+    args = parser.parse_args()
+    cutoffs = [int(k) for k in args.k.split(",")]
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="nycdb_recall_")
+    configure_environment(workdir)
+    if not os.path.exists(os.environ["MANIFEST_PATH"]):
+        write_dataset(os.environ["DATA_DIR"], os.environ["METADATA_DIR"], args.rows, args.seed)
+    from setupDB import setup_database
+    import app.clients as client
+    from app.rag import RAGProcessor
+    from app.lexical import BM25Index
+
+    setup_database()
+    rag = RAGProcessor(client.ClientManager())
+    collection = rag.vector_db_instance.get_collection()
+    rag.check_store_version(collection)
+    lexical_index = BM25Index.load(rag.lexical_index_path)
+    if lexical_index is None:
+        raise RuntimeError("No lexical index was built, is HYBRID_SEARCH enabled?")
+
+    queries = build_queries(os.environ["DATA_DIR"], args.queries, args.seed)
+    relevant = [relevant_chunks(collection, source, rows) for _, _, source, rows in queries]
+
+    results = {}
+    for mode, index in (("vector", None), ("hybrid", lexical_index)):
+        rag.lexical_index = index
+        rag.results_cache.clear()
+        hits = {kind: np.zeros(len(cutoffs)) for kind, _, _, _ in queries}
+        counts = {kind: 0 for kind, _, _, _ in queries}
+        for (kind, question, _, _), relevant_ids in zip(queries, relevant):
+            retrieved = rag.cached_search(collection, question, max(cutoffs))[0]["ids"][0]
+            counts[kind] += 1
+            for j, k in enumerate(cutoffs):
+                hits[kind][j] += bool(relevant_ids.intersection(retrieved[:k]))
+        results[mode] = {
+            kind: {f"recall@{k}": float(hits[kind][j] / counts[kind]) for j, k in enumerate(cutoffs)}
+            for kind in counts
+        }
+
+    header = "".join(f"{f'recall@{k}':>11}" for k in cutoffs)
+    print(f"{'mode':<8}{'question':<13}{header}")
+    for mode, by_kind in results.items():
+        for kind, recalls in by_kind.items():
+            print(f"{mode:<8}{kind:<13}" + "".join(f"{value:>11.2f}" for value in recalls.values()))
+    rag.qa_logger.close()
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump({"args": vars(args), "recall": results}, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+Diversity of the retrieved chunks with and without MMR reranking (app/rerank.py) at the same k.
+
+    python -m benchmarks.bench_rerank --rows 20000 --files 4 --queries 200 --k 2,5,10 --candidates 30
+
+The synthetic ACRIS master and legals data is split into --files extracts each, like the separate
+files of an NYCDB download, and ingested once. Each question is searched once for --candidates chunks
+with their embeddings (with its metadata filter, like the RAG pipeline), and k of them are kept by:
+    search      the top k of the vector search, as without a reranker
+    mmr         maximal marginal relevance with --lambda
+    mmr_cap     the same with at most --max-per-source chunks per source file
+For each, the table reports the chunks kept (the cap may keep fewer than k), distinct source files
+per k, the mean cosine similarity between kept chunks (redundancy), the mean cosine similarity to
+the question (relevance) and the reranking time.
+"""
+import os
+import json
+import time
+import argparse
+import tempfile
+import numpy as np
+from app.config import RERANK_CANDIDATES, MMR_LAMBDA
+from benchmarks.run import configure_environment, percentiles
+from benchmarks.synthetic import acris_master_frame, acris_legals_frame, metadata_frame, sample_queries
+
+
+def normalized(vectors) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def diversity(query_embedding, embeddings, sources: list, k: int) -> dict:
+    """
+    Distinct sources per k, mean pairwise similarity and mean similarity to the question of kept chunks.
+    """
+    vectors = normalized(embeddings)
+    similarity = vectors @ vectors.T
+    n = len(vectors)
+    pairwise = float(similarity[np.triu_indices(n, 1)].mean()) if n > 1 else 0.0
+    return {
+        "kept": n,
+        "unique_source_share": len(set(sources)) / k,
+        "pairwise_similarity": pairwise,
+        "relevance": float((vectors @ normalized(query_embedding)).mean()) if n else 0.0,
+    }
+
+
+def write_extracts(data_dir: str, metadata_dir: str, n_rows: int, n_files: int, seed: int = 0) -> dict:
+    """
+    Write the ACRIS master and legals records split into n_files CSV files each, with their
+    metadata files. Returns {file name: rows}.
+    """
+    os.makedirs(data_dir, exist_ok=True)
+    os.makedirs(metadata_dir, exist_ok=True)
+    files = {}
+    for name, frame in [("acris_real_property_master", acris_master_frame(n_rows, seed)),
+                        ("acris_real_property_legals", acris_legals_frame(n_rows, seed))]:
+        for part, rows in enumerate(np.array_split(np.arange(len(frame)), n_files)):
+            file_name = f"{name}_{part + 1}.csv"
+            frame.iloc[rows].to_csv(os.path.join(data_dir, file_name), index=False)
+            metadata_frame(frame).to_csv(os.path.join(metadata_dir, file_name), index=False)
+            files[file_name] = len(rows)
+    return files
+
+
+def search_candidates(n_rows: int, n_files: int, n_queries: int, n_candidates: int, seed: int) -> list:
+    """
+    Ingest the synthetic data and search every question for n_candidates chunks with their embeddings.
+    """
+    if not os.path.exists(os.environ["MANIFEST_PATH"]):
+        write_extracts(os.environ["DATA_DIR"], os.environ["METADATA_DIR"], n_rows, n_files, seed)
+    from setupDB import setup_database
+    if setup_database() is None:
+        raise RuntimeError("Ingestion failed, see the output above")
+
+    import app.clients as client
+    from app.initialiseDB import VectorDBSetup
+    from app.chunk_filters import extract_where
+
+    vector_db_instance = VectorDBSetup(client.ClientManager())
+    collection = vector_db_instance.get_collection()
+    queries = sample_queries(n_queries, seed)
+    query_embeddings = vector_db_instance.get_embedder().embed(queries)
+    searches = []
+    for query, query_embedding in zip(queries, query_embeddings):
+        where = extract_where(query)
+        include = ["metadatas", "distances", "embeddings"]
+        results = collection.query(query_embeddings=[query_embedding], n_results=n_candidates, where=where,
+                                   include=include)
+        if where is not None and not results["ids"][0]:
+            results = collection.query(query_embeddings=[query_embedding], n_results=n_candidates, include=include)
+        searches.append((query_embedding, results))
+    return searches
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=20_000, help="rows per synthetic CSV file")
+    parser.add_argument("--files", type=int, default=4, help="files each synthetic CSV is split into")
+    parser.add_argument("--queries", type=int, default=200, help="questions searched")
+    parser.add_argument("--k", default="2,5,10", help="comma-separated numbers of chunks kept")
+    parser.add_argument("--candidates", type=int, default=RERANK_CANDIDATES, help="candidates searched per question")
+    parser.add_argument("--lambda", dest="lambda_mult", type=float, default=MMR_LAMBDA, help="MMR relevance weight")
+    parser.add_argument("--max-per-source", type=int, default=1, help="per-source cap of the mmr_cap strategy")
+    parser.add_argument("--workdir", help="directory for the synthetic data and vector store (default: a temp dir)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="optional JSON file for the results")
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="nycdb_rerank_")
+    configure_environment(workdir)
+    from app.rerank import MMRReranker
+
+    searches = search_candidates(args.rows, args.files, args.queries, max(args.candidates, 1), args.seed)
+    strategies = {
+        "search": None,
+        "mmr": MMRReranker(args.lambda_mult, max_per_source=0),
+        "mmr_cap": MMRReranker(args.lambda_mult, max_per_source=args.max_per_source),
+    }
+
+    results = []
+    print(f"{'k':>3}  {'strategy':<10}{'kept':>6}{'unique src':>11}{'pairwise':>10}{'relevance':>11}{'rerank ms':>11}")
+    for k in [int(k) for k in args.k.split(",") if k.strip()]:
+        for name, reranker in strategies.items():
+            scores, seconds = [], []
+            for query_embedding, candidates in searches:
+                start = time.perf_counter()
+                if reranker is None:
+                    kept_ids = candidates["ids"][0][:k]
+                else:
+                    kept_ids = reranker.rerank(query_embedding, candidates, k)[0]["ids"][0]
+                seconds.append(time.perf_counter() - start)
+                position = {chunk_id: i for i, chunk_id in enumerate(candidates["ids"][0])}
+                kept = [position[chunk_id] for chunk_id in kept_ids]
+                scores.append(diversity(query_embedding, [candidates["embeddings"][0][i] for i in kept],
+                                        [candidates["metadatas"][0][i].get("source") for i in kept], k))
+            result = {"k": k, "strategy": name, "rerank_latency": percentiles(seconds)}
+            result.update({metric: float(np.mean([score[metric] for score in scores])) for metric in scores[0]})
+            results.append(result)
+            print(f"{k:>3}  {name:<10}{result['kept']:>6.1f}{result['unique_source_share']:>11.3f}"
+                  f"{result['pairwise_similarity']:>10.3f}{result['relevance']:>11.3f}{result['rerank_latency']['p50'] * 1000:>11.3f}")
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump({"args": vars(args), "workdir": workdir, "results": results}, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Stored bytes and prompt tokens of chunks with and without the column metadata in their text.
+
+    python -m benchmarks.bench_schema --rows 20000 --queries 100
+
+The same record-aligned chunks of synthetic ACRIS data are built with three headers:
+    full_metadata  the FILE METADATA block with type, description and notes of every column
+    column_list    the source file and the list of its columns
+    registry       only the source file; the column metadata is stored once in the schema registry
+Stored bytes are the chunk texts (plus the registry file for the last one). Prompt tokens are the
+packed context of N_CHUNKS random chunks per question, with the relevant column descriptions from
+the registry attached to the registry format. The synthetic descriptions are one short sentence,
+so the real ACRIS metadata files save more.
+"""
+import os
+import json
+import argparse
+import tempfile
+import numpy as np
+from app.config import N_CHUNKS
+from app.context_packer import ContextPacker, estimate_tokens
+from app.preProcessing import DocumentProcessor
+from app.schema_registry import SchemaRegistry
+from benchmarks.synthetic import acris_master_frame, acris_legals_frame, metadata_frame, sample_queries
+
+
+def full_metadata_header(file_name: str, headers: list, column_mapping: dict, metadata_dict: dict) -> str:
+    """
+    The FILE METADATA block chunks used to carry, kept here as the baseline.
+    """
+    header = f"FILE METADATA:\nSource: {file_name}\n"
+    for csv_col in headers:
+        metadata = metadata_dict.get(column_mapping.get(csv_col), {})
+        header += (
+            f"Column: {csv_col}\n"
+            f"Type: {metadata.get('data_type', 'unknown')}\n"
+            f"Description: {metadata.get('description', 'No metadata available')}\n"
+            f"Notes: {metadata.get('notes', 'No metadata available')}\n\n"
+        )
+    return header + "DATA RECORDS:\n"
+
+
+def column_list_header(file_name: str, headers: list) -> str:
+    return f"FILE METADATA:\nSource: {file_name}\nColumns: {', '.join(headers)}\n\nDATA RECORDS:\n"
+
+
+def build_chunks(n_rows: int, seed: int, registry: SchemaRegistry) -> dict:
+    """
+    {format: [(source, chunk text), ...]} over both ACRIS files, registering their columns.
+    """
+    processor = DocumentProcessor()
+    chunks = {"full_metadata": [], "column_list": [], "registry": []}
+    for file_name, df in [("acris_real_property_master.csv", acris_master_frame(n_rows, seed)),
+                          ("acris_real_property_legals.csv", acris_legals_frame(n_rows, seed))]:
+        metadata_df = metadata_frame(df)
+        metadata_dict = dict(zip(metadata_df["column_name"], metadata_df.drop(columns="column_name").to_dict("records")))
+        headers = df.columns.tolist()
+        column_mapping = processor.create_column_mapping(headers, list(metadata_dict.keys()))
+        rows = processor.format_rows(df, column_mapping, metadata_dict)
+        registry.register(file_name, SchemaRegistry.build_columns(headers, column_mapping, metadata_dict))
+        for name, header in (("full_metadata", full_metadata_header(file_name, headers, column_mapping, metadata_dict)),
+                             ("column_list", column_list_header(file_name, headers)),
+                             ("registry", processor.build_schema_header(file_name))):
+            chunks[name].extend((file_name, text) for text, _, _ in processor.chunk_records(rows, header))
+    return chunks
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=20_000, help="rows per synthetic CSV file")
+    parser.add_argument("--queries", type=int, default=100, help="questions whose context is packed")
+    parser.add_argument("--chunks", type=int, default=N_CHUNKS, help="retrieved chunks per question")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="optional JSON file for the results")
+    args = parser.parse_args()
+
+    registry = SchemaRegistry(os.path.join(tempfile.mkdtemp(prefix="nycdb_schema_"), "schema_registry.json"))
+    chunks = build_chunks(args.rows, args.seed, registry)
+    registry.save()
+    registry_bytes = os.path.getsize(registry.registry_path)
+
+    rng = np.random.default_rng(args.seed)
+    n_chunks = len(chunks["registry"])
+    picks = [rng.choice(n_chunks, size=min(args.chunks, n_chunks), replace=False) for _ in range(args.queries)]
+    queries = sample_queries(args.queries, args.seed)
+    packer = ContextPacker()
+
+    results = {}
+    for name, format_chunks in chunks.items():
+        stored = sum(len(text.encode("utf-8")) for _, text in format_chunks)
+        if name == "registry":
+            stored += registry_bytes
+        tokens = []
+        for query, pick in zip(queries, picks):
+            sources = [format_chunks[i][0] for i in pick]
+            column_info = registry.column_info(sources, query) if name == "registry" else None
+            context, _, _ = packer.pack([str(i) for i in pick], [format_chunks[i][1] for i in pick], column_info)
+            tokens.append(estimate_tokens(context))
+        results[name] = {"chunks": len(format_chunks), "stored_bytes": stored,
+                         "mean_prompt_tokens": float(np.mean(tokens))}
+
+    baseline = results["full_metadata"]
+    print(f"{'format':<15}{'chunks':>8}{'stored MB':>11}{'vs full':>9}{'prompt tokens':>15}{'vs full':>9}")
+    for name, result in results.items():
+        print(f"{name:<15}{result['chunks']:>8}{result['stored_bytes'] / 1e6:>11.2f}"
+              f"{result['stored_bytes'] / baseline['stored_bytes'] - 1:>+9.1%}"
+              f"{result['mean_prompt_tokens']:>15.0f}"
+              f"{result['mean_prompt_tokens'] / baseline['mean_prompt_tokens'] - 1:>+9.1%}")
+    print(f"schema registry: {registry_bytes} bytes for {len(registry.sources)} files")
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump({"args": vars(args), "registry_bytes": registry_bytes, "formats": results}, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
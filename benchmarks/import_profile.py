@@ -0,0 +1,68 @@
+"""
+Import-time profile of the entry points, from `python -X importtime` in a fresh interpreter.
+
+    python -m benchmarks.import_profile --modules app.rag,api,main --top 10
+
+For every module it reports the total import time, the time per top-level package (the sum of the
+self times of its modules) and which of the heavy dependencies were imported at all. The heavy
+ones should only be loaded later, by the warm-up thread or on first use.
+"""
+import sys
+import json
+import argparse
+import subprocess
+from benchmarks.load_test import PROJECT_DIR
+
+HEAVY_PACKAGES = ["chromadb", "sentence_transformers", "torch", "gradio", "groq", "pandas"]
+
+
+def profile_import(module: str) -> dict:
+    """
+    Import module in a new interpreter and aggregate the -X importtime report.
+    """
+    process = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                             cwd=PROJECT_DIR, capture_output=True, text=True)
+    if process.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{process.stderr[-2000:]}")
+
+    packages = {}
+    total_us = 0
+    for line in process.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        name = name.strip()
+        packages[name.split(".")[0]] = packages.get(name.split(".")[0], 0) + int(self_us)
+        if name == module:
+            total_us = int(cumulative_us)
+    return {
+        "module": module,
+        "seconds": total_us / 1e6,
+        "packages": {name: us / 1e6 for name, us in sorted(packages.items(), key=lambda item: -item[1])},
+        "heavy_imported": [name for name in HEAVY_PACKAGES if name in packages],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modules", default="app.rag,api,batch_query,main",
+                        help="comma-separated modules to import")
+    parser.add_argument("--top", type=int, default=8, help="packages listed per module")
+    parser.add_argument("--output", help="optional JSON file for the results")
+    args = parser.parse_args()
+
+    results = [profile_import(module.strip()) for module in args.modules.split(",") if module.strip()]
+    for result in results:
+        print(f"{result['module']}: {result['seconds'] * 1000:.0f}ms, "
+              f"heavy packages imported: {', '.join(result['heavy_imported']) or 'none'}")
+        for name, seconds in list(result["packages"].items())[:args.top]:
+            print(f"  {name:<28}{seconds * 1000:>8.1f}ms")
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""
+Load test of the HTTP API (api.py) with the local stand-in LLM on synthetic ACRIS data.
+
+    python -m benchmarks.load_test --workers 1,4 --users 16 --requests-per-user 10 --output load.json
+
+For each --workers count an API server is started on --port, and --users clients send
+--requests-per-user questions back to back to /query or /query/stream. Every request of a run gets
+its own question, and the answer cache the previous server saved is deleted before each start, so
+later runs are not answered from it. Latency, time to first byte (streaming), throughput and busy
+(503) responses are reported per run.
+"""
+import os
+import sys
+import glob
+import json
+import time
+import asyncio
+import argparse
+import platform
+import tempfile
+import subprocess
+import httpx
+from benchmarks.run import configure_environment, percentiles, git_commit, distinct_queries
+from benchmarks.synthetic import write_dataset
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def start_server(port: int, workers: int) -> subprocess.Popen:
+    """
+    Start api.py with an empty answer cache: the shared workdir still holds the one the previous server saved.
+    """
+    cache_path = os.environ["ANSWER_CACHE_PATH"]
+    for path in [cache_path] + glob.glob(f"{glob.escape(cache_path)}.tmp*"):
+        if os.path.exists(path):
+            os.remove(path)
+    return subprocess.Popen(
+        [sys.executable, "api.py", "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers)],
+        cwd=PROJECT_DIR, env=dict(os.environ),
+    )
+
+
+def wait_until_ready(base_url: str, server: subprocess.Popen, timeout: float) -> float:
+    """
+    Poll /readyz until the server is ready and return the seconds it took.
+    """
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        if server.poll() is not None:
+            raise RuntimeError(f"API server exited with code {server.returncode}")
+        try:
+            if httpx.get(f"{base_url}/readyz", timeout=1.0).status_code == 200:
+                return time.perf_counter() - start
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"API server was not ready after {timeout:.0f}s")
+
+
+async def _user(http, endpoint: str, questions, latencies, first_bytes, busy, errors):
+    for question in questions:
+        start = time.perf_counter()
+        try:
+            if endpoint == "/query/stream":
+                async with http.stream("POST", endpoint, json={"question": question}) as response:
+                    if response.status_code == 503:
+                        busy.append(question)
+                        continue
+                    response.raise_for_status()
+                    first = None
+                    async for line in response.aiter_lines():
+                        if first is None and line:
+                            first = time.perf_counter() - start
+                    first_bytes.append(first)
+            else:
+                response = await http.post(endpoint, json={"question": question})
+                if response.status_code == 503:
+                    busy.append(question)
+                    continue
+                response.raise_for_status()
+        except httpx.HTTPError as e:
+            errors.append(str(e))
+            continue
+        latencies.append(time.perf_counter() - start)
+
+
+def run_load(base_url: str, endpoint: str, queries, users: int, requests_per_user: int) -> dict:
+    """
+    Every request gets its own question, so queries needs users * requests_per_user of them.
+    """
+    if len(queries) < users * requests_per_user:
+        raise ValueError(f"{users * requests_per_user} distinct queries needed, got {len(queries)}")
+    latencies, first_bytes, busy, errors = [], [], [], []
+
+    async def main():
+        limits = httpx.Limits(max_connections=users, max_keepalive_connections=users)
+        async with httpx.AsyncClient(base_url=base_url, timeout=120.0, limits=limits) as http:
+            await asyncio.gather(*[
+                _user(http, endpoint, queries[u * requests_per_user:(u + 1) * requests_per_user],
+                      latencies, first_bytes, busy, errors)
+                for u in range(users)
+            ])
+
+    start = time.perf_counter()
+    asyncio.run(main())
+    elapsed = time.perf_counter() - start
+    return {
+        "endpoint": endpoint,
+        "users": users,
+        "requests": users * requests_per_user,
+        "seconds": elapsed,
+        "throughput_rps": len(latencies) / elapsed,
+        "latency": percentiles(latencies),
+        "time_to_first_byte": percentiles(first_bytes),
+        "busy_responses": len(busy),
+        "errors": len(errors),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=20_000, help="rows per synthetic CSV file")
+    parser.add_argument("--workers", default="1", help="comma-separated API worker process counts")
+    parser.add_argument("--users", type=int, default=16, help="concurrent clients")
+    parser.add_argument("--requests-per-user", type=int, default=10)
+    parser.add_argument("--endpoint", choices=["/query", "/query/stream"], default="/query/stream")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="fake LLM seconds before the first token")
+    parser.add_argument("--llm-tokens-per-second", type=float, default=200, help="fake LLM token rate")
+    parser.add_argument("--ready-timeout", type=float, default=300, help="seconds to wait for each server")
+    parser.add_argument("--workdir", help="directory for the synthetic data and vector store (default: a temp dir)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="load_test_results.json", help="JSON file the results are written to")
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="nycdb_load_")
+    configure_environment(workdir, "fake", args.llm_latency, args.llm_tokens_per_second)
+    if not os.path.exists(os.environ["MANIFEST_PATH"]):
+        write_dataset(os.environ["DATA_DIR"], os.environ["METADATA_DIR"], args.rows, args.seed)
+        from setupDB import setup_database
+        if setup_database() is None:
+            raise RuntimeError("Ingestion failed, see the output above")
+    queries = distinct_queries(args.users * args.requests_per_user, args.seed)
+
+    results = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "workdir": workdir,
+            "args": vars(args),
+        },
+        "runs": [],
+    }
+    base_url = f"http://127.0.0.1:{args.port}"
+    for workers in [int(w) for w in args.workers.split(",") if w.strip()]:
+        print(f"== {workers} worker(s)")
+        server = start_server(args.port, workers)
+        try:
+            startup = wait_until_ready(base_url, server, args.ready_timeout)
+            run = run_load(base_url, args.endpoint, queries, args.users, args.requests_per_user)
+            run.update({"workers": workers, "startup_seconds": startup})
+            results["runs"].append(run)
+            print(f"   {run['throughput_rps']:.1f} req/s, p50 {run['latency'].get('p50', 0):.3f}s, "
+                  f"p99 {run['latency'].get('p99', 0):.3f}s, {run['busy_responses']} busy")
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+
+    with open(args.output, "w") as file:
+        json.dump(results, file, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
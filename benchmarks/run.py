@@ -0,0 +1,262 @@
+"""
+End-to-end benchmark: ingestion throughput, cold/warm query latency and concurrent-user load
+on synthetic ACRIS data, with the local stand-in LLM (LLM_BACKEND=fake) unless --llm groq is given.
+
+    python -m benchmarks.run --rows 20000 --queries 50 --users 1,4,16 --output bench.json
+
+Results are written as JSON so runs on different commits can be compared.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import platform
+import tempfile
+import subprocess
+import numpy as np
+from benchmarks.synthetic import write_dataset, sample_queries
+
+SCENARIOS = ["ingest", "query", "concurrency"]
+
+
+def percentiles(values) -> dict:
+    """
+    Summary statistics of a list of latencies in seconds.
+    """
+    if not values:
+        return {"count": 0}
+    values = np.asarray(values, dtype=float)
+    return {
+        "count": int(len(values)),
+        "mean": float(values.mean()),
+        "p50": float(np.percentile(values, 50)),
+        "p90": float(np.percentile(values, 90)),
+        "p99": float(np.percentile(values, 99)),
+        "max": float(values.max()),
+    }
+
+
+def distinct_queries(n_queries: int, seed: int = 0) -> list:
+    """
+    n_queries questions with no repeats; sample_queries may repeat one for small value ranges.
+    """
+    n_samples = n_queries
+    while True:
+        queries = list(dict.fromkeys(sample_queries(n_samples, seed)))
+        if len(queries) >= n_queries:
+            return queries[:n_queries]
+        n_samples *= 2
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def configure_environment(workdir: str, llm: str = "fake", llm_latency: float = 0.5,
+                          llm_tokens_per_second: float = 200):
+    """
+    Point every path ClientManager reads at the benchmark work directory. Must run before the
+    app modules are imported, since ClientManager reads the environment when it is created.
+    """
+    os.environ["DATA_DIR"] = os.path.join(workdir, "data")
+    os.environ["METADATA_DIR"] = os.path.join(workdir, "metadata")
+    os.environ["VECTOR_STORE"] = os.path.join(workdir, "chroma")
+    os.environ["MANIFEST_PATH"] = os.path.join(workdir, "ingest_manifest.json")
+    os.environ["ANSWER_CACHE_PATH"] = os.path.join(workdir, "answer_cache.json")
+    os.environ["JSON_PATH"] = os.path.join(workdir, "qa_history.json")
+    os.environ["QA_LOG_PATH"] = os.path.join(workdir, "qa_history.jsonl")
+    os.environ["LEXICAL_INDEX_PATH"] = os.path.join(workdir, "lexical_index")
+    os.environ["ANALYTICS_DB_PATH"] = os.path.join(workdir, "analytics.sqlite")
+    os.environ["SCHEMA_REGISTRY_PATH"] = os.path.join(workdir, "schema_registry.json")
+    os.environ["FLAT_INDEX_PATH"] = os.path.join(workdir, "flat_index")
+    os.environ["LLM_BACKEND"] = llm
+    os.environ["FAKE_LLM_LATENCY"] = str(llm_latency)
+    os.environ["FAKE_LLM_TOKENS_PER_SECOND"] = str(llm_tokens_per_second)
+    os.environ.setdefault("EMBED_MODEL", "all-MiniLM-L6-v2")
+    os.environ.setdefault("MODEL", "benchmark")
+
+
+def run_ingest(args) -> dict:
+    from setupDB import setup_database
+
+    start = time.perf_counter()
+    progress = setup_database(streaming=args.stream, batch_rows=args.batch_rows, workers=args.workers)
+    elapsed = time.perf_counter() - start
+    if progress is None:
+        raise RuntimeError("Ingestion failed, see the output above")
+    return {
+        "seconds": elapsed,
+        "rows": progress.rows,
+        "chunks": progress.chunks,
+        "rows_per_second": progress.rows / elapsed,
+        "chunks_per_second": progress.chunks / elapsed,
+        "streaming": args.stream,
+        "workers": args.workers,
+    }
+
+
+def timed_query(rag, query: str):
+    start = time.perf_counter()
+    _, retrieval_details = rag.rag_query_with_explanation(query, [])
+    return time.perf_counter() - start, retrieval_details
+
+
+def run_query(rag, queries) -> dict:
+    """
+    Cold: the first query of the process (vector store and model load) and then every query with
+    empty caches. Warm: the same queries again, served by the query and answer caches.
+    """
+    from app.initialiseDB import VectorDBSetup
+
+    first_seconds, _ = timed_query(rag, queries[0])
+    cold, cold_ttft = [], []
+    for query in queries:
+        rag.clear_caches()
+        seconds, retrieval_details = timed_query(rag, query)
+        cold.append(seconds)
+        if "time_to_first_token" in retrieval_details:
+            cold_ttft.append(retrieval_details["time_to_first_token"])
+
+    warm, answer_hits = [], 0
+    for query in queries:
+        seconds, retrieval_details = timed_query(rag, query)
+        warm.append(seconds)
+        answer_hits += bool(retrieval_details.get("answer_cache_hit"))
+
+    return {
+        "first_query_seconds": first_seconds,
+        "vector_store_timings": dict(VectorDBSetup.timings),
+        "cold": percentiles(cold),
+        "cold_time_to_first_token": percentiles(cold_ttft),
+        "warm": percentiles(warm),
+        "warm_answer_cache_hit_rate": answer_hits / len(queries),
+    }
+
+
+async def _user(async_rag, queries, latencies, busy):
+    for query in queries:
+        start = time.perf_counter()
+        _, retrieval_details = await async_rag.rag_query_with_explanation(query, [])
+        if retrieval_details.get("busy"):
+            busy.append(query)
+        else:
+            latencies.append(time.perf_counter() - start)
+
+
+def run_concurrency(rag, queries, users: int, queries_per_user: int) -> dict:
+    """
+    `users` simulated users each send queries_per_user queries back to back through the async
+    request path. Every request gets its own question (queries needs users * queries_per_user of
+    them), and the caches are emptied and the answer cache disabled, so every query reaches the LLM
+    even when two questions are near-duplicates.
+    """
+    from app.async_rag import AsyncRAGProcessor
+
+    if len(queries) < users * queries_per_user:
+        raise ValueError(f"{users * queries_per_user} distinct queries needed, got {len(queries)}")
+    rag.clear_caches()
+    answer_cache_size, rag.answer_cache.maxsize = rag.answer_cache.maxsize, 0
+    async_rag = AsyncRAGProcessor(rag)
+    latencies, busy = [], []
+
+    async def main():
+        await asyncio.gather(*[
+            _user(async_rag, queries[u * queries_per_user:(u + 1) * queries_per_user], latencies, busy)
+            for u in range(users)
+        ])
+
+    start = time.perf_counter()
+    try:
+        asyncio.run(main())
+    finally:
+        rag.answer_cache.maxsize = answer_cache_size
+    elapsed = time.perf_counter() - start
+    async_rag.executor.shutdown()
+    return {
+        "users": users,
+        "queries": users * queries_per_user,
+        "seconds": elapsed,
+        "throughput_qps": len(latencies) / elapsed,
+        "latency": percentiles(latencies),
+        "busy_responses": len(busy),
+        "queue": async_rag.metrics(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        help=f"comma-separated scenarios to run (default: {','.join(SCENARIOS)})")
+    parser.add_argument("--rows", type=int, default=20_000, help="rows per synthetic CSV file")
+    parser.add_argument("--queries", type=int, default=50, help="distinct queries in the query scenarios")
+    parser.add_argument("--users", default="1,4,16", help="comma-separated concurrent user counts")
+    parser.add_argument("--queries-per-user", type=int, default=5)
+    parser.add_argument("--stream", action="store_true", help="ingest in streaming mode")
+    parser.add_argument("--batch-rows", type=int, default=5000, help="rows per batch in streaming mode")
+    parser.add_argument("--workers", type=int, default=1, help="ingestion worker processes")
+    parser.add_argument("--llm", choices=["fake", "groq"], default="fake", help="LLM backend (default: fake)")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="fake LLM seconds before the first token")
+    parser.add_argument("--llm-tokens-per-second", type=float, default=200, help="fake LLM token rate")
+    parser.add_argument("--workdir", help="directory for the synthetic data and vector store (default: a temp dir)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="benchmark_results.json", help="JSON file the results are written to")
+    args = parser.parse_args()
+
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(sorted(unknown))}")
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="nycdb_bench_")
+    configure_environment(workdir, args.llm, args.llm_latency, args.llm_tokens_per_second)
+    files = write_dataset(os.environ["DATA_DIR"], os.environ["METADATA_DIR"], args.rows, args.seed)
+    queries = sample_queries(args.queries, args.seed)
+
+    results = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "workdir": workdir,
+            "files": files,
+            "args": vars(args),
+        }
+    }
+
+    if "ingest" in scenarios or not os.path.exists(os.environ["MANIFEST_PATH"]):
+        print("== ingest")
+        results["ingest"] = run_ingest(args)
+
+    if "query" in scenarios or "concurrency" in scenarios:
+        import app.clients as client
+        from app.rag import RAGProcessor
+        rag = RAGProcessor(client.ClientManager())
+
+        if "query" in scenarios:
+            print("== query latency")
+            results["query"] = run_query(rag, queries)
+        if "concurrency" in scenarios:
+            results["concurrency"] = []
+            user_counts = [int(u) for u in args.users.split(",") if u.strip()]
+            concurrency_queries = distinct_queries(max(user_counts, default=0) * args.queries_per_user, args.seed)
+            for users in user_counts:
+                print(f"== concurrency: {users} user(s)")
+                results["concurrency"].append(run_concurrency(rag, concurrency_queries, users,
+                                                              args.queries_per_user))
+        rag.qa_logger.close()
+
+    with open(args.output, "w") as file:
+        json.dump(results, file, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+import os
+import numpy as np
+import pandas as pd
+
+BOROUGHS = [1, 2, 3, 4, 5]
+DOC_TYPES = ["DEED", "MTGE", "SAT", "ASST", "AGMT", "DEEDO", "RPTT", "UCC1"]
+STREET_NAMES = ["BROADWAY", "W. 4 ST.", "5 AVE", "ATLANTIC AVE.", "QUEENS BLVD", "GRAND CONCOURSE", "VICTORY BLVD", "E. 86 ST."]
+PROPERTY_TYPES = ["SC", "D1", "CR", "AP", "F1", "OT"]
+
+
+def acris_master_frame(n_rows: int, seed: int = 0) -> pd.DataFrame:
+    """
+    Build an ACRIS real property master shaped frame with n_rows records.
+    """
+    rng = np.random.default_rng(seed)
+    document_ids = np.char.add("20", np.char.zfill(np.arange(n_rows).astype(str), 14))
+    dates = pd.Timestamp("2015-01-01") + pd.to_timedelta(rng.integers(0, 3650, n_rows), unit="D")
+    amounts = np.round(rng.lognormal(13, 1.2, n_rows), 2)
+    amounts[rng.random(n_rows) < 0.05] = np.nan
+    return pd.DataFrame({
+        "DOCUMENT ID": document_ids,
+        "RECORD TYPE": "A",
+        "CRFN": np.char.add("20", np.char.zfill(rng.integers(0, 10**11, n_rows).astype(str), 11)),
+        "RECORDED BOROUGH": rng.choice(BOROUGHS, n_rows),
+        "DOC. TYPE": rng.choice(DOC_TYPES, n_rows),
+        "DOCUMENT DATE": dates.strftime("%m/%d/%Y"),
+        "DOCUMENT AMT": amounts,
+        "RECORDED / FILED": (dates + pd.to_timedelta(rng.integers(0, 60, n_rows), unit="D")).strftime("%m/%d/%Y %I:%M:%S %p"),
+        "% TRANSFERRED": rng.choice([0.0, 50.0, 100.0], n_rows),
+    })
+
+
+def acris_legals_frame(n_rows: int, seed: int = 0) -> pd.DataFrame:
+    """
+    Build an ACRIS real property legals shaped frame with n_rows records.
+    """
+    rng = np.random.default_rng(seed + 1)
+    return pd.DataFrame({
+        "DOCUMENT ID": np.char.add("20", np.char.zfill(np.arange(n_rows).astype(str), 14)),
+        "RECORD TYPE": "L",
+        "BOROUGH": rng.choice(BOROUGHS, n_rows),
+        "BLOCK": rng.integers(1, 16000, n_rows),
+        "LOT": rng.integers(1, 9000, n_rows),
+        "PROPERTY TYPE": rng.choice(PROPERTY_TYPES, n_rows),
+        "STREET NUMBER": rng.integers(1, 3000, n_rows).astype(str),
+        "STREET NAME": rng.choice(STREET_NAMES, n_rows),
+        "UNIT": np.where(rng.random(n_rows) < 0.3, rng.integers(1, 40, n_rows).astype(str), None),
+    })
+
+
+def metadata_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Build a metadata file (column_name, data_type, values, full_name, description, notes) for df.
+    """
+    rows = []
+    for column in df.columns:
+        if "DATE" in column or column == "RECORDED / FILED":
+            data_type = "floating_timestamp"
+        elif pd.api.types.is_numeric_dtype(df[column]):
+            data_type = "numeric"
+        else:
+            data_type = "text"
+        rows.append({
+            "column_name": column.lower().replace(" ", "_"),
+            "data_type": data_type,
+            "values": None,
+            "full_name": column.title(),
+            "description": f"The {column.lower()} of the record.",
+            "notes": "Synthetic benchmark data.",
+        })
+    return pd.DataFrame(rows)
+
+
+def write_dataset(data_dir: str, metadata_dir: str, n_rows: int, seed: int = 0) -> dict:
+    """
+    Write ACRIS master and legals CSVs with n_rows records each, plus their metadata files,
+    in the DATA_DIR / METADATA_DIR layout setupDB.py expects. Returns {file name: rows}.
+    """
+    os.makedirs(data_dir, exist_ok=True)
+    os.makedirs(metadata_dir, exist_ok=True)
+    files = {}
+    for file_name, frame in [("acris_real_property_master.csv", acris_master_frame(n_rows, seed)),
+                             ("acris_real_property_legals.csv", acris_legals_frame(n_rows, seed))]:
+        frame.to_csv(os.path.join(data_dir, file_name), index=False)
+        metadata_frame(frame).to_csv(os.path.join(metadata_dir, file_name), index=False)
+        files[file_name] = len(frame)
+    return files
+
+
+def sample_queries(n_queries: int, seed: int = 0) -> list:
+    """
+    Build n_queries distinct property questions in the style of the UI's sample questions.
+    """
+    rng = np.random.default_rng(seed)
+    templates = [
+        "What's the most recent {doc_type} recorded on {street}?",
+        "Show me {doc_type} documents for block {block} in borough {borough}",
+        "What is the document amount of {doc_type} records on {street} in borough {borough}?",
+        "List the property types on {street} near lot {lot}",
+    ]
+    queries = []
+    for i in range(n_queries):
+        queries.append(templates[i % len(templates)].format(
+            doc_type=rng.choice(DOC_TYPES),
+            street=rng.choice(STREET_NAMES),
+            borough=rng.choice(BOROUGHS),
+            block=rng.integers(1, 16000),
+            lot=rng.integers(1, 9000),
+        ))
+    return queries
@@ -1,9 +1,12 @@
-import gradio as gr
 import warnings
 from app.rag import RAGProcessor
+from app.async_rag import AsyncRAGProcessor
+from app.config import MAX_CONCURRENT_REQUESTS, MAX_QUEUE_DEPTH, METRICS_PORT, METRICS_HOST
+from app.metrics import start_metrics_server
 import app.clients as client
 from dotenv import load_dotenv
-from typing import List, Tuple, Dict
+from functools import partial
+from typing import AsyncIterator, Dict, List, Tuple
 
 # Load environment variables
 load_dotenv()
@@ -12,24 +15,34 @@ class DocumentQASystem:
     def __init__(self):
         self.client_manager = client.ClientManager()
         self.rag_processor_instance = RAGProcessor(self.client_manager)
+        self.async_rag_processor = AsyncRAGProcessor(self.rag_processor_instance)
 
-    def process_query(self, message: str, chat_history: List[Tuple[str, str]]) -> Tuple[str, List[Tuple[str, str]], Dict]:
+    async def process_query_async(self, message: str, chat_history: List[Tuple[str, str]]) -> AsyncIterator[Tuple[str, List[Tuple[str, str]], Dict]]:
+        """
+        Async Gradio handler: updates the last chat message as tokens arrive from the LLM. Requests
+        share the event loop and the bounded async pipeline instead of each holding a worker thread.
+        """
+        previous_history = list(chat_history or [])
+        chat_history = previous_history + [(message, "")]
         try:
-            response, retrieval_details = self.rag_processor_instance.rag_query_with_explanation(message, chat_history)
-            explanation = {
-                "chunks_retrieved": len(retrieval_details["chunks"]),
-                "relevant_files": list(set(chunk["source"] for chunk in retrieval_details["chunks"])),
-                "confidence_scores": [f"{score:.2f}" for score in retrieval_details["scores"]],
-                "processing_steps": retrieval_details["steps"]
-            }
-            chat_history.append((message, response))
-            return "", chat_history, explanation
+            async for response, retrieval_details in self.async_rag_processor.rag_query_stream(message, previous_history):
+                chat_history[-1] = (message, response)
+                yield "", chat_history, RAGProcessor.build_explanation(retrieval_details)
         except Exception as e:
             error_response = f"Error processing query: {str(e)}"
-            chat_history.append((message, error_response))
-            return "", chat_history, {"error": error_response}
+            chat_history[-1] = (message, error_response)
+            yield "", chat_history, {"error": error_response}
 
     def create_ui(self):
+        # Imported here so the warm-up thread loads the model while gradio is still importing
+        import gradio as gr
+
+        # Every RAG listener shares one Gradio concurrency group whose limit is above what the async
+        # pipeline admits (running + waiting), so requests beyond it reach the pipeline and get its
+        # immediate "busy" response instead of piling up in Gradio's queue
+        rag_events = {"concurrency_id": "rag",
+                      "concurrency_limit": 2 * MAX_CONCURRENT_REQUESTS + MAX_QUEUE_DEPTH}
+
         with gr.Blocks() as demo:
             gr.Markdown("# NYC Property Records Q&A System")
             
@@ -55,18 +68,24 @@ class DocumentQASystem:
                 ]
                 for question in sample_questions:
                     gr.Button(question).click(
-                        lambda q=question: self.process_query(q, []),
+                        partial(self.process_query_async, question, []),
                         inputs=[],
-                        outputs=[msg, chatbot, retrieval_info]
+                        outputs=[msg, chatbot, retrieval_info],
+                        **rag_events
                     )
             
-            msg.submit(self.process_query, [msg, chatbot], [msg, chatbot, retrieval_info])
-            submit_btn.click(self.process_query, [msg, chatbot], [msg, chatbot, retrieval_info])
-        
+            msg.submit(self.process_query_async, [msg, chatbot], [msg, chatbot, retrieval_info], **rag_events)
+            submit_btn.click(self.process_query_async, [msg, chatbot], [msg, chatbot, retrieval_info], **rag_events)
+
+        # The busy responses above are fast, so Gradio's own queue stays short; max_size bounds it anyway
+        demo.queue(max_size=MAX_QUEUE_DEPTH)
         return demo
 
 if __name__ == "__main__":
     warnings.filterwarnings("ignore", category=UserWarning)
     system = DocumentQASystem()
+    if METRICS_PORT:
+        start_metrics_server(METRICS_PORT, METRICS_HOST)
+    system.rag_processor_instance.start_warm_up(asynchronous=True)
     demo = system.create_ui()
     demo.launch(share=False)
@@ -1,47 +1,398 @@
 import os
+import time
+import queue
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from app.config import BATCH_SIZE, EMBED_BATCH_SIZE, INGEST_BATCH_ROWS, HYBRID_SEARCH, ANALYTICS_ENABLED
 from app.ingestion import DocumentIngestor
+from app.manifest import IngestManifest
+from app.schema_registry import SchemaRegistry
+from app.preProcessing import DocumentProcessor
+from app.lexical import BM25Index
+from app.flat_index import FlatIndex
+from app.analytics import AnalyticsStore
+from app.pipeline import EmbeddingPipeline
 from app.initialiseDB import VectorDBSetup
 import app.clients as client
 from dotenv import load_dotenv
 # Load environment variables
 load_dotenv()
 
-def setup_database():
+
+def _iter_file_batches(document_ingestor_instance, csv_path: str, metadata_path: str,
+                       streaming: bool, batch_rows: int):
     """
-    One-time initialization of the database with all CSV files and their metadata.
+    Yields the (ids, texts, metadatas) batches of one file, streamed or all at once.
     """
-    data_dir = os.environ.get("DATA_DIR")
-    metadata_dir = os.environ.get("METADATA_DIR")
-    db_initialized_flag = "db_initialized.flag"
+    if streaming:
+        yield from document_ingestor_instance.iter_csv_with_metadata(csv_path, metadata_path, batch_rows)
+    else:
+        yield document_ingestor_instance.process_csv_with_metadata(csv_path, metadata_path)
+
+
+def _parse_file_worker(csv_path: str, metadata_path: str, streaming: bool, batch_rows: int, batch_queue):
+    """
+    Runs in a worker process: parses, formats and chunks one file and hands the batches to the writer.
+    """
+    file_name = os.path.basename(csv_path)
+    document_ingestor_instance = DocumentIngestor()
+    try:
+        for ids, texts, metadatas in _iter_file_batches(document_ingestor_instance, csv_path, metadata_path,
+                                                        streaming, batch_rows):
+            batch_queue.put(("batch", file_name, (ids, texts, metadatas)))
+        batch_queue.put(("done", file_name, document_ingestor_instance.document_processor_instance.rows_read))
+    except Exception as e:
+        batch_queue.put(("error", file_name, str(e)))
+
+
+class IngestionProgress:
+    """
+    Tracks per-file and overall ingestion throughput and the planned or applied chunk changes.
+    """
+
+    def __init__(self, n_files: int):
+        self.n_files = n_files
+        self.files_done = 0
+        self.failed = []
+        self.rows = 0
+        self.chunks = 0
+        self.changes = {"added": 0, "updated": 0, "unchanged": 0, "deleted": 0}
+        self.file_chunks = {}
+        self.file_started = {}
+        self.start = time.perf_counter()
+
+    def add_chunks(self, file_name: str, n_chunks: int):
+        self.file_started.setdefault(file_name, time.perf_counter())
+        self.file_chunks[file_name] = self.file_chunks.get(file_name, 0) + n_chunks
+        self.chunks += n_chunks
+
+    def add_changes(self, counts: dict):
+        for key, value in counts.items():
+            self.changes[key] += value
 
-    if not os.path.exists(db_initialized_flag):
-        client_manager = client.ClientManager()
-        vector_db_instance = VectorDBSetup(client_manager)
+    def file_done(self, file_name: str, n_rows: int, error: str = None):
+        self.files_done += 1
+        self.rows += n_rows
+        elapsed = time.perf_counter() - self.file_started.get(file_name, self.start)
+        if error:
+            self.failed.append(file_name)
+            print(f"[{self.files_done}/{self.n_files}] {file_name}: failed: {error}")
+        else:
+            print(f"[{self.files_done}/{self.n_files}] {file_name}: {n_rows} rows, "
+                  f"{self.file_chunks.get(file_name, 0)} chunks in {elapsed:.1f}s")
+
+    def summary(self, dry_run: bool = False):
+        elapsed = max(time.perf_counter() - self.start, 1e-9)
+        print(f"Processed {self.rows} rows into {self.chunks} chunks in {elapsed:.1f}s "
+              f"({self.rows / elapsed:.0f} rows/sec, {self.chunks / elapsed:.1f} chunks/sec)")
+        verb = "Planned" if dry_run else "Applied"
+        print(f"{verb} chunk changes: {self.changes['added']} added, {self.changes['updated']} updated, "
+              f"{self.changes['deleted']} deleted, {self.changes['unchanged']} unchanged")
+
+
+class IngestionWriter:
+    """
+    The single writer of an ingestion run. Compares each chunk against the manifest, writes only
+    new or changed chunks, deletes chunks that no longer exist and records the new state.
+    """
+
+    def __init__(self, collection, embedder, manifest: IngestManifest, progress: IngestionProgress,
+                 dry_run: bool = False, embed_batch_size: int = EMBED_BATCH_SIZE):
+        self.collection = collection
+        self.manifest = manifest
+        self.progress = progress
+        self.dry_run = dry_run
+        self.document_ingestor_instance = DocumentIngestor()
+        # Changed chunks are embedded and written by the pipeline's own threads
+        self.pipeline = None if dry_run else EmbeddingPipeline(collection, embedder, embed_batch_size)
+        self.signatures = {}
+        self.file_hashes = {}
+
+    def begin_file(self, file_name: str, signature: dict):
+        self.signatures[file_name] = signature
+        self.file_hashes[file_name] = {}
+
+    def write_batch(self, file_name: str, ids, texts, metadatas):
+        self.progress.add_chunks(file_name, len(ids))
+        hashes, counts, changed = self.document_ingestor_instance.diff_documents(
+            ids, texts, metadatas, self.manifest.get_chunk_hashes(file_name)
+        )
+        if changed and self.pipeline:
+            self.pipeline.submit(
+                [ids[i] for i in changed],
+                [texts[i] for i in changed],
+                [metadatas[i] for i in changed]
+            )
+        self.file_hashes[file_name].update(hashes)
+        self.progress.add_changes(counts)
+
+    def finish_file(self, file_name: str, n_rows: int):
+        """
+        Deletes the chunks of the previous ingestion that the file no longer produces.
+        """
+        hashes = self.file_hashes.pop(file_name)
+        stale_ids = [chunk_id for chunk_id in self.known_chunk_ids(file_name) if chunk_id not in hashes]
+        self.remove_chunks(stale_ids)
+        self.manifest.update_file(file_name, self.signatures.pop(file_name), hashes)
+        self.progress.file_done(file_name, n_rows)
+
+    def known_chunk_ids(self, file_name: str) -> list:
+        """
+        Ids of the chunks the previous ingestion wrote for a file. A store built before the manifest
+        existed has no entry for it, so they are read from the collection; otherwise its chunks beyond
+        the new chunk count (e.g. of the old sentence chunking) would never be deleted.
+        """
+        if file_name in self.manifest.file_names() or self.collection is None:
+            return list(self.manifest.get_chunk_hashes(file_name))
+        return list(self.collection.get(where={"source": file_name}, include=[])["ids"])
+
+    def fail_file(self, file_name: str, error: str):
+        # Chunks already written for this file stay, but the manifest keeps the old entry,
+        # so the next run compares against it and processes the file again
+        self.file_hashes.pop(file_name, None)
+        self.signatures.pop(file_name, None)
+        self.progress.file_done(file_name, 0, error=error)
+
+    def remove_file(self, file_name: str):
+        """
+        Deletes every chunk of a source file that is no longer present.
+        """
+        self.remove_chunks(list(self.manifest.get_chunk_hashes(file_name)))
+        self.manifest.remove_file(file_name)
+
+    def remove_chunks(self, chunk_ids):
+        self.progress.add_changes({"deleted": len(chunk_ids)})
+        for i in range(0, len(chunk_ids), BATCH_SIZE):
+            if self.pipeline:
+                self.pipeline.submit_delete(chunk_ids[i:i + BATCH_SIZE])
+
+    def close(self):
+        """
+        Waits until every queued chunk has been embedded and written.
+        """
+        if self.pipeline:
+            self.pipeline.close()
+
+
+def _ingest_sequential(writer: IngestionWriter, files, streaming: bool, batch_rows: int):
+    """
+    Parses, chunks and writes the files one after another in this process.
+    """
+    for csv_path, metadata_path in files:
+        file_name = os.path.basename(csv_path)
         document_ingestor_instance = DocumentIngestor()
-        
         try:
-            collection = vector_db_instance.initialize_vectorDB()
-            csv_files = [f for f in os.listdir(data_dir) if f.endswith('.csv')]
-            
-            for csv_file in csv_files:
-                csv_path = os.path.join(data_dir, csv_file)
-                metadata_path = os.path.join(metadata_dir, csv_file)
-                
-                if os.path.exists(metadata_path):
-                    document_ingestor_instance.ingest_documents(
-                        collection, csv_path, metadata_path
-                    )
-                else:
-                    print(f"Warning: No metadata file found for {csv_file}")
-            
-            with open(db_initialized_flag, 'w') as f:
-                f.write('initialized')
-            
-            print("Database initialized successfully with all CSV files and metadata.")
+            for ids, texts, metadatas in _iter_file_batches(document_ingestor_instance, csv_path, metadata_path,
+                                                            streaming, batch_rows):
+                writer.write_batch(file_name, ids, texts, metadatas)
+            writer.finish_file(file_name, document_ingestor_instance.document_processor_instance.rows_read)
         except Exception as e:
-            print(f"Error during database initialization: {e}")
-    else:
-        print("Database already initialized. Skipping initialization step.")
+            writer.fail_file(file_name, str(e))
+
+
+def _ingest_parallel(writer: IngestionWriter, files, streaming: bool, batch_rows: int, workers: int):
+    """
+    Parses and chunks the files in a process pool while this process is the single writer
+    that applies their batches to the collection.
+    """
+    with multiprocessing.Manager() as manager, ProcessPoolExecutor(max_workers=workers) as executor:
+        # Bounded so that fast parsers cannot run far ahead of the writer
+        batch_queue = manager.Queue(maxsize=workers * 4)
+        futures = [
+            executor.submit(_parse_file_worker, csv_path, metadata_path, streaming, batch_rows, batch_queue)
+            for csv_path, metadata_path in files
+        ]
+
+        remaining = len(files)
+        while remaining:
+            try:
+                kind, file_name, payload = batch_queue.get(timeout=1)
+            except queue.Empty:
+                crashed = [f for f in futures if f.done() and f.exception() is not None]
+                if crashed:
+                    raise RuntimeError(f"Ingestion worker crashed: {crashed[0].exception()}")
+                continue
+
+            if kind == "batch":
+                writer.write_batch(file_name, *payload)
+            elif kind == "done":
+                remaining -= 1
+                writer.finish_file(file_name, payload)
+            else:
+                remaining -= 1
+                writer.fail_file(file_name, payload)
+
+
+def build_lexical_index(collection, index_path: str):
+    """
+    Rebuilds the BM25 index over every chunk of the collection, for hybrid retrieval.
+    """
+    start = time.perf_counter()
+    index = BM25Index.build_from_collection(collection)
+    index.save(index_path)
+    print(f"Lexical index: {index.n_docs} chunks, {len(index.terms)} terms built in "
+          f"{time.perf_counter() - start:.1f}s")
+
+
+def build_flat_index(collection, index_path: str):
+    """
+    Exports the collection to the memory-mapped flat index served with RETRIEVAL_BACKEND=flat.
+    """
+    start = time.perf_counter()
+    n_chunks = FlatIndex.export(collection, index_path)
+    print(f"Flat index: {n_chunks} chunks exported in {time.perf_counter() - start:.1f}s")
+
+
+def update_analytics_store(db_path: str, paths: dict, changed: set, removed: list, batch_rows: int):
+    """
+    Loads new or changed CSV files into the SQLite analytics store and drops removed ones.
+    Files missing from the store (e.g. a store created after the vector store) are loaded as well.
+    """
+    store = AnalyticsStore(db_path)
+    for csv_file in removed:
+        store.drop_file(csv_file)
+    for csv_file, (csv_path, metadata_path) in sorted(paths.items()):
+        if csv_file not in changed and store.has_table(csv_file):
+            continue
+        start = time.perf_counter()
+        try:
+            n_rows = store.load_csv(csv_path, metadata_path, batch_rows)
+            print(f"Analytics store: loaded {n_rows} rows of {csv_file} in {time.perf_counter() - start:.1f}s")
+        except Exception as e:
+            print(f"Warning: {e}")
+
+
+def setup_database(streaming: bool = False, batch_rows: int = INGEST_BATCH_ROWS, workers: int = 1,
+                   dry_run: bool = False, embed_batch_size: int = EMBED_BATCH_SIZE, export_flat_index: bool = False):
+    """
+    Incrementally ingests all CSV files and their metadata into the database.
+    Files whose data, metadata and chunking settings match the manifest are skipped, and for the
+    others only new or changed chunks are written and chunks that disappeared are deleted.
+    Args:
+        streaming (bool, optional): Read, chunk and insert each file batch by batch to bound memory use.
+        batch_rows (int, optional): Number of CSV rows per batch in streaming mode.
+        workers (int, optional): Number of worker processes parsing and chunking files in parallel.
+        dry_run (bool, optional): Report the planned changes without writing to the store or the manifest.
+        embed_batch_size (int, optional): Number of chunks embedded per SentenceTransformer call.
+        export_flat_index (bool, optional): Export the flat index even if no chunk changed. It is also
+            exported after changes when RETRIEVAL_BACKEND is "flat".
+    Returns:
+        IngestionProgress: Row, chunk and change counts of the run, or None if it failed.
+    """
+    data_dir = os.environ.get("DATA_DIR")
+    metadata_dir = os.environ.get("METADATA_DIR")
+
+    client_manager = client.ClientManager()
+    # Ingestion always writes to ChromaDB, also when the replicas serve from the flat index
+    vector_db_instance = VectorDBSetup(client_manager, retrieval_backend="chroma")
+    manifest = IngestManifest(client_manager.get_manifest_path())
+
+    try:
+        collection = vector_db_instance.get_collection()
+        csv_files = [f for f in os.listdir(data_dir) if f.endswith('.csv')]
+
+        files = []
+        present = set()
+        paths = {}
+        signatures = {}
+        for csv_file in csv_files:
+            csv_path = os.path.join(data_dir, csv_file)
+            metadata_path = os.path.join(metadata_dir, csv_file)
+
+            if not os.path.exists(metadata_path):
+                print(f"Warning: No metadata file found for {csv_file}")
+                continue
+            present.add(csv_file)
+            paths[csv_file] = (csv_path, metadata_path)
+
+            signature = manifest.file_signature(csv_path, metadata_path, manifest.get_signature(csv_file))
+            if manifest.is_unchanged(csv_file, signature):
+                # Content is the same, only refresh size/mtime so the next run can skip hashing
+                manifest.update_signature(csv_file, signature)
+                continue
+            signatures[csv_file] = signature
+            files.append((csv_path, metadata_path))
+
+        removed = [f for f in manifest.file_names() if f not in present]
+        print(f"{len(files)} new or changed file(s), {len(present) - len(files)} unchanged, {len(removed)} removed")
+
+        if not dry_run and (files or removed):
+            vector_db_instance.check_embedding_compatibility(collection, write=True)
+
+        progress = IngestionProgress(len(files))
+        writer = IngestionWriter(collection, vector_db_instance.get_embedder(), manifest, progress,
+                                 dry_run=dry_run, embed_batch_size=embed_batch_size)
+        try:
+            for csv_file in removed:
+                writer.remove_file(csv_file)
+            for csv_path, _ in files:
+                writer.begin_file(os.path.basename(csv_path), signatures[os.path.basename(csv_path)])
+
+            if workers > 1 and files:
+                _ingest_parallel(writer, files, streaming, batch_rows, workers)
+            else:
+                _ingest_sequential(writer, files, streaming, batch_rows)
+        finally:
+            writer.close()
+        progress.summary(dry_run=dry_run)
+
+        if dry_run:
+            print("Dry run: no changes were written.")
+            return progress
+
+        # Column metadata is stored once per file; reading it is cheap, so refresh every file
+        schema_registry = SchemaRegistry(client_manager.get_schema_registry_path())
+        processor = DocumentProcessor()
+        for csv_file, (csv_path, metadata_path) in paths.items():
+            if csv_file not in progress.failed:
+                schema_registry.register(csv_file, processor.read_schema(csv_path, metadata_path))
+        for csv_file in removed:
+            schema_registry.remove(csv_file)
+        schema_registry.save()
+
+        index_path = client_manager.get_lexical_index_path()
+        changed = progress.changes["added"] + progress.changes["updated"] + progress.changes["deleted"]
+        if HYBRID_SEARCH and (changed or not os.path.exists(index_path)):
+            build_lexical_index(collection, index_path)
+
+        flat_index_path = client_manager.get_flat_index_path()
+        if export_flat_index or (client_manager.get_retrieval_backend() == "flat"
+                                 and (changed or not os.path.exists(flat_index_path))):
+            build_flat_index(collection, flat_index_path)
+
+        if ANALYTICS_ENABLED:
+            changed_files = {os.path.basename(csv_path) for csv_path, _ in files} - set(progress.failed)
+            update_analytics_store(client_manager.get_analytics_db_path(), paths, changed_files, removed,
+                                   batch_rows)
+
+        # The serving side reloads its side stores when the manifest changes, so it is written last,
+        # once the stores above are complete. Saving an unchanged manifest would still bump its mtime
+        # and clear the serving caches.
+        if manifest.changed:
+            manifest.save()
+
+        if progress.failed:
+            raise RuntimeError(f"{len(progress.failed)} file(s) failed to ingest: {', '.join(progress.failed)}")
+        print("Database is up to date with all CSV files and metadata.")
+        return progress
+    except Exception as e:
+        print(f"Error during database initialization: {e}")
 
 if __name__ == "__main__":
-    setup_database()
+    parser = argparse.ArgumentParser(description="Ingest the ACRIS CSV files and their metadata into the vector store.")
+    parser.add_argument("--stream", action="store_true",
+                        help="stream each CSV in row batches so memory is bounded by --batch-rows, not file size")
+    parser.add_argument("--batch-rows", type=int, default=INGEST_BATCH_ROWS,
+                        help=f"rows per batch in streaming mode (default: {INGEST_BATCH_ROWS})")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="worker processes that parse and chunk files in parallel (default: 1)")
+    parser.add_argument("--embed-batch-size", type=int, default=EMBED_BATCH_SIZE,
+                        help=f"chunks embedded per model call in the ingestion pipeline (default: {EMBED_BATCH_SIZE})")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="report the chunks that would be added, updated or deleted without writing anything")
+    parser.add_argument("--export-flat-index", action="store_true",
+                        help="export the collection to the flat index (FLAT_INDEX_PATH) even if nothing changed")
+    args = parser.parse_args()
+    setup_database(streaming=args.stream, batch_rows=args.batch_rows, workers=args.workers, dry_run=args.dry_run,
+                   embed_batch_size=args.embed_batch_size, export_flat_index=args.export_flat_index)
@@ -0,0 +1,56 @@
+import os
+import pytest
+from app.analytics import AnalyticsStore, AnalyticsRouter
+from benchmarks.synthetic import write_dataset
+
+
+@pytest.fixture(scope="module")
+def router(tmp_path_factory):
+    workdir = tmp_path_factory.mktemp("analytics")
+    data_dir, metadata_dir = str(workdir / "data"), str(workdir / "metadata")
+    files = write_dataset(data_dir, metadata_dir, 200)
+    store = AnalyticsStore(str(workdir / "analytics.sqlite"))
+    for file_name in files:
+        store.load_csv(os.path.join(data_dir, file_name), os.path.join(metadata_dir, file_name))
+    assert store.open()
+    return AnalyticsRouter(store)
+
+
+@pytest.mark.parametrize("question", [
+    "What does the column DOC. TYPE mean?",
+    "What is the total document amount for document 2000000000000012?",
+    "What is the number of the block for lot 5 on Broadway?",
+    "How many deeds are on block 2805?",
+    "What is the average document amount of BBL 1008350041?",
+    "Which documents were recorded on Broadway?",
+    "What are the document types?",
+    "Count the deeds in Brooklyn",
+])
+def test_plan_skips_questions_it_cannot_map(router, question):
+    assert router.plan(question) is None
+
+
+def test_plan_aggregate_with_filters(router):
+    plan = router.plan("What is the average document amount of deeds on Broadway in Brooklyn in 2019?")
+    assert plan["kind"] == "aggregate" and plan["function"] == "AVG"
+    assert plan["measure"]["column"] == "document_amt"
+    values = [value for _, _, value in plan["filters"]]
+    assert 3 in values and "DEED" in values and "%BROADWAY%" in values
+    assert "2019-01-01" in values and "2020-01-01" in values
+
+
+def test_plan_count_with_borough_code(router):
+    plan = router.plan("How many mortgages are in borough 4?")
+    assert plan["function"] == "COUNT"
+    assert [value for _, _, value in plan["filters"]] == [4, "MTGE"]
+
+
+def test_plan_keeps_numbers_in_street_names(router):
+    plan = router.plan("What is the total document amount on E. 86 ST.?")
+    assert plan["function"] == "SUM"
+    assert [value for _, _, value in plan["filters"]] == ["%E. 86 ST%"]
+
+
+def test_plan_latest_and_distinct(router):
+    assert router.plan("What's the most recent mortgage in Queens?")["kind"] == "latest"
+    assert router.plan("List the property types in Manhattan")["kind"] == "distinct"